@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from siteforge import builder
+from siteforge import json_utils as JsonUtils
+from siteforge import profiling
+from synthetic_site import SiteSpec, generate_site
+from jinja2 import FileSystemLoader
+
+BASELINE_VERSION = 1
+DEFAULT_SCALES = [1, 4, 16]
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 1.25
+
+""" Containing functionality to benchmark building synthetic sites at several scales, and compare against a baseline
+    """
+
+def _measure(func, repeat):
+    """ Call a function a number of times, returning the timings in seconds and the result of the last call
+    """
+
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+def _summarize(timings):
+    return {"min": min(timings), "median": statistics.median(timings)}
+
+def benchmark_site(site, repeat):
+    """
+    Benchmark the phases of building a generated site\n
+    Returns the timings per benchmark
+
+    :param site: The generated `SyntheticSite`
+    :param repeat: Number of times to measure each benchmark
+    """
+
+    results = {}
+
+    builder.env.loader = FileSystemLoader(site.template_path)
+    builder.env.cache.clear()
+
+    timings, content = _measure(lambda: builder.load_content(site.content_path), repeat)
+    results["load_content"] = _summarize(timings)
+
+    timings, index = _measure(lambda: builder.build_content_index(content), repeat)
+    results["build_content_index"] = _summarize(timings)
+
+    # Searching all content without an index, for a single bound context
+    first_id = content["items0"]["Items"][0]["Id"] if "items0" in content else None
+    timings, _ = _measure(lambda: JsonUtils.get_filtered_objects(list(content.values()), JsonUtils.JsonFilter("Id", first_id)), repeat)
+    results["get_filtered_objects"] = _summarize(timings)
+
+    build_registry = builder.load_build_registry(site.build_registry_path)
+    bound_entries = [e for e in build_registry if builder.BUILD_REGISTRY_OPTIONAL_VAR_BOUNDCONTEXT_NOTATION in e]
+    timings, _ = _measure(lambda: [builder.get_processed_content_from_build_item(e, content, index) for e in bound_entries], repeat)
+    results["bound_context"] = _summarize(timings)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        # Each cold build writes to an empty output directory
+        def cold_build():
+            output = tempfile.mkdtemp(dir=output_dir)
+            with profiling.profile() as profiler:
+                builder.build_site(site.content_path, site.build_registry_path, site.asset_registry_path, output)
+            return profiler
+
+        timings, profiler = _measure(cold_build, repeat)
+        results["build_site"] = _summarize(timings)
+        for phase, duration in profiler.get_phase_times().items():
+            results["build_site." + phase.replace(" ", "_")] = {"min": duration, "median": duration}
+
+        # Building again over an up to date output
+        output = os.path.join(output_dir, "warm")
+        builder.build_site(site.content_path, site.build_registry_path, site.asset_registry_path, output)
+        timings, _ = _measure(lambda: builder.build_site(site.content_path, site.build_registry_path, site.asset_registry_path, output), repeat)
+        results["build_site_unchanged"] = _summarize(timings)
+
+        builder.build_site(site.content_path, site.build_registry_path, site.asset_registry_path, output, incremental=True)
+        timings, _ = _measure(lambda: builder.build_site(site.content_path, site.build_registry_path, site.asset_registry_path, output, incremental=True), repeat)
+        results["build_site_incremental"] = _summarize(timings)
+
+    return results
+
+def run_benchmarks(spec, scales, repeat):
+    """
+    Benchmark building synthetic sites at several scales\n
+    Returns the results as json, which can be saved as a baseline
+
+    :param spec: The `SiteSpec` of the smallest scale
+    :param scales: Factors to scale the spec by
+    :param repeat: Number of times to measure each benchmark
+    """
+
+    loader = builder.env.loader
+    results = {}
+    try:
+        for scale in scales:
+            with tempfile.TemporaryDirectory() as directory:
+                site = generate_site(directory, spec.scaled(scale))
+                results[str(scale)] = benchmark_site(site, repeat)
+    finally:
+        builder.env.loader = loader
+        builder.env.cache.clear()
+
+    return {
+        "version": BASELINE_VERSION,
+        "python": platform.python_version(),
+        "spec": spec.to_json(),
+        "repeat": repeat,
+        "results": results
+    }
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare benchmark results against a baseline\n
+    Returns the (scale, benchmark, ratio) of each benchmark whose median got slower than the threshold allows
+
+    :param baseline: Results of a previous run, as returned by `run_benchmarks`
+    :param current: Results of this run
+    :param threshold: Ratio of current median to baseline median considered a regression
+    """
+
+    regressions = []
+    for scale, benchmarks in current["results"].items():
+        for name, timing in benchmarks.items():
+            previous = baseline.get("results", {}).get(scale, {}).get(name)
+            if previous is None or previous["median"] <= 0:
+                continue
+
+            ratio = timing["median"] / previous["median"]
+            if ratio > threshold:
+                regressions.append((scale, name, ratio))
+    return regressions
+
+def print_results(results, baseline=None):
+    for scale, benchmarks in results["results"].items():
+        print("Scale " + scale + ":")
+        for name, timing in benchmarks.items():
+            line = "  " + name.ljust(40) + "{:10.4f}s".format(timing["median"])
+
+            previous = baseline.get("results", {}).get(scale, {}).get(name) if baseline is not None else None
+            if previous is not None and previous["median"] > 0:
+                line += "  {:6.2f}x baseline".format(timing["median"] / previous["median"])
+            print(line)
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES, help="Factors to scale the synthetic site by")
+parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Number of times to measure each benchmark")
+parser.add_argument('--content_files', type=int, default=SiteSpec().content_files)
+parser.add_argument('--collection_size', type=int, default=SiteSpec().collection_size)
+parser.add_argument('--nesting_depth', type=int, default=SiteSpec().nesting_depth)
+parser.add_argument('--bound_pages', type=int, default=SiteSpec().bound_pages)
+parser.add_argument('--include_depth', type=int, default=SiteSpec().include_depth)
+parser.add_argument('--asset_files', type=int, default=SiteSpec().asset_files)
+parser.add_argument('--asset_depth', type=int, default=SiteSpec().asset_depth)
+parser.add_argument('--save', type=str, help="Save the results as baseline to this path")
+parser.add_argument('--compare', type=str, help="Compare the results against a baseline at this path, failing on regressions")
+parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="Ratio to the baseline median considered a regression")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    spec = SiteSpec(args.content_files, args.collection_size, args.nesting_depth, args.bound_pages, args.include_depth, args.asset_files, args.asset_depth)
+    results = run_benchmarks(spec, args.scales, args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+    if baseline is not None:
+        if baseline.get("spec") != results["spec"]:
+            print("Baseline was measured with a different site spec, ratios are not comparable")
+
+        regressions = compare(baseline, results, args.threshold)
+        for scale, name, ratio in regressions:
+            print("Regression at scale " + scale + ": " + name + " is " + "{:.2f}".format(ratio) + "x slower than the baseline")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,153 @@
+import json
+import os
+import random
+
+""" Containing functionality to generate synthetic sites of configurable size to benchmark building with
+    """
+
+class SiteSpec:
+    """
+    Describes the size of a synthetic site\n
+    - content_files: Number of content files
+    - collection_size: Number of items in the collection of each content file
+    - nesting_depth: Depth of the nested objects within each item
+    - bound_pages: Number of pages with a bound context, each bound to an item
+    - include_depth: Depth of the chain of templates each page includes
+    - asset_files: Number of asset files
+    - asset_depth: Depth of the directory tree the asset files are spread over
+    """
+
+    def __init__(self, content_files=10, collection_size=20, nesting_depth=3, bound_pages=50, include_depth=3, asset_files=50, asset_depth=2):
+        self.content_files = content_files
+        self.collection_size = collection_size
+        self.nesting_depth = nesting_depth
+        self.bound_pages = bound_pages
+        self.include_depth = include_depth
+        self.asset_files = asset_files
+        self.asset_depth = asset_depth
+
+    def scaled(self, scale):
+        """
+        Get a spec with the number of content files, bound pages and asset files multiplied by a scale
+
+        :param scale: Factor to multiply by
+        """
+
+        return SiteSpec(self.content_files * scale, self.collection_size, self.nesting_depth, self.bound_pages * scale, self.include_depth, self.asset_files * scale, self.asset_depth)
+
+    def to_json(self):
+        return dict(self.__dict__)
+
+class SyntheticSite:
+    """
+    Paths of a generated synthetic site, laid out the way `builder.build_site` expects
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.content_path = os.path.join(directory, "content")
+        self.template_path = os.path.join(directory, "templates")
+        self.build_registry_path = os.path.join(directory, "build_registry.json")
+        self.asset_registry_path = os.path.join(directory, "asset_registry.json")
+        self.asset_path = os.path.join(directory, "assets")
+
+def _get_content_name(i):
+    return "items" + str(i)
+
+def _get_item_id(file, i):
+    return "item-" + str(file) + "-" + str(i)
+
+def _create_nested(depth, rng):
+    if depth <= 0:
+        return {"Value": rng.randint(0, 1000000), "Text": "text " * rng.randint(1, 10)}
+    return {"Value": rng.randint(0, 1000000), "Children": [_create_nested(depth - 1, rng) for _ in range(2)]}
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+
+def _write_text(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def _generate_content(site, spec, rng):
+    os.makedirs(site.content_path, exist_ok=True)
+    for file in range(spec.content_files):
+        items = []
+        for i in range(spec.collection_size):
+            items.append({
+                "Id": _get_item_id(file, i),
+                "Title": "Item " + str(i) + " of " + str(file),
+                "Tags": ["tag" + str(rng.randint(0, 20)) for _ in range(3)],
+                "Nested": _create_nested(spec.nesting_depth, rng)
+            })
+        _write_json(os.path.join(site.content_path, _get_content_name(file) + ".json"), {"Title": _get_content_name(file), "Items": items})
+
+def _generate_templates(site, spec):
+    os.makedirs(site.template_path, exist_ok=True)
+
+    # A chain of includes, each level rendering a bit of markup
+    for depth in range(spec.include_depth):
+        include = "{% include 'include" + str(depth + 1) + ".html' %}" if depth + 1 < spec.include_depth else ""
+        _write_text(os.path.join(site.template_path, "include" + str(depth) + ".html"), "<div class=\"level" + str(depth) + "\">" + include + "</div>\n")
+    first_include = "{% include 'include0.html' %}" if spec.include_depth > 0 else ""
+
+    _write_text(os.path.join(site.template_path, "base.html"), "<html><body>" + first_include + "{% block body %}{% endblock %}</body></html>\n")
+
+    # Listing pages render a complete collection
+    for file in range(spec.content_files):
+        name = _get_content_name(file).capitalize()
+        _write_text(os.path.join(site.template_path, "list" + str(file) + ".html"),
+            "{% extends 'base.html' %}{% block body %}<h1>{{ " + name + ".Title }}</h1><ul>"
+            "{% for item in " + name + ".Items %}<li><a href=\"{{ item.Id }}.html\">{{ item.Title }}</a> {{ item.Tags | join(', ') }}</li>{% endfor %}"
+            "</ul>{% endblock %}\n")
+
+    _write_text(os.path.join(site.template_path, "item.html"),
+        "{% extends 'base.html' %}{% block body %}"
+        "{% macro nested(value) %}<div>{{ value.Value }}{{ value.Text }}{% for child in value.Children %}{{ nested(child) }}{% endfor %}</div>{% endmacro %}"
+        "<h1>{{ Item.Title }}</h1>{{ nested(Item.Nested) }}{% endblock %}\n")
+
+def _generate_build_registry(site, spec):
+    registry = []
+    for file in range(spec.content_files):
+        registry.append({"template": "list" + str(file) + ".html", "output": _get_content_name(file) + ".html"})
+
+    items = [(file, i) for file in range(spec.content_files) for i in range(spec.collection_size)]
+    for file, i in items[:spec.bound_pages]:
+        item_id = _get_item_id(file, i)
+        registry.append({"template": "item.html", "output": "items/" + item_id + ".html", "boundContext": [{"Name": "Item", "Where": {"Key": "Id", "Value": item_id}}]})
+
+    _write_json(site.build_registry_path, registry)
+
+def _generate_assets(site, spec, rng):
+    for i in range(spec.asset_files):
+        directory = site.asset_path
+        for depth in range(spec.asset_depth):
+            directory = os.path.join(directory, "dir" + str((i >> depth) % 4))
+        os.makedirs(directory, exist_ok=True)
+
+        with open(os.path.join(directory, "asset" + str(i) + ".bin"), "wb") as f:
+            f.write(rng.randbytes(rng.randint(256, 16 * 1024)))
+
+    os.makedirs(site.asset_path, exist_ok=True)
+
+    # Asset sources are relative to the asset registry file
+    _write_json(site.asset_registry_path, [{"Source": "../assets", "Destination": "assets"}])
+
+def generate_site(directory, spec, seed=0):
+    """
+    Generate a synthetic site\n
+    The same spec and seed always generate the same site. Returns the `SyntheticSite`
+
+    :param directory: Directory to generate the site in
+    :param spec: The `SiteSpec` describing the size of the site
+    :param seed: Seed for the generated values
+    """
+
+    rng = random.Random(seed)
+    site = SyntheticSite(directory)
+    _generate_content(site, spec, rng)
+    _generate_templates(site, spec)
+    _generate_build_registry(site, spec)
+    _generate_assets(site, spec, rng)
+    return site
@@ -0,0 +1,249 @@
+import json
+import re
+from collections.abc import Mapping, Sequence
+
+ACCESS_KIND_VALUE = "value"
+ACCESS_KIND_LENGTH = "len"
+ACCESS_KIND_KEYS = "keys"
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_PATH_NAME = re.compile(r'^(?:([A-Za-z_][A-Za-z0-9_]*)|\[("(?:\\.|[^"\\])*")\])')
+_PATH_KEY = re.compile(r'\.([A-Za-z_][A-Za-z0-9_]*)|\[(-?\d+)\]|\[("(?:\\.|[^"\\])*")\]')
+
+""" Containing functionality to record what content templates read while rendering
+    """
+
+def format_path(path):
+    """
+    Format a content path as text, like 'Info.Contact.Email' or 'Projects[3].Title'\n
+    Keys that aren't identifiers are quoted, like 'Info["e-mail"]'
+
+    :param path: Tuple of the name of the content followed by the keys and indices within it
+    """
+
+    name = path[0]
+    text = name if _IDENTIFIER.match(name) else "[" + json.dumps(name) + "]"
+    for key in path[1:]:
+        if isinstance(key, int):
+            text += "[" + str(key) + "]"
+        elif _IDENTIFIER.match(key):
+            text += "." + key
+        else:
+            text += "[" + json.dumps(key) + "]"
+    return text
+
+def format_access(kind, path):
+    """
+    Format a recorded access as text, like 'Info.Title' when reading a value, 'len(Projects)' when reading the length of a list
+    or 'keys(Info)' when reading the keys of an object
+
+    :param kind: What was read, one of `ACCESS_KIND_VALUE`, `ACCESS_KIND_LENGTH` and `ACCESS_KIND_KEYS`
+    :param path: The content path that was read, see `format_path`
+    """
+
+    text = format_path(path)
+    return text if kind == ACCESS_KIND_VALUE else kind + "(" + text + ")"
+
+def parse_access(text):
+    """
+    Parse an access formatted by `format_access`\n
+    Returns the kind and path, or None if the text isn't a valid access
+
+    :param text: The formatted access
+    """
+
+    kind = ACCESS_KIND_VALUE
+    for k in [ACCESS_KIND_LENGTH, ACCESS_KIND_KEYS]:
+        if text.startswith(k + "(") and text.endswith(")"):
+            kind = k
+            text = text[len(k) + 1:-1]
+            break
+
+    match = _PATH_NAME.match(text)
+    if match is None:
+        return None
+    path = [match.group(1) if match.group(1) is not None else json.loads(match.group(2))]
+
+    position = match.end()
+    while position < len(text):
+        match = _PATH_KEY.match(text, position)
+        if match is None:
+            return None
+        if match.group(1) is not None:
+            path.append(match.group(1))
+        elif match.group(2) is not None:
+            path.append(int(match.group(2)))
+        else:
+            path.append(json.loads(match.group(3)))
+        position = match.end()
+
+    return kind, tuple(path)
+
+def resolve_access(value, kind, keys):
+    """
+    Get what an access reads from a content value\n
+    Raises a LookupError or TypeError if the path doesn't exist in the value
+
+    :param value: The value of the content the access starts at
+    :param kind: What is read, one of `ACCESS_KIND_VALUE`, `ACCESS_KIND_LENGTH` and `ACCESS_KIND_KEYS`
+    :param keys: The keys and indices within the value
+    """
+
+    for key in keys:
+        if not (isinstance(value, dict) and isinstance(key, str)) and not (isinstance(value, list) and isinstance(key, int)):
+            raise TypeError("can't look up " + repr(key) + " in " + type(value).__name__)
+        value = value[key]
+
+    if kind == ACCESS_KIND_LENGTH:
+        return len(value)
+    if kind == ACCESS_KIND_KEYS:
+        return sorted(value.keys())
+    return value
+
+def untrack(value):
+    """
+    Get the content a possibly tracked value wraps, recording it as read as a whole
+
+    :param value: The value, which may be or contain tracked values
+    """
+
+    if isinstance(value, (TrackedMapping, TrackedSequence)):
+        value._recorder.record(ACCESS_KIND_VALUE, value._path)
+        return value._data
+    if isinstance(value, dict):
+        return {k: untrack(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [untrack(v) for v in value]
+    return value
+
+def dumps(value, **kwargs):
+    """ Serialize a possibly tracked value to json, used by the tojson filter of templates, see `untrack`
+    """
+
+    return json.dumps(untrack(value), **kwargs)
+
+class AccessRecorder:
+    """
+    Records what content is read while rendering a page\n
+    Content is wrapped in read only proxies recording each value read by its path. Iterating or taking the length of content
+    records its length or keys instead of all values in it, so only values actually read are recorded
+    """
+
+    def __init__(self):
+        self.accessed = set()
+
+    def record(self, kind, path):
+        """
+        Record an access
+
+        :param kind: What was read, one of `ACCESS_KIND_VALUE`, `ACCESS_KIND_LENGTH` and `ACCESS_KIND_KEYS`
+        :param path: The content path that was read
+        """
+
+        self.accessed.add((kind, path))
+
+    def track(self, value, path):
+        """
+        Wrap a content value so reading it is recorded\n
+        Objects and lists are wrapped, other values are recorded as read right away and returned as is
+
+        :param value: The content value
+        :param path: The content path of the value
+        """
+
+        if isinstance(value, dict):
+            return TrackedMapping(value, path, self)
+        if isinstance(value, list):
+            return TrackedSequence(value, path, self)
+
+        self.record(ACCESS_KIND_VALUE, path)
+        return value
+
+    def get_accessed(self):
+        """ Get the recorded accesses formatted as text and sorted, see `format_access`
+        """
+
+        return sorted(format_access(kind, path) for kind, path in self.accessed)
+
+class TrackedMapping(Mapping):
+    """
+    Read only proxy of a content object, recording what is read from it, see `AccessRecorder`
+    """
+
+    def __init__(self, data, path, recorder):
+        self._data = data
+        self._path = path
+        self._recorder = recorder
+
+    def __getitem__(self, key):
+        if not key in self._data:
+            # Whether a key exists depends on the keys of the object
+            self._recorder.record(ACCESS_KIND_KEYS, self._path)
+            raise KeyError(key)
+        return self._recorder.track(self._data[key], self._path + (key,))
+
+    def __contains__(self, key):
+        self._recorder.record(ACCESS_KIND_KEYS, self._path)
+        return key in self._data
+
+    def __iter__(self):
+        self._recorder.record(ACCESS_KIND_KEYS, self._path)
+        return iter(self._data)
+
+    def __len__(self):
+        self._recorder.record(ACCESS_KIND_KEYS, self._path)
+        return len(self._data)
+
+    def __eq__(self, other):
+        return untrack(self) == untrack(other)
+
+    def __repr__(self):
+        return repr(untrack(self))
+
+    __hash__ = None
+
+class TrackedSequence(Sequence):
+    """
+    Read only proxy of a content list, recording what is read from it, see `AccessRecorder`
+    """
+
+    def __init__(self, data, path, recorder):
+        self._data = data
+        self._path = path
+        self._recorder = recorder
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self._recorder.record(ACCESS_KIND_VALUE, self._path)
+            return self._data[index]
+        if not -len(self._data) <= index < len(self._data):
+            # Whether an index exists depends on the length of the list
+            self._recorder.record(ACCESS_KIND_LENGTH, self._path)
+            raise IndexError(index)
+        return self._recorder.track(self._data[index], self._path + (index,))
+
+    def __contains__(self, value):
+        self._recorder.record(ACCESS_KIND_VALUE, self._path)
+        return untrack(value) in self._data
+
+    def __iter__(self):
+        self._recorder.record(ACCESS_KIND_LENGTH, self._path)
+        for i, value in enumerate(self._data):
+            yield self._recorder.track(value, self._path + (i,))
+
+    def __reversed__(self):
+        self._recorder.record(ACCESS_KIND_LENGTH, self._path)
+        for i in range(len(self._data) - 1, -1, -1):
+            yield self._recorder.track(self._data[i], self._path + (i,))
+
+    def __len__(self):
+        self._recorder.record(ACCESS_KIND_LENGTH, self._path)
+        return len(self._data)
+
+    def __eq__(self, other):
+        return untrack(self) == untrack(other)
+
+    def __repr__(self):
+        return repr(untrack(self))
+
+    __hash__ = None
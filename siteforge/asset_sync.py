@@ -0,0 +1,413 @@
+import hashlib
+import os
+import posixpath
+import re
+import secrets
+import shutil
+from . import transform as Transform
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SYNC_LINK_COPY = "copy"
+SYNC_LINK_HARDLINK = "hardlink"
+SYNC_LINK_REFLINK = "reflink"
+SYNC_LINK_MODES = [SYNC_LINK_COPY, SYNC_LINK_HARDLINK, SYNC_LINK_REFLINK]
+
+# Number of hex characters of the content hash put in fingerprinted file names
+FINGERPRINT_LENGTH = 12
+
+# Stylesheets referencing other assets with url(...), rewritten to the fingerprinted paths of those assets when fingerprinting
+CSS_EXTENSIONS = [".css"]
+CSS_URL_PATTERN = re.compile(r"""url\(\s*(?:"([^"]*)"|'([^']*)'|([^)\s'"]*))\s*\)""")
+_URL_SCHEME_PATTERN = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+# ioctl request to clone a file on copy-on-write file systems (btrfs, xfs) on Linux
+_FICLONE = 0x40049409
+
+""" Containing functionality to bring asset directories over to the output directory, only copying what changed
+    """
+
+class SyncResult:
+    """
+    Outcome of syncing directories\n
+    All paths are relative to the destination directory. Savings map transformed files to the number of bytes transforming saved\n
+    When fingerprinting, fingerprints map the path of each file in the source directory to the fingerprinted path it was synced to
+    """
+
+    def __init__(self):
+        self.files = []
+        self.copied = []
+        self.skipped = []
+        self.savings = {}
+        self.fingerprints = {}
+
+def _hash_file(path):
+    """ Hash the content of a file without loading it in memory completely
+    """
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def is_file_unchanged(source, destination, checksum=False):
+    """
+    Check if a destination file is up to date with its source file\n
+    By default files are compared by size and modification time, with checksum by size and content
+
+    :param source: Path to the source file
+    :param destination: Path to the destination file
+    :param checksum: Compare content instead of modification time
+    """
+
+    try:
+        source_stat = os.stat(source)
+        destination_stat = os.stat(destination)
+    except OSError:
+        return False
+
+    # Linked files are the same file
+    if os.path.samestat(source_stat, destination_stat):
+        return True
+
+    if source_stat.st_size != destination_stat.st_size:
+        return False
+
+    if checksum:
+        return _hash_file(source) == _hash_file(destination)
+
+    return source_stat.st_mtime_ns == destination_stat.st_mtime_ns
+
+def _reflink(source, destination):
+    """ Clone a file, only succeeds on file systems supporting copy-on-write
+    """
+
+    if fcntl is None:
+        raise OSError("Reflinks are not supported on this platform")
+
+    with open(source, "rb") as s, open(destination, "wb") as d:
+        fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+    shutil.copystat(source, destination)
+
+def sync_file(source, destination, link=SYNC_LINK_COPY):
+    """
+    Bring a file over to a destination\n
+    The file is placed in a temporary file next to the destination first, so the destination is never seen half written.
+    Hard links and reflinks fall back to copying when not supported between the source and destination
+
+    :param source: Path to the source file
+    :param destination: Path to the destination file
+    :param link: How to bring the file over, one of `SYNC_LINK_MODES`
+    """
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temp_path = os.path.join(os.path.dirname(destination), "." + os.path.basename(destination) + "." + secrets.token_hex(8) + ".tmp")
+
+    try:
+        try:
+            if link == SYNC_LINK_HARDLINK:
+                os.link(source, temp_path)
+            elif link == SYNC_LINK_REFLINK:
+                _reflink(source, temp_path)
+            else:
+                shutil.copy2(source, temp_path)
+        except OSError:
+            if link == SYNC_LINK_COPY:
+                raise
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            shutil.copy2(source, temp_path)
+
+        os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def get_fingerprinted_path(path, digest):
+    """
+    Get the path of a file with a content hash put in its name, like 'css/style.0123456789ab.css'
+
+    :param path: Path of the file
+    :param digest: Hex digest of the content of the file
+    """
+
+    directory, name = os.path.split(path)
+    stem, extension = os.path.splitext(name)
+    fingerprinted = stem + "." + digest[:FINGERPRINT_LENGTH] + extension
+    return directory + "/" + fingerprinted if directory else fingerprinted
+
+def rewrite_css_urls(text, path, asset_urls):
+    """
+    Rewrite the url(...) references of a stylesheet to the fingerprinted paths of the assets they reference\n
+    References to urls with a scheme, like data: urls, and to unknown assets are left as is
+
+    :param text: The text of the stylesheet
+    :param path: Path of the stylesheet relative to the output directory, relative references are resolved against it
+    :param asset_urls: Fingerprinted paths of assets by their path, relative to the output directory
+    """
+
+    directory = posixpath.dirname(path)
+
+    def rewrite(match):
+        url = next(group for group in match.groups() if group is not None)
+        if not url or url.startswith(("#", "//")) or _URL_SCHEME_PATTERN.match(url):
+            return match.group(0)
+
+        # Queries and fragments, like those of font files, stay in place
+        end = min([i for i in [url.find("?"), url.find("#")] if i >= 0] or [len(url)])
+        reference, suffix = url[:end], url[end:]
+        target = reference.lstrip("/") if reference.startswith("/") else posixpath.normpath(posixpath.join(directory, reference))
+        if not target in asset_urls:
+            return match.group(0)
+
+        name = posixpath.basename(asset_urls[target])
+        reference_directory = posixpath.dirname(reference)
+        rewritten = reference_directory + "/" + name if reference_directory else name
+        return match.group(0).replace(url, rewritten + suffix, 1)
+
+    return CSS_URL_PATTERN.sub(rewrite, text)
+
+def rewrite_stylesheet(asset_urls, prefix, relative_path, data):
+    """
+    Rewrite a file synced by `sync` if it is a stylesheet referencing fingerprinted assets, see `rewrite_css_urls`\n
+    Returns the rewritten bytes, or None if the file isn't a stylesheet or nothing in it was rewritten
+
+    :param asset_urls: Fingerprinted paths of assets by their path, relative to the output directory
+    :param prefix: Path of the destination directory relative to the output directory, ending with a '/' unless empty
+    :param relative_path: Path of the file relative to the destination directory
+    :param data: The (transformed) bytes of the file
+    """
+
+    if not os.path.splitext(relative_path)[1].lower() in CSS_EXTENSIONS:
+        return None
+
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+    rewritten = rewrite_css_urls(text, prefix + relative_path, asset_urls)
+    return rewritten.encode("utf-8") if rewritten != text else None
+
+def transform_file(source, transforms, cache=None):
+    """
+    Transform the text of a file\n
+    Returns the transformed bytes and the number of bytes transforming saved, or None if the file isn't utf-8 text
+
+    :param source: Path to the source file
+    :param transforms: The transforms applying to the file, see `transform.py`
+    :param cache: Optional `build_cache.BuildCache` to fetch the transformed bytes from instead of transforming
+    """
+
+    with open(source, "rb") as f:
+        data = f.read()
+
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+    if cache is not None:
+        transformed = cache.transform(data, transforms, lambda: Transform.apply_transforms(transforms, source, text).encode("utf-8"))
+    else:
+        transformed = Transform.apply_transforms(transforms, source, text).encode("utf-8")
+    return transformed, len(data) - len(transformed)
+
+def write_file_if_changed(destination, data):
+    """
+    Write bytes to a destination, unless the destination already holds exactly those bytes\n
+    Returns whether the file was written
+
+    :param destination: Path to the destination file
+    :param data: The bytes to write
+    """
+
+    try:
+        with open(destination, "rb") as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temp_path = os.path.join(os.path.dirname(destination), "." + os.path.basename(destination) + "." + secrets.token_hex(8) + ".tmp")
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return True
+
+def sync_transformed_file(source, destination, transforms):
+    """
+    Bring a file over to a destination, transforming its text on the way\n
+    The transformed text is compared against the destination, so it is only written when it changed.
+    Returns whether the file was written and the number of bytes transforming saved, or None if the file isn't utf-8 text
+
+    :param source: Path to the source file
+    :param destination: Path to the destination file
+    :param transforms: The transforms applying to the file, see `transform.py`
+    """
+
+    transformed = transform_file(source, transforms)
+    if transformed is None:
+        return None
+
+    data, saved = transformed
+    return write_file_if_changed(destination, data), saved
+
+def _walk_files(source):
+    """ Visit the files in a source directory in a stable order, yielding their path and their path relative to the source directory
+    """
+
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for file in sorted(files):
+            source_file = os.path.join(root, file)
+            yield source_file, os.path.relpath(source_file, source).replace(os.sep, "/")
+
+def _get_fingerprinted_file_path(source_file, relative_path, transformed):
+    """ Get the fingerprinted path of a file, hashing the transformed bytes if it is transformed, see `transform_file`
+    """
+
+    digest = hashlib.sha256(transformed[0]).hexdigest() if transformed is not None else _hash_file(source_file)
+    return get_fingerprinted_path(relative_path, digest)
+
+def _get_output_data(source_file, relative_path, transforms, cache, rewrite):
+    """
+    Get the bytes a file is synced as when they differ from the source file, along with the bytes transforming saved\n
+    Returns None when the file is synced as is
+    """
+
+    file_transforms = Transform.get_applying_transforms(transforms, relative_path)
+    output = transform_file(source_file, file_transforms, cache) if file_transforms else None
+    if rewrite is None:
+        return output
+
+    if output is None:
+        with open(source_file, "rb") as f:
+            rewritten = rewrite(relative_path, f.read())
+        return (rewritten, None) if rewritten is not None else None
+
+    rewritten = rewrite(relative_path, output[0])
+    return (rewritten, output[1]) if rewritten is not None else output
+
+def get_fingerprints(source, transforms=None, cache=None, rewrite=None, extensions=None):
+    """
+    Get the fingerprinted path of each file in a source directory as `sync` would sync it to, without syncing anything
+
+    :param source: Path to the source directory
+    :param transforms: Optional transforms to apply to files, see `transform.py`
+    :param cache: Optional `build_cache.BuildCache` to fetch transformed files from, see `transform_file`
+    :param rewrite: Optional function rewriting files, see `sync`
+    :param extensions: Optional file extensions to limit the files to, like `CSS_EXTENSIONS`
+    """
+
+    fingerprints = {}
+    if not os.path.isdir(source):
+        return fingerprints
+
+    for source_file, relative_path in _walk_files(source):
+        if extensions is not None and not os.path.splitext(relative_path)[1].lower() in extensions:
+            continue
+        output = _get_output_data(source_file, relative_path, transforms, cache, rewrite)
+        fingerprints[relative_path] = _get_fingerprinted_file_path(source_file, relative_path, output)
+    return fingerprints
+
+def sync(source, destination, checksum=False, link=SYNC_LINK_COPY, transforms=None, fingerprint=False, cache=None, rewrite=None):
+    """
+    Sync a source directory to a destination directory\n
+    Only files that are new or changed are brought over, see `is_file_unchanged`. Files are visited in a stable order\n
+    Files that transforms apply to are transformed on the way instead, see `sync_transformed_file`\n
+    When fingerprinting, files are synced to a path with the hash of their (transformed) content in their name, see `get_fingerprinted_path`.
+    Files can be rewritten on the way as well, like stylesheets referencing fingerprinted assets, see `rewrite_css_urls`
+
+    :param source: Path to the source directory
+    :param destination: Path to the destination directory
+    :param checksum: Compare files by content instead of modification time
+    :param link: How to bring files over, one of `SYNC_LINK_MODES`
+    :param transforms: Optional transforms to apply to files, see `transform.py`
+    :param fingerprint: Put a content hash in the name of synced files
+    :param cache: Optional `build_cache.BuildCache` to fetch transformed files from, see `transform_file`
+    :param rewrite: Optional function taking the path of a file relative to the source directory and its (transformed) bytes,
+    returning the rewritten bytes or None to leave the file as is
+    """
+
+    result = SyncResult()
+
+    if not link in SYNC_LINK_MODES:
+        print("Unknown asset link mode '" + str(link) + "', copying instead")
+        link = SYNC_LINK_COPY
+
+    if not os.path.isdir(source):
+        print("Failed to sync '" + str(source) + "' as it is not an existing directory")
+        return result
+
+    for source_file, relative_path in _walk_files(source):
+        transformed = _get_output_data(source_file, relative_path, transforms, cache, rewrite)
+
+        output_path = relative_path
+        if fingerprint:
+            output_path = _get_fingerprinted_file_path(source_file, relative_path, transformed)
+            result.fingerprints[relative_path] = output_path
+
+        destination_file = os.path.join(destination, output_path)
+        result.files.append(output_path)
+
+        if transformed is not None:
+            data, saved = transformed
+            os.makedirs(os.path.dirname(destination_file), exist_ok=True)
+            if write_file_if_changed(destination_file, data):
+                result.copied.append(output_path)
+            else:
+                result.skipped.append(output_path)
+            if saved is not None:
+                result.savings[output_path] = saved
+        elif is_file_unchanged(source_file, destination_file, checksum):
+            result.skipped.append(output_path)
+        else:
+            sync_file(source_file, destination_file, link)
+            result.copied.append(output_path)
+
+    return result
+
+def delete_removed(directory, previous_files, current_files):
+    """
+    Delete files that were synced before but not anymore\n
+    Directories left empty by deleting files are removed as well. Returns the deleted files
+
+    :param directory: The directory the file paths are relative to
+    :param previous_files: Files synced by a previous sync
+    :param current_files: Files synced by the current sync
+    """
+
+    current_files = set(current_files)
+    deleted = []
+
+    for relative_path in sorted(previous_files):
+        if relative_path in current_files:
+            continue
+
+        path = os.path.join(directory, relative_path)
+        if not os.path.abspath(path).startswith(os.path.join(os.path.abspath(directory), "")) or not os.path.isfile(path):
+            continue
+
+        os.remove(path)
+        deleted.append(relative_path)
+
+        # Clean up directories that only existed for the deleted file
+        parent = os.path.dirname(path)
+        while os.path.abspath(parent) != os.path.abspath(directory) and not os.listdir(parent):
+            os.rmdir(parent)
+            parent = os.path.dirname(parent)
+
+    return deleted
@@ -0,0 +1,330 @@
+import json
+import os
+import re
+import secrets
+import urllib.error
+import urllib.request
+import jinja2
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from . import manifest as Manifest
+from . import profiling as Profiling
+
+BUILD_CACHE_VERSION = 1
+
+DEFAULT_HTTP_TIMEOUT = 10
+DEFAULT_SERVE_HOST = "127.0.0.1"
+DEFAULT_SERVE_PORT = 8765
+
+CACHE_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Cached pages start with a line of json describing the page, followed by the page itself
+CACHE_ENTRY_SEPARATOR = b"\n"
+CACHE_ENTRY_VAR_SAVED_NOTATION = "saved"
+CACHE_ENTRY_VAR_ACCESSED_NOTATION = "accessed"
+
+""" Containing functionality to share rendered pages and transformed assets between builds on different machines
+    """
+
+_code_version = None
+
+def get_code_version():
+    """
+    Get a hash of the siteforge and jinja2 code building the site\n
+    The sources of siteforge are hashed instead of using its version number, as the code changes in between releases while developing it
+    """
+
+    global _code_version
+    if _code_version is None:
+        package_dir = Path(__file__).parent
+        sources = {path.name: Manifest.hash_bytes(path.read_bytes()) for path in sorted(package_dir.glob("*.py"))}
+        _code_version = Manifest.hash_json({"cache": BUILD_CACHE_VERSION, "jinja2": jinja2.__version__, "sources": sources})
+    return _code_version
+
+def is_cache_key(key):
+    """ Check if a key is a cache key, so it can safely be used as a file name or url path
+    """
+
+    return isinstance(key, str) and CACHE_KEY_PATTERN.match(key) is not None
+
+class DirectoryStore:
+    """
+    Stores cache entries as files in a directory, which can be a directory shared between machines\n
+    Entries are spread over subdirectories by the first two characters of their key, and written to a temporary file first
+    so builds reading from the same directory never see half written entries
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: The directory to store entries in. Created once the first entry is stored
+        """
+
+        self.directory = directory
+
+    def __str__(self):
+        return str(self.directory)
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        Get the bytes stored for a key, or None if nothing is stored for it
+
+        :param key: The cache key
+        """
+
+        try:
+            with open(self._get_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print("Failed to read '" + key + "' from build cache '" + str(self) + "': " + str(e))
+            return None
+
+    def put(self, key, data):
+        """
+        Store bytes for a key, returns whether they were stored
+
+        :param key: The cache key
+        :param data: The bytes to store
+        """
+
+        path = self._get_path(key)
+        temp_path = path + "." + secrets.token_hex(8) + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print("Failed to write '" + key + "' to build cache '" + str(self) + "': " + str(e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        return True
+
+class HttpStore:
+    """
+    Stores cache entries on an http server, getting entries with GET and storing them with PUT on the url of the store followed by the key\n
+    After failing to reach the server once, the store is considered unavailable for the rest of the build, so an unreachable
+    server doesn't slow down every page. See `create_cache_server` for a server storing entries in a `DirectoryStore`
+    """
+
+    def __init__(self, url, timeout=DEFAULT_HTTP_TIMEOUT):
+        """
+        :param url: The url of the store
+        :param timeout: Seconds to wait for the server
+        """
+
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.available = True
+
+    def __str__(self):
+        return self.url
+
+    def _request(self, key, method, data=None):
+        if not self.available:
+            return None
+
+        request = urllib.request.Request(self.url + "/" + key, data=data, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                print("Failed to " + method + " '" + key + "' on build cache '" + self.url + "': " + str(e))
+            return None
+        except OSError as e:
+            print("Failed to reach build cache '" + self.url + "', building without it: " + str(e))
+            self.available = False
+            return None
+
+    def get(self, key):
+        """
+        Get the bytes stored for a key, or None if nothing is stored for it
+
+        :param key: The cache key
+        """
+
+        return self._request(key, "GET")
+
+    def put(self, key, data):
+        """
+        Store bytes for a key, returns whether they were stored
+
+        :param key: The cache key
+        :param data: The bytes to store
+        """
+
+        return self._request(key, "PUT", data) is not None
+
+def open_store(location):
+    """
+    Open the store at a location, an `HttpStore` for http(s) urls and a `DirectoryStore` otherwise
+
+    :param location: Url or directory of the store
+    """
+
+    if str(location).startswith(("http://", "https://")):
+        return HttpStore(str(location))
+    return DirectoryStore(location)
+
+class BuildCache:
+    """
+    Content addressed cache of rendered pages and transformed assets, shared between builds through a store\n
+    Pages are keyed by a hash of everything they are rendered from: their templates, the content their templates reference,
+    their build registry entry and bound context, and the code building them, see `get_code_version`. Building the same pages
+    on another machine then fetches them instead of rendering them. Transformed assets are keyed by a hash of their source
+    and the transforms applying to them\n
+    Lookups are counted as hits when an entry was fetched and misses when it had to be built
+    """
+
+    def __init__(self, store):
+        """
+        :param store: Where entries are stored, like a `DirectoryStore` or `HttpStore`
+        """
+
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    def get_page_key(self, fingerprint):
+        """
+        Get the key of a page
+
+        :param fingerprint: Everything the page depends on, see `manifest.DependencyResolver.get_page_fingerprint`
+        """
+
+        return Manifest.hash_json({"version": get_code_version(), "page": fingerprint})
+
+    def get_asset_key(self, data, transforms):
+        """
+        Get the key of a transformed asset
+
+        :param data: The bytes of the source of the asset
+        :param transforms: The transforms applying to the asset, see `transform.py`
+        """
+
+        return Manifest.hash_json({"version": get_code_version(), "asset": Manifest.hash_bytes(data), "transforms": [t.name for t in transforms]})
+
+    def _count(self, hit):
+        Profiling.count_cache("build cache", hit)
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def fetch_page(self, key):
+        """
+        Fetch a rendered page\n
+        Returns the page, the bytes saved by transforming it and the content accessed while rendering it, or None on a miss
+
+        :param key: The key of the page, see `get_page_key`
+        """
+
+        data = self.store.get(key)
+        entry = None
+        if data is not None and CACHE_ENTRY_SEPARATOR in data:
+            header, page = data.split(CACHE_ENTRY_SEPARATOR, 1)
+            try:
+                header = json.loads(header.decode("utf-8"))
+                entry = page.decode("utf-8"), header.get(CACHE_ENTRY_VAR_SAVED_NOTATION), header.get(CACHE_ENTRY_VAR_ACCESSED_NOTATION)
+            except ValueError:
+                print("Ignoring page '" + key + "' in build cache '" + str(self.store) + "' as it can't be read")
+
+        self._count(entry is not None)
+        return entry
+
+    def store_page(self, key, page, saved=None, accessed=None):
+        """
+        Store a rendered page
+
+        :param key: The key of the page, see `get_page_key`
+        :param page: The bytes of the page as written to the output directory
+        :param saved: The bytes saved by transforming the page
+        :param accessed: The content accessed while rendering the page, see `access_tracking.py`
+        """
+
+        header = json.dumps({CACHE_ENTRY_VAR_SAVED_NOTATION: saved, CACHE_ENTRY_VAR_ACCESSED_NOTATION: accessed}, separators=(",", ":"))
+        return self.store.put(key, header.encode("utf-8") + CACHE_ENTRY_SEPARATOR + page)
+
+    def transform(self, data, transforms, transform):
+        """
+        Get a transformed asset from the cache, or transform it and store the result\n
+        Returns the transformed bytes
+
+        :param data: The bytes of the source of the asset
+        :param transforms: The transforms applying to the asset, see `transform.py`
+        :param transform: Function transforming the source, returning the transformed bytes
+        """
+
+        key = self.get_asset_key(data, transforms)
+        transformed = self.store.get(key)
+        self._count(transformed is not None)
+        if transformed is None:
+            transformed = transform()
+            self.store.put(key, transformed)
+        return transformed
+
+class CacheRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the entries of a `DirectoryStore` over http, as used by `HttpStore`
+    """
+
+    store = None
+
+    def _get_key(self):
+        key = self.path.strip("/")
+        if not is_cache_key(key):
+            self.send_error(400, "Not a cache key")
+            return None
+        return key
+
+    def do_GET(self):
+        key = self._get_key()
+        if key is None:
+            return
+
+        data = self.store.get(key)
+        if data is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_PUT(self):
+        key = self._get_key()
+        if key is None:
+            return
+
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.store.put(key, data):
+            self.send_error(500)
+            return
+
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        # Every page of every build is a request, which would drown out failures
+        pass
+
+def create_cache_server(directory, host=DEFAULT_SERVE_HOST, port=DEFAULT_SERVE_PORT):
+    """
+    Create an http server storing cache entries in a directory, to share a build cache between machines without a shared directory\n
+    Serve requests with `serve_forever` on the returned server
+
+    :param directory: The directory to store entries in, see `DirectoryStore`
+    :param host: The host to listen on
+    :param port: The port to listen on, 0 to pick a free port
+    """
+
+    handler = type("DirectoryCacheRequestHandler", (CacheRequestHandler,), {"store": DirectoryStore(directory)})
+    return ThreadingHTTPServer((host, port), handler)
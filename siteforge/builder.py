@@ -1,64 +1,315 @@
+import asyncio
+import functools
+import hashlib
+import json
 import os
-import shutil
+import secrets
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from . import json_function_registration
+from . import access_tracking as AccessTracking
 from . import json_functions
+from . import asset_sync as AssetSync
+from . import build_cache as BuildCache
+from . import compression as Compression
+from . import fragment_cache as FragmentCache
+from . import json_query as JsonQuery
 from . import json_utils as JsonUtils
+from . import manifest as Manifest
+from . import page_writer as PageWriter
+from . import profiling as Profiling
+from . import sharding as Sharding
+from . import template_cache as TemplateCache
+from . import transform as Transform
 from jinja2 import Environment, FileSystemLoader
 from pathlib import Path
 
 BUILD_REGISTRY_EXPECTED_VAR_TEMPLATE_NOTATION = "template"
 BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION = "output"
 BUILD_REGISTRY_OPTIONAL_VAR_BOUNDCONTEXT_NOTATION = "boundContext"
+BUILD_REGISTRY_OPTIONAL_VAR_FOREACH_NOTATION = "forEach"
+
+FOREACH_EXPECTED_VAR_NAME_NOTATION = "Name"
+FOREACH_EXPECTED_VAR_IN_NOTATION = "In"
+
+# Set on build entries expanded from a forEach entry, holding the item the page is built for
+BUILD_ENTRY_VAR_ITEM_NOTATION = "$item"
 
 ASSET_REGISTRY_EXPECTED_VAR_SOURCE_NOTATION = "Source"
 ASSET_REGISTRY_EXPECTED_VAR_DESTINATION_NOTATION = "Destination"
 
+# Written to the output directory when fingerprinting assets, mapping asset paths to their fingerprinted paths
+ASSET_MANIFEST_FILE_NAME = "asset-manifest.json"
+
+# Bytes buffered before writing to disk when streaming pages, see `write_stream`
+DEFAULT_STREAM_BUFFER_SIZE = 64 * 1024
+
+# Function calls running at a time when ressolving content, see `process_content_value`
+DEFAULT_FUNC_CONCURRENCY = 8
+
+# Directory templates are loaded from, relative to the working directory
+DEFAULT_TEMPLATE_PATH = "templates"
+
 """ Containing functionality to build a website
     """
 
-env = Environment(loader=FileSystemLoader("templates"))
+# Fingerprinted output paths of assets by their output path, see `set_asset_urls`
+_asset_urls = {}
 
-def load_content(path):
+def asset_url(path):
     """
-    Loading content from a path\n
-    The content being the data used reference in templating
+    Get the url of an asset, available in templates as {{ asset_url('css/stylesheet.css') }}\n
+    When assets are fingerprinted the fingerprinted path is returned, otherwise the path is returned as is
+
+    :param path: Path of the asset relative to the output directory, optionally starting with '/'
+    """
+
+    relative_path = path.lstrip("/")
+    return path[:len(path) - len(relative_path)] + _asset_urls.get(relative_path, relative_path)
+
+def set_asset_urls(asset_urls):
+    """
+    Set the fingerprinted output paths `asset_url` returns
+
+    :param asset_urls: Fingerprinted output paths of assets by their output path, or None when assets aren't fingerprinted
+    """
+
+    _asset_urls.clear()
+    _asset_urls.update(asset_urls or {})
+
+def create_environment(template_path=DEFAULT_TEMPLATE_PATH):
+    """
+    Create a jinja2 environment to render pages with, loading templates from a directory
+
+    :param template_path: The directory to load templates from
+    """
+
+    environment = Environment(loader=FileSystemLoader(template_path), extensions=[FragmentCache.FragmentCacheExtension])
+    environment.globals["asset_url"] = asset_url
+
+    # Serializing content with tojson reads it as a whole, which is recorded when tracking content access
+    environment.policies["json.dumps_function"] = AccessTracking.dumps
+    return environment
+
+env = create_environment()
+
+@contextmanager
+def use_environment(environment):
+    """
+    Render pages with another environment for the duration of the block, like that of a `session.BuildSession`\n
+    The environment is used as is when it is None
+
+    :param environment: The jinja2 environment, see `create_environment`
+    """
+
+    global env
+    if environment is None:
+        yield
+        return
+
+    previous = env
+    env = environment
+    try:
+        yield
+    finally:
+        env = previous
+
+def process_content_value(value, func_cache=None, concurrency=DEFAULT_FUNC_CONCURRENCY):
+    """
+    Ressolve tokens in (part of) loaded json content\n
+    Tokens can be:
+    - A method reference
+
+    When functions that are called concurrently are registered, independent calls are run concurrently, see `json_function_registration.json_func`.
+    Results end up in the same place as when calling functions one by one, so the ressolved content is the same
     
-    :param path: The path to the content files. Expected to be a path to a directory
+    :param value: The json value to ressolve tokens in
+    :param func_cache: Optional `JsonFuncCache` to reuse results of cacheable functions from
+    :param concurrency: Maximum number of function calls running at a time
     """
 
-    # Load content from json first
-    content = JsonUtils.load_objects(path)
+    if not json_function_registration.has_concurrent_functions():
+        return _process_content_value(value, func_cache)
 
-    # Ressolve tokens in json content
-    # Tokens can be:
-    # - A method reference
-    def _process_content_value(value):
-        if isinstance(value, dict) and "$func" in value:
-            name = value["$func"]
-
-            if name not in json_function_registration.JSON_FUNCTION_REFERENCES:
-                print("Content value referenced a function but the function can not be found. Is it imported?")
-                print("Continuing by defining as unknown")
-                print("Value: ", value)
-                return "UNKNOWN_FUNCTION_RESSOLVE"
-            
-            func = json_function_registration.JSON_FUNCTION_REFERENCES[name]
-
-            args = [_process_content_value(v) for v in value.get("args", [])]
-            kwargs = {k: _process_content_value(v) for k, v in value.get("kwargs", {}).items()}
+    # Only calls to concurrent functions, and calls taking their results, are left to run concurrently
+    pending = []
+    holder = [_collect_concurrent_calls(value, func_cache, pending)]
+    if isinstance(holder[0], _PendingCall):
+        pending.append((holder, 0))
+    if not pending:
+        return holder[0]
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(_run_concurrent_calls(pending, func_cache, concurrency))
+    else:
+        # asyncio.run can't be used within a running event loop, so the calls get an event loop on a thread of their own
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(asyncio.run, _run_concurrent_calls(pending, func_cache, concurrency)).result()
+    return holder[0]
+
+def _warn_unknown_function(value):
+    print("Content value referenced a function but the function can not be found. Is it imported?")
+    print("Continuing by defining as unknown")
+    print("Value: ", value)
+    return "UNKNOWN_FUNCTION_RESSOLVE"
+
+def _process_content_value(value, func_cache=None):
+    """ Ressolve tokens in (part of) loaded json content, calling functions one by one in depth first order
+    """
+
+    if isinstance(value, dict) and "$func" in value:
+        name = value["$func"]
+
+        if name not in json_function_registration.JSON_FUNCTION_REFERENCES:
+            return _warn_unknown_function(value)
+        
+        args = [_process_content_value(v, func_cache) for v in value.get("args", [])]
+        kwargs = {k: _process_content_value(v, func_cache) for k, v in value.get("kwargs", {}).items()}
+
+        if func_cache is not None:
+            return func_cache.call(name, args, kwargs)
 
+        func = json_function_registration.JSON_FUNCTION_REFERENCES[name]
+        return func(*args, **kwargs)
+
+    if isinstance(value, dict):
+        return {k: _process_content_value(v, func_cache) for k, v in value.items()}
+
+    if isinstance(value, list):
+        return [_process_content_value(v, func_cache) for v in value]
+
+    return value
+
+class _PendingCall:
+    """
+    A function call left to run concurrently, see `_collect_concurrent_calls`\n
+    Pending are the calls within its arguments that have to run before it, as (container, key) pairs
+    """
+
+    def __init__(self, name, args, kwargs, pending):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs
+        self.pending = pending
+
+def _collect_concurrent_calls(value, func_cache, pending):
+    """
+    Ressolve tokens in (part of) loaded json content, except for calls to functions that are called concurrently\n
+    Those calls, and calls taking their results as arguments, are left as `_PendingCall` and their place is added to pending as a (container, key) pair
+    """
+
+    if isinstance(value, dict) and "$func" in value:
+        name = value["$func"]
+
+        if name not in json_function_registration.JSON_FUNCTION_REFERENCES:
+            return _warn_unknown_function(value)
+
+        call_pending = []
+        args = _collect_concurrent_calls(list(value.get("args", [])), func_cache, call_pending)
+        kwargs = {}
+        for k, v in value.get("kwargs", {}).items():
+            kwargs[k] = _collect_concurrent_calls(v, func_cache, call_pending)
+            if isinstance(kwargs[k], _PendingCall):
+                call_pending.append((kwargs, k))
+
+        options = json_function_registration.JSON_FUNCTION_OPTIONS.get(name, json_function_registration.JsonFuncOptions())
+        if options.is_concurrent() or call_pending:
+            return _PendingCall(name, args, kwargs, call_pending)
+
+        if func_cache is not None:
+            return func_cache.call(name, args, kwargs)
+        return json_function_registration.JSON_FUNCTION_REFERENCES[name](*args, **kwargs)
+
+    if isinstance(value, dict):
+        result = {}
+        for k, v in value.items():
+            result[k] = _collect_concurrent_calls(v, func_cache, pending)
+            if isinstance(result[k], _PendingCall):
+                pending.append((result, k))
+        return result
+
+    if isinstance(value, list):
+        result = []
+        for i, v in enumerate(value):
+            result.append(_collect_concurrent_calls(v, func_cache, pending))
+            if isinstance(result[i], _PendingCall):
+                pending.append((result, i))
+        return result
+
+    return value
+
+async def _run_concurrent_calls(pending, func_cache, concurrency):
+    """ Run pending calls concurrently and put their results in their place, see `_collect_concurrent_calls`
+    """
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        async def run(options, func, args, kwargs):
+            if options.coroutine:
+                async with semaphore:
+                    return await func(*args, **kwargs)
+            if options.thread:
+                async with semaphore:
+                    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args, **kwargs))
+            # Other functions don't wait on anything, so they are called right away
             return func(*args, **kwargs)
 
-        if isinstance(value, dict):
-            return {k: _process_content_value(v) for k, v in value.items()}
+        async def run_call(call):
+            await fill(call.pending)
 
-        if isinstance(value, list):
-            return [_process_content_value(v) for v in value]
+            options = json_function_registration.JSON_FUNCTION_OPTIONS.get(call.name, json_function_registration.JsonFuncOptions())
+            if func_cache is not None:
+                return await func_cache.call_async(call.name, call.args, call.kwargs, functools.partial(run, options))
+            return await run(options, json_function_registration.JSON_FUNCTION_REFERENCES[call.name], call.args, call.kwargs)
 
-        return value
+        async def fill(pending):
+            # Gathering keeps results in order, regardless of the order calls finish in
+            results = await asyncio.gather(*[run_call(container[key]) for container, key in pending])
+            for (container, key), result in zip(pending, results):
+                container[key] = result
+
+        await fill(pending)
+
+def load_content(path, lazy=False, cache_size=JsonUtils.DEFAULT_LAZY_CACHE_SIZE, func_cache=None, workers=1, parse_cache_dir=None, func_concurrency=DEFAULT_FUNC_CONCURRENCY):
+    """
+    Loading content from a path\n
+    The content being the data used reference in templating\n
+    Lazily loaded content only loads and ressolves a content file the first time it is accessed, see `json_utils.LazyObjects`
     
-    for k, v in content.items():
-        content[k] = _process_content_value(v)
+    :param path: The path to the content files. Expected to be a path to a directory
+    :param lazy: Load content files once accessed instead of all up front
+    :param cache_size: Maximum number of lazily loaded content files kept loaded at a time
+    :param func_cache: `JsonFuncCache` to reuse function results from. A new cache is used if not passed,
+    so identical calls to pure functions are evaluated once
+    :param workers: Number of threads to read and parse content files with
+    :param parse_cache_dir: Optional directory to cache parsed content files in, see `json_utils.load_object`
+    :param func_concurrency: Maximum number of function calls running at a time when functions are called concurrently, see `process_content_value`
+    """
+
+    if func_cache is None:
+        func_cache = json_function_registration.JsonFuncCache()
+
+    if lazy:
+        return JsonUtils.LazyObjects(path, functools.partial(process_content_value, func_cache=func_cache, concurrency=func_concurrency), cache_size, parse_cache_dir)
+
+    # Load content from json first
+    with Profiling.phase("load content"):
+        content = JsonUtils.load_objects(path, workers, parse_cache_dir)
+
+    # Ressolve tokens in json content
+    with Profiling.phase("resolve functions"):
+        if json_function_registration.has_concurrent_functions():
+            # Calls in different content files run concurrently as well
+            resolved = process_content_value(dict(content), func_cache, func_concurrency)
+            for k in content:
+                content[k] = resolved[k]
+        else:
+            for k, v in content.items():
+                with Profiling.phase("resolve functions", Profiling.CATEGORY_CONTENT, content=k):
+                    content[k] = process_content_value(v, func_cache)
 
     return content
 
@@ -84,14 +335,107 @@ def load_asset_registry(path):
 
     return JsonUtils.load_container(path, [ASSET_REGISTRY_EXPECTED_VAR_SOURCE_NOTATION, ASSET_REGISTRY_EXPECTED_VAR_DESTINATION_NOTATION])
 
-def get_processed_content_from_build_item(build_item, content):
+def build_content_index(content):
+    """
+    Build an index over all loaded content\n
+    Used to look up bound contexts without searching through all content for each build item
+    
+    :param content: The already loaded content
+    """
+
+    index = JsonUtils.JsonIndex()
+    for k, v in content.items():
+        index.add(v)
+
+    return index
+
+def get_collection(content, path):
+    """
+    Get a collection out of the loaded content\n
+    The path starts with the name of a content file, optionally followed by keys into it separated by dots, like 'data.Projects'
+    
+    :param content: The already loaded content
+    :param path: Path to the collection
+    """
+
+    keys = path.split(".")
+    value = content[keys[0]]
+    for key in keys[1:]:
+        value = value[key]
+
+    if not isinstance(value, list):
+        raise TypeError("'" + path + "' is not a collection")
+
+    return value
+
+def expand_build_registry(build_registry, content, result=None):
+    """
+    Expand forEach build registry entries into a build entry per item of their collection\n
+    A forEach entry names a collection in the content and the variable each item is bound to,
+    its output being a pattern filled in with the keys of the item, like 'project/{Id}.html'\n
+    Entries without forEach are kept as is. Entries that can't be expanded are reported as failed
+    
+    :param build_registry: The loaded build registry
+    :param content: The already loaded content
+    :param result: Optional `BuildResult` to report entries that failed to expand in
+    """
+
+    def report(output, error):
+        if result is not None:
+            result.add_failure(output, error)
+        else:
+            print("Failed to expand '" + output + "': " + error)
+
+    expanded = []
+    outputs = set()
+    for build_entry in build_registry:
+        output = build_entry[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION]
+        if not BUILD_REGISTRY_OPTIONAL_VAR_FOREACH_NOTATION in build_entry:
+            expanded.append(build_entry)
+            outputs.add(output)
+            continue
+
+        for_each = build_entry[BUILD_REGISTRY_OPTIONAL_VAR_FOREACH_NOTATION]
+        missing = [n for n in [FOREACH_EXPECTED_VAR_NAME_NOTATION, FOREACH_EXPECTED_VAR_IN_NOTATION] if not n in for_each]
+        if missing:
+            report(output, "Missing required forEach entry: " + ", ".join(missing))
+            continue
+
+        try:
+            collection = get_collection(content, for_each[FOREACH_EXPECTED_VAR_IN_NOTATION])
+        except (KeyError, IndexError, TypeError) as e:
+            report(output, "Can't get the forEach collection, " + type(e).__name__ + ": " + str(e))
+            continue
+
+        for item in collection:
+            try:
+                item_output = output.format_map(item)
+            except (KeyError, IndexError, ValueError, TypeError, AttributeError) as e:
+                report(output, "Can't fill in the output for item " + str(item) + ", " + type(e).__name__ + ": " + str(e))
+                continue
+
+            if item_output in outputs:
+                report(item_output, "Output is generated more than once")
+                continue
+
+            page = dict(build_entry)
+            page[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION] = item_output
+            page[BUILD_ENTRY_VAR_ITEM_NOTATION] = item
+            expanded.append(page)
+            outputs.add(item_output)
+
+    return expanded
+
+def get_processed_content_from_build_item(build_item, content, index=None):
     """
     Get content based on build registry item notation\n
     A build registry item can denote a bound context which bounds to something in the loaded in content\n
-    If so, then we try to bind to the context by searching for it in the contents
+    If so, then we try to bind to the context by searching for it in the contents. See `json_query.compile_query` for what can be searched for\n
+    Build items expanded from a forEach entry are bound to their item directly, see `expand_build_registry`
     
     :param build_item: The build item that can potentially contain a bound contexts
     :param content: The already loaded content
+    :param index: Index over the loaded content, see `build_content_index`. Built from the content if not passed
     """
 
     # Just return the content if there is no build item
@@ -99,92 +443,994 @@ def get_processed_content_from_build_item(build_item, content):
         return None
     
     processed_content = {}
+    ressolved_once = False
+
+    # Bind the item a forEach entry was expanded for, no need to search for it
+    if BUILD_ENTRY_VAR_ITEM_NOTATION in build_item:
+        name = build_item[BUILD_REGISTRY_OPTIONAL_VAR_FOREACH_NOTATION][FOREACH_EXPECTED_VAR_NAME_NOTATION]
+        processed_content[name] = build_item[BUILD_ENTRY_VAR_ITEM_NOTATION]
+        ressolved_once = True
 
     # Process bound context if existing
     if not BUILD_REGISTRY_OPTIONAL_VAR_BOUNDCONTEXT_NOTATION in build_item:
-        return None
+        return processed_content if ressolved_once else None
+
+    if index is None:
+        index = build_content_index(content)
 
     # Try and ressolve all bound context items
-    ressolved_once = False
     for bound_entry in build_item[BUILD_REGISTRY_OPTIONAL_VAR_BOUNDCONTEXT_NOTATION]:
         name = bound_entry['Name']
-        # Only supporting 1 query right now
-        query = bound_entry['Where']
+        query = JsonQuery.compile_query(bound_entry['Where'])
 
-        key = query['Key']
-        value = query['Value']
-
-        for k, v in content.items():
-            filtered = JsonUtils.get_filtered_objects(v, JsonUtils.JsonFilter(key, value))
-            if filtered is None:
+        for item in JsonQuery.execute_query(query, index):
+            # Entry already exists, this is an issue
+            if name in content:
                 continue
 
-            for item in filtered:
-                # Entry already exists, this is an issue
-                if name in content:
-                    continue
-
-                processed_content[name] = item
-                ressolved_once = True
+            processed_content[name] = item
+            ressolved_once = True
     
     if ressolved_once:
         return processed_content
     else:
         return None
 
+def set_bytecode_cache(directory):
+    """
+    Cache compiled templates on disk so templates are not parsed and compiled again on every run\n
+    Cached templates are invalidated when their source changes
+    
+    :param directory: The directory to store the cache in, or None to disable caching
+    """
+
+    env.bytecode_cache = TemplateCache.create_bytecode_cache(directory) if directory else None
+
+def compile_templates(target):
+    """
+    Precompile all templates into a bundle that can be used with `use_template_bundle`
+    
+    :param target: Path to write the bundle to. Written as zip file if ending with .zip, otherwise as directory
+    """
+
+    TemplateCache.compile_templates(env, target)
+
+def use_template_bundle(path):
+    """
+    Load templates from a bundle precompiled by `compile_templates`\n
+    Templates changed since compiling the bundle are loaded from their source instead
+    
+    :param path: Path to the bundle
+    """
+
+    source_loader = env.loader
+    if isinstance(source_loader, TemplateCache.TemplateBundleLoader):
+        source_loader = source_loader.source_loader
+
+    env.loader = TemplateCache.TemplateBundleLoader(path, source_loader)
+    env.cache.clear()
+
 def render(template_name, **args):
     """ Get a jinja2 template and render it by passing through arguments
     """
     template = env.get_template(template_name)
     return template.render(**args)
 
-def copy(location, to):
-    """ Copy content from a location to another location
+def render_stream(template_name, **args):
+    """ Get a jinja2 template and render it in chunks by passing through arguments, see `write_stream`
+    """
+    template = env.get_template(template_name)
+    return template.generate(**args)
+
+def copy(location, to, checksum=False, link=AssetSync.SYNC_LINK_COPY, transforms=None, fingerprint=False, cache=None, rewrite=None):
+    """
+    Copy content from a location to another location\n
+    Only files that are new or changed are copied, see `asset_sync.py`. Returns the `SyncResult`
+    
+    :param location: The directory to copy from
+    :param to: The directory to copy to
+    :param checksum: Compare files by content instead of modification time
+    :param link: How to bring files over, one of `asset_sync.SYNC_LINK_MODES`
+    :param transforms: Optional transforms to apply to copied files, see `transform.py`
+    :param fingerprint: Put a content hash in the name of copied files
+    :param cache: Optional `build_cache.BuildCache` to fetch transformed files from
+    :param rewrite: Optional function rewriting copied files, see `asset_sync.sync`
     """
 
     location = Path(location).resolve()
-    shutil.copytree(location, to, dirs_exist_ok=True)
+    return AssetSync.sync(location, to, checksum, link, transforms, fingerprint, cache, rewrite)
 
 def write(path, content):
-    """ Write content to disk
+    """
+    Write content to disk\n
+    Content identical to what is already on disk isn't written, leaving the file and its modification time untouched.
+    Otherwise the content is written to a temporary file first and then renamed, so the file is never seen half written\n
+    Returns whether the file was written
+    
+    :param path: Path to write to
+    :param content: The content to write
     """
 
     path = os.path.join(os.path.dirname(__file__), path)
+    data = content.encode("utf-8")
+
+    if _is_file_content_equal(path, data):
+        Profiling.count_cache("output", True)
+        return False
+
+    Profiling.count_cache("output", False)
+    Profiling.count("bytes written", len(data))
+
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(content)
+    temp_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + "." + secrets.token_hex(8) + ".tmp")
+    try:
+        # Create through os.open so the file gets the same permissions a regular open would give it
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
-def build_site(content_path, build_registry_path, asset_registry_path, output_dir):
-    """ Build the site
+    return True
+
+def write_stream(path, chunks, buffer_size=DEFAULT_STREAM_BUFFER_SIZE):
+    """
+    Write content produced in chunks to disk, like a page rendered by `render_stream`\n
+    Chunks are written to a temporary file as they are produced, so the content is never held in memory as a whole.
+    The content is hashed along the way. When the file on disk turns out to have identical content the temporary file is discarded,
+    leaving the file and its modification time untouched. Otherwise the temporary file is renamed, so the file is never seen half written\n
+    Returns whether the file was written
+
+    :param path: Path to write to
+    :param chunks: Iterable of the content in chunks
+    :param buffer_size: Number of bytes buffered before writing to disk
+    """
+
+    path = os.path.join(os.path.dirname(__file__), path)
+    digest = hashlib.sha256()
+    size = 0
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + "." + secrets.token_hex(8) + ".tmp")
+    try:
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        with os.fdopen(fd, "wb", buffering=buffer_size) as f:
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                digest.update(data)
+                size += len(data)
+                f.write(data)
+
+        if _is_file_hash_equal(path, size, digest.hexdigest(), buffer_size):
+            os.remove(temp_path)
+            Profiling.count_cache("output", True)
+            return False
+
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    Profiling.count_cache("output", False)
+    Profiling.count("bytes written", size)
+    return True
+
+def _is_file_content_equal(path, data):
+    """ Check if a file on disk has the exact content passed through
+    """
+
+    return _is_file_hash_equal(path, len(data), Manifest.hash_bytes(data))
+
+def _is_file_hash_equal(path, size, digest, buffer_size=DEFAULT_STREAM_BUFFER_SIZE):
+    """ Check if a file on disk has the size and sha256 hex digest passed through, reading it in chunks
+    """
+
+    try:
+        if os.path.getsize(path) != size:
+            return False
+
+        file_digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for data in iter(functools.partial(f.read, buffer_size), b""):
+                file_digest.update(data)
+        return file_digest.hexdigest() == digest
+    except OSError:
+        return False
+
+class BuildResult:
+    """
+    Outcome of building the site\n
+    Pages that failed to build are reported here instead of stopping the build\n
+    When building incrementally, pages that were kept from the previous build are listed as up to date\n
+    Built pages are listed as written, or as skipped when the rendered page was identical to the page already on disk\n
+    Asset files are listed as copied, skipped when up to date or deleted when removed from the asset sources\n
+    Calls to cacheable content functions are counted as hits when served from the cache and misses when evaluated\n
+    When compressing output, compressed files are listed as compressed, or as compress skipped when unchanged since the previous build\n
+    When transforming output, the number of bytes saved is listed per transformed page and asset\n
+    When fingerprinting assets, the fingerprinted path is listed per asset as asset urls\n
+    When building with a build cache, pages fetched from it are listed as cached. Lookups are counted as hits and misses\n
+    Fragments of templates reused from the fragment cache are counted as hits, fragments that had to be rendered as misses
+    """
+
+    def __init__(self):
+        self.failed = []
+        self.up_to_date = []
+        self.written = []
+        self.skipped = []
+        self.assets_copied = []
+        self.assets_skipped = []
+        self.assets_deleted = []
+        self.func_cache_hits = 0
+        self.func_cache_misses = 0
+        self.compressed = []
+        self.compress_skipped = []
+        self.transform_savings = {}
+        self.asset_urls = {}
+        self.cached = []
+        self.build_cache_hits = 0
+        self.build_cache_misses = 0
+        self.fragment_cache_hits = 0
+        self.fragment_cache_misses = 0
+
+    def add_failure(self, output, error):
+        """
+        Report a page that failed to build
+        
+        :param output: The output path of the page, as denoted in the build registry
+        :param error: Description of what went wrong
+        """
+
+        print("Failed to build '" + output + "': " + error)
+        self.failed.append((output, error))
+
+    def summary(self):
+        """ Get a human readable summary of the build
+        """
+
+        pages = "Built " + str(len(self.written) + len(self.skipped)) + " page(s): " + str(len(self.written)) + " written, " + str(len(self.skipped)) + " unchanged, " + str(len(self.up_to_date)) + " up to date, " + str(len(self.failed)) + " failed"
+        assets = "Synced " + str(len(self.assets_copied) + len(self.assets_skipped)) + " asset(s): " + str(len(self.assets_copied)) + " copied, " + str(len(self.assets_skipped)) + " unchanged, " + str(len(self.assets_deleted)) + " deleted"
+        functions = "Cached functions: " + str(self.func_cache_hits) + " hits, " + str(self.func_cache_misses) + " misses"
+        summary = pages + "\n" + assets + "\n" + functions
+
+        if self.transform_savings:
+            summary += "\nTransformed " + str(len(self.transform_savings)) + " file(s), saving " + str(sum(self.transform_savings.values())) + " bytes"
+
+        if self.build_cache_hits or self.build_cache_misses:
+            summary += "\nBuild cache: " + str(self.build_cache_hits) + " hits, " + str(self.build_cache_misses) + " misses"
+
+        if self.fragment_cache_hits or self.fragment_cache_misses:
+            summary += "\nCached fragments: " + str(self.fragment_cache_hits) + " hits, " + str(self.fragment_cache_misses) + " misses"
+
+        if self.compressed or self.compress_skipped:
+            summary += "\nCompressed " + str(len(self.compressed) + len(self.compress_skipped)) + " file(s): " + str(len(self.compressed)) + " compressed, " + str(len(self.compress_skipped)) + " unchanged"
+
+        return summary
+
+    def to_json(self):
+        """ Get the outcome of the build as json
+        """
+
+        outcome = dict(vars(self))
+        outcome["failed"] = [[output, error] for output, error in self.failed]
+        return outcome
+
+class ContentLookups:
+    """
+    The index over content and the template analysis of builds, kept in between builds of a `session.BuildSession`\n
+    Both are only set up once a page needs them. When content files or templates change, only their entries are updated,
+    see `replace_content` and `invalidate_templates`
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self._index = None
+        self._resolver = None
+
+    def get_index(self):
+        """ Get the index over all content, see `build_content_index`
+        """
+
+        if self._index is None:
+            with Profiling.phase("index content"):
+                self._index = build_content_index(self.content)
+        return self._index
+
+    def get_resolver(self):
+        """ Get the dependency resolver for the content and templates
+        """
+
+        if self._resolver is None:
+            self._resolver = Manifest.DependencyResolver(env, self.content)
+        return self._resolver
+
+    def replace_content(self, name, previous):
+        """
+        Update the lookups for a content file that changed, call after changing the content\n
+        Only the objects of the content file are indexed again
+
+        :param name: Name of the content file, as used as key in the loaded content
+        :param previous: The content of the file before it changed, or None if the file was added
+        """
+
+        if self._index is not None:
+            self._index.replace(previous, self.content.get(name))
+        if self._resolver is not None:
+            self._resolver.invalidate_content([name])
+
+    def invalidate_templates(self, template_names):
+        """
+        Update the lookups for templates that changed, see `manifest.DependencyResolver.invalidate_templates`
+
+        :param template_names: Names of the templates
+        """
+
+        if self._resolver is not None:
+            self._resolver.invalidate_templates(template_names)
+
+class BuildContext:
+    """
+    Everything shared between the pages of a build\n
+    The content index and template analysis are only set up once a page needs them,
+    so content that is loaded lazily is only loaded when used\n
+    Transforms are applied to pages between rendering and writing them, see `transform.py`\n
+    Asset urls are the fingerprinted paths `asset_url` returns while building, see `set_asset_urls`\n
+    Pages are written by a `page_writer.PageWriter` set up with the write workers, write queue size and fsync of the context\n
+    When streaming, pages no transforms apply to are written to disk while rendering them, see `write_stream`\n
+    When tracking content access, what content each page reads while rendering is recorded, see `access_tracking.py`\n
+    The content index and template analysis can be kept from a previous build by passing its `ContentLookups`
+    """
+
+    def __init__(self, content, output_dir, transforms=None, asset_urls=None, write_workers=PageWriter.DEFAULT_WRITE_WORKERS, write_queue_size=PageWriter.DEFAULT_WRITE_QUEUE_SIZE, fsync=False, stream=False, stream_buffer_size=DEFAULT_STREAM_BUFFER_SIZE, track_access=False, lookups=None):
+        self.content = content
+        self.output_dir = output_dir
+        self.transforms = transforms or []
+        self.asset_urls = asset_urls or {}
+        self.write_workers = write_workers
+        self.write_queue_size = write_queue_size
+        self.fsync = fsync
+        self.stream = stream
+        self.stream_buffer_size = stream_buffer_size
+        self.track_access = track_access
+        self.lookups = lookups if lookups is not None else ContentLookups(content)
+
+    def __getstate__(self):
+        # Build processes set up their own index and template analysis
+        state = self.__dict__.copy()
+        state["lookups"] = ContentLookups(self.content)
+        return state
+
+    def get_index(self):
+        """ Get the index over all content, see `build_content_index`
+        """
+
+        return self.lookups.get_index()
+
+    def get_resolver(self):
+        """ Get the dependency resolver for the content and templates of this build
+        """
+
+        return self.lookups.get_resolver()
+
+    def get_processed_content(self, build_entry):
+        """ Get the content bound to a build entry, see `get_processed_content_from_build_item`
+        """
+
+        # Pages without bound context don't need content to be indexed
+        if not BUILD_REGISTRY_OPTIONAL_VAR_BOUNDCONTEXT_NOTATION in build_entry:
+            return get_processed_content_from_build_item(build_entry, self.content)
+        return get_processed_content_from_build_item(build_entry, self.content, self.get_index())
+
+    def get_page_content(self, template_name):
+        """
+        Get the content to pass through to a template\n
+        Lazily loaded content is limited to content the template references, so unused content files are never loaded
+        """
+
+        if not isinstance(self.content, JsonUtils.LazyObjects):
+            return self.content
+
+        names = self.get_resolver().get_template_dependencies(template_name).names
+        return {k: self.content[k] for k in self.content if k.capitalize() in names}
+
+    def create_page_writer(self):
+        """ Create a `page_writer.PageWriter` writing pages to the output directory, see `write`
+        """
+
+        return PageWriter.PageWriter(functools.partial(_write_page, self.output_dir, buffer_size=self.stream_buffer_size), self.write_workers, self.write_queue_size, self.fsync)
+
+def build_page(build_entry, context):
+    """
+    Build a single build registry entry\n
+    Binds the bound context of the entry, renders its template, transforms and writes the result to the output directory\n
+    Returns whether the page was written, see `write`
+    
+    :param build_entry: The build registry entry
+    :param context: The `BuildContext` of the build
+    """
+
+    return _build_page(build_entry, context)[0]
+
+def _write_page(output_dir, path, page, buffer_size=DEFAULT_STREAM_BUFFER_SIZE):
+    """ Write a rendered page, see `write`, or a page rendered in chunks, see `write_stream`. Measured as writing its output when profiling
+    """
+
+    # Writing a page rendered in chunks is rendering it, which is measured as such
+    if not isinstance(page, str):
+        return write_stream(path, page, buffer_size)
+
+    output = Path(os.path.relpath(path, output_dir)).as_posix()
+    with Profiling.phase("write", Profiling.CATEGORY_PAGE, output=output) as profile_args:
+        written = write(path, page)
+        if Profiling.is_enabled():
+            profile_args["bytes"] = len(page.encode("utf-8"))
+            profile_args["written"] = written
+    return written
+
+def _build_page(build_entry, context, writer=None):
+    """
+    Build a single build registry entry, returning whether the page was written, the bytes saved by transforming it
+    and the content accessed while rendering it when tracking content access\n
+    With a `page_writer.PageWriter` passed the page is queued to be written, returning a future of whether it was written instead
+    """
+
+    final_content = {}
+    template_name = build_entry[BUILD_REGISTRY_EXPECTED_VAR_TEMPLATE_NOTATION]
+    output = build_entry[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION]
+
+    # Load in existing content
+    # Bound content is fingerprinted as a whole, so only reading loaded content is recorded
+    recorder = AccessTracking.AccessRecorder() if context.track_access else None
+    for k, v in context.get_page_content(template_name).items():
+        final_content[k] = recorder.track(v, (k.capitalize(),)) if recorder is not None else v
+
+    # Process build item
+    with Profiling.phase("bound context", Profiling.CATEGORY_PAGE, output=output):
+        processed_content = context.get_processed_content(build_entry)
+
+    # Add processed content if existing
+    if processed_content is not None:
+        for k, v in processed_content.items():
+            final_content[k] = v
+
+    args = {k.capitalize(): v for k, v in final_content.items()}
+    path = os.path.join(context.output_dir, output)
+    transforms = Transform.get_applying_transforms(context.transforms, output)
+
+    # Pages that aren't transformed as a whole are written while rendering them, so they are never held in memory as a whole
+    if context.stream and not transforms:
+        with Profiling.phase("render", Profiling.CATEGORY_PAGE, output=output, template=template_name, streamed=True):
+            chunks = render_stream(template_name, **args)
+            if writer is not None:
+                written = writer.submit(path, chunks)
+            else:
+                written = _write_page(context.output_dir, path, chunks, context.stream_buffer_size)
+        return written, None, _get_accessed(recorder)
+
+    # Render and write
+    with Profiling.phase("render", Profiling.CATEGORY_PAGE, output=output, template=template_name):
+        template = render(template_name, **args)
+
+    saved = None
+    if transforms:
+        with Profiling.phase("transform", Profiling.CATEGORY_PAGE, output=output):
+            transformed = Transform.apply_transforms(transforms, output, template)
+            saved = len(template.encode("utf-8")) - len(transformed.encode("utf-8"))
+            template = transformed
+
+    if writer is not None:
+        return writer.submit(path, template), saved, _get_accessed(recorder)
+    return _write_page(context.output_dir, path, template), saved, _get_accessed(recorder)
+
+def _get_accessed(recorder):
+    return recorder.get_accessed() if recorder is not None else None
+
+def _try_build_page(build_entry, context, writer=None):
+    """
+    Build a single build registry entry\n
+    Returns a description of the error if it failed, whether the page was written, the bytes saved by transforming it
+    and the content accessed while rendering it
+    """
+
+    try:
+        return (None,) + _build_page(build_entry, context, writer)
+    except Exception as e:
+        return type(e).__name__ + ": " + str(e), False, None, None
+
+def _resolve_outcome(outcome):
+    """ Wait for the page of an outcome of `_try_build_page` to be written, reporting failing to write it as error
+    """
+
+    error, written, saved, accessed = outcome
+    if isinstance(written, Future):
+        try:
+            written = written.result()
+        except Exception as e:
+            return type(e).__name__ + ": " + str(e), False, None, None
+    return error, written, saved, accessed
+
+# State of a build worker process, set up once per process by `_init_build_worker`
+_build_worker_state = {}
+
+def _init_build_worker(context, loader, bytecode_cache, profile, fragments):
+    """ Set up a build worker process so it loads content and indexes it only once
+    """
+
+    # Worker processes don't necessarily inherit the environment setup of the main process
+    env.loader = loader
+    env.bytecode_cache = bytecode_cache
+    set_asset_urls(context.asset_urls)
+    env.fragment_cache.clear()
+    env.fragment_cache.fragments.update(fragments)
+
+    # Measurements are sent back to the profiler of the main process along with each shard
+    if profile:
+        Profiling.enable()
+    else:
+        Profiling.disable()
+
+    _build_worker_state["context"] = context
+
+def _build_shard(shard):
+    """
+    Build a shard of (position, build entry) pairs within a build worker process
+
+    Returns the outcome per position, what was measured when profiling and the fragments rendered, see `fragment_cache.FragmentCache.take_collected`
+    """
+
+    context = _build_worker_state["context"]
+    with context.create_page_writer() as writer:
+        outcomes = [(i, _try_build_page(build_entry, context, writer)) for i, build_entry in shard]
+    outcomes = [(i, _resolve_outcome(outcome)) for i, outcome in outcomes]
+
+    collected = None
+    if Profiling.is_enabled():
+        collected = Profiling.ACTIVE_PROFILER.take_collected()
+    return outcomes, collected, env.fragment_cache.take_collected()
+
+def _fingerprint_page(build_entry, context, accessed=None, previous=None):
+    """
+    Get everything a page depends on as hashes, see `manifest.DependencyResolver.get_page_fingerprint`\n
+    Returns None if the page can't be analysed, which is reported when building it
+    """
+
+    output = build_entry[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION]
+    template_name = build_entry[BUILD_REGISTRY_EXPECTED_VAR_TEMPLATE_NOTATION]
+    try:
+        queried = BUILD_REGISTRY_OPTIONAL_VAR_BOUNDCONTEXT_NOTATION in build_entry
+        fingerprint = context.get_resolver().get_page_fingerprint(build_entry, template_name, lambda: context.get_processed_content(build_entry),
+            accessed, queried, previous)
+
+        # Pages linking to fingerprinted assets are built again when assets change
+        if context.asset_urls and "asset_url" in context.get_resolver().get_template_dependencies(template_name).names:
+            fingerprint["assets"] = Manifest.hash_json(context.asset_urls)
+
+        # Pages are built again when the transforms applying to them change
+        transforms = Transform.get_applying_transforms(context.transforms, output)
+        if transforms:
+            fingerprint["transforms"] = [t.name for t in transforms]
+    except Exception:
+        return None
+
+    return fingerprint
+
+def _fetch_cached_page(build_entry, context, cache, writer):
+    """
+    Write a page fetched from the build cache, see `build_cache.BuildCache`\n
+    Returns the key of the page and the outcome of writing it as `_try_build_page` would, or None as outcome on a miss
+    """
+
+    # Pages are looked up by what their templates reference, as what they read isn't known before rendering them
+    fingerprint = _fingerprint_page(build_entry, context)
+    if fingerprint is None:
+        return None, None
+
+    # Pages rendered while tracking content access are cached along with what they read
+    if context.track_access:
+        fingerprint["tracked"] = True
+
+    key = cache.get_page_key(Manifest.strip_bound_sources(fingerprint))
+    with Profiling.phase("fetch cached page", Profiling.CATEGORY_PAGE, output=build_entry[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION]):
+        entry = cache.fetch_page(key)
+    if entry is None:
+        return key, None
+
+    page, saved, accessed = entry
+    path = os.path.join(context.output_dir, build_entry[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION])
+    try:
+        return key, (None, writer.submit(path, page), saved, accessed)
+    except Exception as e:
+        return key, (type(e).__name__ + ": " + str(e), False, None, None)
+
+def _store_cached_page(build_entry, context, cache, key, saved, accessed):
+    """ Store a built page in the build cache, as written to the output directory
+    """
+
+    path = os.path.join(context.output_dir, build_entry[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION])
+    try:
+        with open(path, "rb") as f:
+            page = f.read()
+    except OSError as e:
+        print("Failed to store '" + build_entry[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION] + "' in the build cache: " + str(e))
+        return
+    cache.store_page(key, page, saved, accessed)
+
+def build_pages(build_registry, content, output_dir, *, workers=1, previous_manifest=None, manifest=None, transforms=None, asset_urls=None, result=None, write_workers=PageWriter.DEFAULT_WRITE_WORKERS, write_queue_size=PageWriter.DEFAULT_WRITE_QUEUE_SIZE, fsync=False, shard=None, stream=False, stream_buffer_size=DEFAULT_STREAM_BUFFER_SIZE, track_access=False, cache=None, fragment_cache_path=None, lookups=None):
+    """
+    Build all build registry entries\n
+    Entries with forEach are expanded into a page per item of their collection first, see `expand_build_registry`\n
+    When building a shard, only the pages whose output path belongs to the shard are built, see `sharding.Shard`\n
+    With more than 1 worker the registry is sharded across a process pool. Each worker process loads the content once\n
+    With write workers, pages are written on threads while the next pages are rendered, see `page_writer.PageWriter`.
+    When streaming, pages are written while rendering them instead, unless transforms apply to them\n
+    When building incrementally, only pages whose template, content or bound context changed since the previous build are rendered.
+    What pages depend on is kept in a manifest in the output directory, see `manifest.py`. Built pages are recorded in the passed manifest.
+    When tracking content access, pages only depend on the content they read while rendering, instead of all content their templates reference\n
+    With a build cache, pages that need to be built are fetched from the cache when they were rendered before, and stored in it otherwise.
+    See `build_cache.BuildCache`\n
+    Fragments of templates in a {% cache %} tag are rendered once per build, or once for as long as templates don't change when kept in a file.
+    See `fragment_cache.FragmentCacheExtension`
+    
+    :param build_registry: The loaded build registry
+    :param content: The already loaded content
+    :param output_dir: The directory to write the pages to
+    :param workers: Number of processes to build with
+    :param previous_manifest: Manifest of the previous build, building incrementally if passed
+    :param manifest: Manifest to record built pages in
+    :param transforms: Optional transforms to apply to pages before writing them, see `transform.py`
+    :param asset_urls: Fingerprinted output paths of assets by their output path, see `asset_url`
+    :param result: Optional `BuildResult` to report in, a new one is returned otherwise
+    :param write_workers: Number of threads per build process writing pages, 0 to write pages right after rendering them
+    :param write_queue_size: Maximum number of rendered pages waiting to be written per build process
+    :param fsync: Flush written pages to disk in one batch once all pages are written
+    :param shard: Optional `sharding.Shard` to build the pages of
+    :param stream: Write pages to disk in chunks while rendering them, so large pages aren't held in memory as a whole
+    :param stream_buffer_size: Number of bytes buffered before writing to disk when streaming
+    :param track_access: Record what content each page reads while rendering, see `access_tracking.py`
+    :param cache: Optional `build_cache.BuildCache` to fetch pages from and store them in
+    :param fragment_cache_path: Optional file to keep rendered fragments in between builds
+    :param lookups: Optional `ContentLookups` of the content kept from a previous build
+    """
+
+    if result is None:
+        result = BuildResult()
+
+    with Profiling.phase("expand build registry"):
+        build_registry = expand_build_registry(build_registry, content, result)
+    if shard is not None:
+        build_registry = [e for e in build_registry if shard.contains(e[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION])]
+    outcomes = [(None, False, None, None)] * len(build_registry)
+    context = BuildContext(content, output_dir, transforms, asset_urls, write_workers, write_queue_size, fsync, stream, stream_buffer_size, track_access, lookups)
+    set_asset_urls(context.asset_urls)
+
+    # Fragments may depend on content, templates and asset urls that changed since the previous build
+    env.fragment_cache.clear()
+    fragment_stamp = None
+    if fragment_cache_path is not None:
+        fragment_stamp = FragmentCache.get_template_stamp(env, {"asset_urls": _asset_urls})
+        env.fragment_cache.load(fragment_cache_path, fragment_stamp)
+
+    # Find out what pages need to be built
+    pending = list(enumerate(build_registry))
+    fingerprints = {}
+    incremental = previous_manifest is not None
+    if incremental:
+        with Profiling.phase("fingerprint pages"):
+            pending = []
+            for i, build_entry in enumerate(build_registry):
+                output = build_entry[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION]
+
+                # Pages depend on the content they read when they were last built, which changes only when that content changes
+                accessed = Manifest.get_tracked_accesses(previous_manifest, output) if track_access else None
+                previous = Manifest.get_previous_fingerprint(previous_manifest, output)
+                fingerprints[i] = _fingerprint_page(build_entry, context, accessed, previous)
+
+                if fingerprints[i] is not None and Manifest.is_page_up_to_date(previous_manifest, output_dir, output, fingerprints[i]):
+                    Profiling.count_cache("pages", True)
+                    result.up_to_date.append(output)
+                    manifest[Manifest.MANIFEST_VAR_PAGES_NOTATION][output] = fingerprints[i]
+                else:
+                    Profiling.count_cache("pages", False)
+                    pending.append((i, build_entry))
+
+    # Pages rendered before, possibly on another machine, are fetched instead of rendered
+    rendering = pending
+    cache_keys = {}
+    cached = set()
+    if cache is not None:
+        with Profiling.phase("fetch cached pages"):
+            rendering = []
+            with context.create_page_writer() as writer:
+                for i, build_entry in pending:
+                    cache_keys[i], outcome = _fetch_cached_page(build_entry, context, cache, writer)
+                    if outcome is None:
+                        rendering.append((i, build_entry))
+                    else:
+                        outcomes[i] = outcome
+                        cached.add(i)
+
+    if workers <= 1 or len(rendering) <= 1:
+        with context.create_page_writer() as writer:
+            for i, build_entry in rendering:
+                outcomes[i] = _try_build_page(build_entry, context, writer)
+    else:
+        # Multiple shards per worker so a few slow pages don't leave other workers idle
+        shard_count = min(len(rendering), workers * 4)
+        shards = [[] for _ in range(shard_count)]
+        for position, page in enumerate(rendering):
+            shards[position * shard_count // len(rendering)].append(page)
+
+        reported = set()
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_build_worker, initargs=(context, env.loader, env.bytecode_cache, Profiling.is_enabled(), env.fragment_cache.fragments)) as executor:
+                for shard_result, collected, fragments in executor.map(_build_shard, shards):
+                    env.fragment_cache.merge(*fragments)
+                    for i, outcome in shard_result:
+                        outcomes[i] = outcome
+                        reported.add(i)
+                    if collected is not None and Profiling.is_enabled():
+                        Profiling.ACTIVE_PROFILER.merge(*collected)
+        except BrokenProcessPool as e:
+            # Pages of shards that never reported back are considered failed
+            for i, build_entry in rendering:
+                if not i in reported:
+                    outcomes[i] = ("Build worker stopped unexpectedly: " + str(e), False, None, None)
+
+    # Report in registry order, regardless of the order workers finished in
+    for i, build_entry in pending:
+        output = build_entry[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION]
+        error, written, saved, accessed = _resolve_outcome(outcomes[i])
+        if error is not None:
+            result.add_failure(output, error)
+            continue
+
+        if saved is not None:
+            result.transform_savings[output] = saved
+
+        if i in cached:
+            result.cached.append(output)
+        elif cache_keys.get(i) is not None:
+            _store_cached_page(build_entry, context, cache, cache_keys[i], saved, accessed)
+
+        if written:
+            result.written.append(output)
+        else:
+            result.skipped.append(output)
+
+        # Failed pages are left out of the manifest so they are built again next time
+        if incremental and fingerprints[i] is not None:
+            if accessed is not None:
+                fingerprints[i]["content"] = context.get_resolver().get_access_hashes(accessed)
+            manifest[Manifest.MANIFEST_VAR_PAGES_NOTATION][output] = fingerprints[i]
+
+    result.fragment_cache_hits += env.fragment_cache.hits
+    result.fragment_cache_misses += env.fragment_cache.misses
+    if fragment_cache_path is not None:
+        env.fragment_cache.save(fragment_cache_path, fragment_stamp)
+
+    return result
+
+def copy_assets(asset_registry, asset_registry_path, output_dir, result, *, checksum=False, link=AssetSync.SYNC_LINK_COPY, previous_manifest=None, manifest=None, transforms=None, fingerprint=False, shard=None, cache=None):
+    """
+    Copy over each asset registry entry to the output directory\n
+    Only new or changed files are copied. When a previous manifest is passed, files copied by the previous build
+    that are no longer part of any asset registry entry are deleted from the output directory\n
+    When fingerprinting, files are copied with a hash of their content in their name and the fingerprinted paths are reported
+    as asset urls in the result, so pages can link to them through `asset_url`\n
+    Stylesheets are copied with their url(...) references rewritten to the fingerprinted paths, so their fingerprint is taken after rewriting.
+    When copying a shard, only the entries belonging to the shard are copied, see `sharding.Shard`. As pages may link to assets
+    of other shards, asset urls of all entries are still reported when fingerprinting
+    
+    :param asset_registry: The loaded asset registry
+    :param asset_registry_path: Path to the asset registry file, sources are relative to this
+    :param output_dir: The directory to copy the assets to
+    :param result: The `BuildResult` to report copied, skipped and deleted files in
+    :param checksum: Compare files by content instead of modification time
+    :param link: How to bring files over, one of `asset_sync.SYNC_LINK_MODES`
+    :param previous_manifest: Manifest of the previous build
+    :param manifest: Manifest to record copied files in
+    :param transforms: Optional transforms to apply to copied files, see `transform.py`
+    :param fingerprint: Put a content hash in the name of copied files
+    :param shard: Optional `sharding.Shard` to copy the entries of
+    :param cache: Optional `build_cache.BuildCache` to fetch transformed files from
+    """
+
+    entries = []
+    for asset_entry in asset_registry:
+        source = os.path.join(asset_registry_path, asset_entry[ASSET_REGISTRY_EXPECTED_VAR_SOURCE_NOTATION])
+        destination = os.path.join(output_dir, asset_entry[ASSET_REGISTRY_EXPECTED_VAR_DESTINATION_NOTATION])
+
+        # Keep track of files relative to the output directory so entries sharing a destination don't conflict
+        prefix = Path(os.path.relpath(destination, output_dir)).as_posix() + "/"
+        if prefix == "./":
+            prefix = ""
+
+        copied = shard is None or shard.contains(Sharding.get_asset_entry_key(asset_entry, ASSET_REGISTRY_EXPECTED_VAR_SOURCE_NOTATION, ASSET_REGISTRY_EXPECTED_VAR_DESTINATION_NOTATION))
+        entries.append((source, destination, prefix, copied))
+
+    asset_urls = get_asset_urls(entries, transforms, cache) if fingerprint else {}
+    result.asset_urls.update(asset_urls)
+
+    files = []
+    for source, destination, prefix, copied in entries:
+        if not copied:
+            continue
+
+        rewrite = functools.partial(AssetSync.rewrite_stylesheet, asset_urls, prefix) if fingerprint else None
+        sync_result = copy(source, destination, checksum, link, transforms, fingerprint, cache, rewrite)
+
+        files.extend(prefix + f for f in sync_result.files)
+        result.assets_copied.extend(prefix + f for f in sync_result.copied)
+        result.assets_skipped.extend(prefix + f for f in sync_result.skipped)
+        result.transform_savings.update((prefix + f, saved) for f, saved in sync_result.savings.items())
+        result.asset_urls.update((prefix + f, prefix + fingerprinted) for f, fingerprinted in sync_result.fingerprints.items())
+
+        Profiling.count("assets copied", len(sync_result.copied))
+        Profiling.count("assets skipped", len(sync_result.skipped))
+
+    if previous_manifest is not None:
+        result.assets_deleted.extend(AssetSync.delete_removed(output_dir, previous_manifest.get(Manifest.MANIFEST_VAR_ASSETS_NOTATION, []), files))
+
+    if manifest is not None:
+        manifest[Manifest.MANIFEST_VAR_ASSETS_NOTATION] = sorted(set(files))
+
+def get_asset_urls(entries, transforms=None, cache=None):
+    """
+    Get the fingerprinted paths of the assets of all asset registry entries by their path, relative to the output directory\n
+    Stylesheets are fingerprinted after rewriting their references to other assets, see `asset_sync.rewrite_stylesheet`.
+    As stylesheets can reference each other, they are fingerprinted again until no fingerprint changes
+
+    :param entries: The source, destination and path of the destination relative to the output directory of each entry, along with whether it is copied
+    :param transforms: Optional transforms applying to the assets, see `transform.py`
+    :param cache: Optional `build_cache.BuildCache` to fetch transformed files from
+    """
+
+    asset_urls = {}
+    for source, _, prefix, _ in entries:
+        fingerprints = AssetSync.get_fingerprints(Path(source).resolve(), transforms, cache)
+        asset_urls.update((prefix + f, prefix + fingerprinted) for f, fingerprinted in fingerprints.items())
+
+    # Each pass settles at least one more stylesheet in a chain of stylesheets referencing each other
+    stylesheets = sum(1 for f in asset_urls if os.path.splitext(f)[1].lower() in AssetSync.CSS_EXTENSIONS)
+    for _ in range(stylesheets):
+        changed = {}
+        for source, _, prefix, _ in entries:
+            rewrite = functools.partial(AssetSync.rewrite_stylesheet, asset_urls, prefix)
+            fingerprints = AssetSync.get_fingerprints(Path(source).resolve(), transforms, cache, rewrite, AssetSync.CSS_EXTENSIONS)
+            changed.update((prefix + f, prefix + fingerprinted) for f, fingerprinted in fingerprints.items() if asset_urls.get(prefix + f) != prefix + fingerprinted)
+        if not changed:
+            break
+        asset_urls.update(changed)
+    return asset_urls
+
+def write_asset_manifest(output_dir, asset_urls):
+    """
+    Write the fingerprinted paths of assets to the output directory, so they can be looked up outside of templates too\n
+    Returns whether the file was written, see `write`
+
+    :param output_dir: The output directory of the build
+    :param asset_urls: Fingerprinted output paths of assets by their output path
+    """
+
+    return write(os.path.join(output_dir, ASSET_MANIFEST_FILE_NAME), json.dumps(asset_urls, indent=1, sort_keys=True))
+
+def compress_output(output_dir, result, *, level=Compression.DEFAULT_COMPRESSION_LEVEL, previous_manifest=None, manifest=None):
+    """
+    Write gzip compressed siblings of the built pages and text assets\n
+    Files whose content didn't change since the previous build are not compressed again
+    
+    :param output_dir: The output directory of the build
+    :param result: The `BuildResult` of the build, the pages and assets in it are compressed and compressed files are reported in it
+    :param level: Compression level, from 1 (fastest) to 9 (smallest)
+    :param previous_manifest: Manifest of the previous build, holding what was compressed before
+    :param manifest: Manifest to record compressed files in
+    """
+
+    files = result.written + result.skipped + result.up_to_date + result.assets_copied + result.assets_skipped
+    previous_hashes = previous_manifest.get(Manifest.MANIFEST_VAR_COMPRESSED_NOTATION, {}) if previous_manifest is not None else {}
+
+    compression_result = Compression.compress_files(output_dir, files, previous_hashes, level)
+    result.compressed.extend(compression_result.compressed)
+    result.compress_skipped.extend(compression_result.skipped)
+
+    if manifest is not None:
+        manifest[Manifest.MANIFEST_VAR_COMPRESSED_NOTATION] = compression_result.hashes
+
+def build_site(content_path, build_registry_path, asset_registry_path, output_dir, *, workers=1, incremental=False, asset_checksum=False, asset_link=AssetSync.SYNC_LINK_COPY, lazy_content=False, lazy_cache_size=JsonUtils.DEFAULT_LAZY_CACHE_SIZE, func_cache_path=None, content_workers=1, parse_cache_dir=None, compress=False, compress_level=Compression.DEFAULT_COMPRESSION_LEVEL, transforms=None, fingerprint_assets=False, write_workers=PageWriter.DEFAULT_WRITE_WORKERS, write_queue_size=PageWriter.DEFAULT_WRITE_QUEUE_SIZE, fsync=False, shard=None, stream=False, stream_buffer_size=DEFAULT_STREAM_BUFFER_SIZE, track_content_access=False, build_cache=None, func_concurrency=DEFAULT_FUNC_CONCURRENCY, fragment_cache_path=None):
+    """
+    Build the site\n
+    Pages that fail to build are reported in the returned `BuildResult`, the rest of the site is still built\n
+    A build can be split into shards built by independent invocations, each writing a partial manifest to the output directory.
+    Once the output of all shards is combined, their manifests are merged with `sharding.merge_shards`\n
+    A build cache shares rendered pages and transformed assets between builds, so builds on other machines or of a fresh checkout
+    fetch what was built before instead of building it again, see `build_cache.BuildCache`\n
+    Where the time goes can be measured by profiling while building, see `profiling.py`\n
+    Every build writes a manifest to the output directory, so assets removed since the previous build are deleted, see `copy_assets`
+    
+    :param content_path: The path to the content files
+    :param build_registry_path: Path to the build registry file
+    :param asset_registry_path: Path to the asset registry file
+    :param output_dir: The directory to build the site to
+    :param workers: Number of processes to build pages with
+    :param incremental: Only build pages that changed since the previous build
+    :param asset_checksum: Compare assets by content instead of modification time
+    :param asset_link: How to bring assets over, one of `asset_sync.SYNC_LINK_MODES`
+    :param lazy_content: Only load content files once a page uses them
+    :param lazy_cache_size: Maximum number of lazily loaded content files kept loaded at a time
+    :param func_cache_path: File to keep results of functions with a ttl in between builds, see `json_function_registration.JsonFuncCache`
+    :param content_workers: Number of threads to read and parse content files with
+    :param parse_cache_dir: Directory to cache parsed content files in between builds
+    :param compress: Write gzip compressed siblings of built pages and text assets, see `compress_output`
+    :param compress_level: Compression level, from 1 (fastest) to 9 (smallest)
+    :param transforms: Transforms to apply to pages and assets before writing them, like `minify.MINIFY_TRANSFORMS`. See `transform.py`
+    :param fingerprint_assets: Copy assets with a hash of their content in their name, see `copy_assets` and `asset_url`
+    :param write_workers: Number of threads per build process writing pages while the next pages are rendered, see `page_writer.PageWriter`
+    :param write_queue_size: Maximum number of rendered pages waiting to be written per build process
+    :param fsync: Flush written pages to disk in one batch once all pages are written
+    :param shard: Optional `sharding.Shard` to only build the pages and assets of
+    :param stream: Write pages to disk in chunks while rendering them, so large pages aren't held in memory as a whole. See `write_stream`
+    :param stream_buffer_size: Number of bytes buffered before writing to disk when streaming
+    :param track_content_access: When building incrementally, only build pages again when content they read while rendering changed, see `access_tracking.py`
+    :param build_cache: Optional directory or http url of a build cache to fetch pages and transformed assets from and store them in, see `build_cache.open_store`
+    :param func_concurrency: Maximum number of content function calls running at a time, see `process_content_value`
+    :param fragment_cache_path: Optional file to keep fragments rendered by {% cache %} tags in between builds, see `fragment_cache.py`
     """
 
     output_dir = Path(output_dir).resolve()
 
     # Load all data needed to build the site
-    content = load_content(content_path)
-    build_registry = load_build_registry(build_registry_path)
-    asset_registry = load_asset_registry(asset_registry_path)
+    func_cache = json_function_registration.JsonFuncCache(func_cache_path)
+    content = load_content(content_path, lazy_content, lazy_cache_size, func_cache, content_workers, parse_cache_dir, func_concurrency)
+    with Profiling.phase("load registries"):
+        build_registry = load_build_registry(build_registry_path)
+        asset_registry = load_asset_registry(asset_registry_path)
+
+    # What the previous build produced, to only build what changed and delete assets that were removed
+    # Shards write a partial manifest of their own, so they can be merged
+    manifest_name = shard.get_manifest_name() if shard is not None else Manifest.MANIFEST_FILE_NAME
+    stored_manifest = Manifest.load_manifest(output_dir, manifest_name)
+    manifest = Manifest.create_manifest()
+    previous_manifest = stored_manifest if incremental else None
+
+    cache = BuildCache.BuildCache(BuildCache.open_store(build_cache)) if build_cache is not None else None
+
+    # Copy over each asset entry, first so pages can link to fingerprinted assets
+    result = BuildResult()
+    with Profiling.phase("copy assets"):
+        copy_assets(asset_registry, asset_registry_path, output_dir, result, checksum=asset_checksum, link=asset_link, previous_manifest=stored_manifest, manifest=manifest,
+            transforms=transforms, fingerprint=fingerprint_assets, shard=shard, cache=cache)
+    if fingerprint_assets:
+        write_asset_manifest(output_dir, result.asset_urls)
 
     # Build each registry entry
-    for build_entry in build_registry:
-        final_content = {}
+    with Profiling.phase("build pages"):
+        build_pages(build_registry, content, output_dir, workers=workers, previous_manifest=previous_manifest, manifest=manifest, transforms=transforms,
+            asset_urls=result.asset_urls, result=result, write_workers=write_workers, write_queue_size=write_queue_size, fsync=fsync, shard=shard,
+            stream=stream, stream_buffer_size=stream_buffer_size, track_access=incremental and track_content_access, cache=cache, fragment_cache_path=fragment_cache_path)
 
-        # Load in existing content
-        for k, v in content.items():
-            final_content[k] = v
+    if compress:
+        with Profiling.phase("compress output"):
+            compress_output(output_dir, result, level=compress_level, previous_manifest=stored_manifest, manifest=manifest)
 
-        # Process build item
-        processed_content = get_processed_content_from_build_item(build_entry, content)
+    if shard is not None:
+        manifest[Manifest.MANIFEST_VAR_SHARD_NOTATION] = {
+            Sharding.SHARD_VAR_INDEX_NOTATION: shard.index,
+            Sharding.SHARD_VAR_COUNT_NOTATION: shard.count,
+            Sharding.SHARD_VAR_OUTPUTS_NOTATION: sorted(result.written + result.skipped + result.up_to_date)
+        }
 
-        # Add processed content if existing
-        if processed_content is not None:
-            for k, v in processed_content.items():
-                final_content[k] = v
+    Manifest.save_manifest(output_dir, manifest, manifest_name)
 
-        # Render and write
-        template = render(build_entry[BUILD_REGISTRY_EXPECTED_VAR_TEMPLATE_NOTATION], **{k.capitalize(): v for k, v in final_content.items()})
-        write(os.path.join(output_dir, build_entry[BUILD_REGISTRY_EXPECTED_VAR_OUTPUT_NOTATION]), template)
- 
-    # Copy over each asset entry
-    for asset_entry in asset_registry:
-        copy(os.path.join(asset_registry_path, asset_entry[ASSET_REGISTRY_EXPECTED_VAR_SOURCE_NOTATION]), os.path.join(output_dir, asset_entry[ASSET_REGISTRY_EXPECTED_VAR_DESTINATION_NOTATION]))
+    # Lazily loaded content ressolves functions while building, so only now all results are known
+    func_cache.save()
+    result.func_cache_hits = func_cache.hits
+    result.func_cache_misses = func_cache.misses
+
+    if cache is not None:
+        result.build_cache_hits = cache.hits
+        result.build_cache_misses = cache.misses
+
+    return result
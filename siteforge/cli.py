@@ -0,0 +1,137 @@
+import argparse
+import json
+import sys
+from siteforge import build_cache as BuildCache
+from siteforge import daemon as Daemon
+from siteforge.asset_sync import SYNC_LINK_COPY, SYNC_LINK_MODES
+from siteforge.builder import DEFAULT_STREAM_BUFFER_SIZE, DEFAULT_TEMPLATE_PATH
+from siteforge.compression import DEFAULT_COMPRESSION_LEVEL
+from siteforge.page_writer import DEFAULT_WRITE_QUEUE_SIZE, DEFAULT_WRITE_WORKERS
+
+""" Containing the siteforge command, to serve builds from a daemon and request builds from it, and to serve a build cache
+    """
+
+def create_parser():
+    """ Create the parser of the siteforge command
+    """
+
+    parser = argparse.ArgumentParser(prog="siteforge")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve-builds", help="Keep builds warm in memory and build on request over a Unix domain socket")
+    serve.add_argument('--socket', type=str, default=Daemon.DEFAULT_SOCKET_PATH, help="Path of the Unix domain socket to listen on")
+
+    serve_cache = commands.add_parser("serve-cache", help="Serve a build cache stored in a directory over http, to share it between machines")
+    serve_cache.add_argument('--directory', type=str, required=True, help="The directory to store the build cache in")
+    serve_cache.add_argument('--host', type=str, default=BuildCache.DEFAULT_SERVE_HOST, help="The host to listen on")
+    serve_cache.add_argument('--port', type=int, default=BuildCache.DEFAULT_SERVE_PORT, help="The port to listen on")
+
+    request = commands.add_parser("request", help="Send a request to a running build daemon")
+    request.add_argument('request_command', choices=Daemon.COMMANDS, help="Build what changed, rebuild completely, list sessions or stop the daemon")
+    request.add_argument('--socket', type=str, default=Daemon.DEFAULT_SOCKET_PATH, help="Path of the Unix domain socket the daemon listens on")
+    request.add_argument('--content_path', type=str)
+    request.add_argument('--build_registry_path', type=str)
+    request.add_argument('--asset_registry_path', type=str)
+    request.add_argument('--output', type=str)
+    request.add_argument('--template_path', type=str, default=DEFAULT_TEMPLATE_PATH, help="Directory to load templates from")
+    request.add_argument('--workers', type=int, default=1, help="Number of processes to build pages with")
+    request.add_argument('--asset_checksum', action='store_true', help="Compare assets by content instead of modification time")
+    request.add_argument('--asset_link', type=str, choices=SYNC_LINK_MODES, default=SYNC_LINK_COPY, help="How to bring assets over to the output")
+    request.add_argument('--func_cache', type=str, help="File to keep results of content functions with a ttl in between builds")
+    request.add_argument('--compress', action='store_true', help="Write gzip compressed siblings of built pages and text assets")
+    request.add_argument('--compress_level', type=int, choices=range(1, 10), default=DEFAULT_COMPRESSION_LEVEL, help="Compression level, from 1 (fastest) to 9 (smallest)")
+    request.add_argument('--minify', action='store_true', help="Minify built pages and css assets")
+    request.add_argument('--fingerprint_assets', action='store_true', help="Copy assets with a hash of their content in their name")
+    request.add_argument('--write_workers', type=int, default=DEFAULT_WRITE_WORKERS, help="Number of threads per build process writing pages")
+    request.add_argument('--write_queue_size', type=int, default=DEFAULT_WRITE_QUEUE_SIZE, help="Maximum number of rendered pages waiting to be written per build process")
+    request.add_argument('--fsync', action='store_true', help="Flush written pages to disk in one batch once all pages are written")
+    request.add_argument('--stream', action='store_true', help="Write pages to disk while rendering them")
+    request.add_argument('--stream_buffer_size', type=int, default=DEFAULT_STREAM_BUFFER_SIZE, help="Number of bytes buffered before writing to disk when streaming pages")
+    request.add_argument('--track_content_access', action='store_true', help="Only build pages again when content they read while rendering changed")
+
+    return parser
+
+def create_request(args):
+    """
+    Create the request to send to the daemon from parsed arguments\n
+    Returns None if arguments needed to build are missing
+    """
+
+    command = args.request_command
+    if command in [Daemon.COMMAND_STATUS, Daemon.COMMAND_STOP]:
+        return {Daemon.REQUEST_VAR_COMMAND_NOTATION: command}
+
+    missing = [name for name in ["content_path", "build_registry_path", "asset_registry_path", "output"] if getattr(args, name) is None]
+    if missing:
+        print("Failed to request a " + command + " as --" + ", --".join(missing) + " are missing")
+        return None
+
+    return Daemon.create_build_request(command, content_path=args.content_path, build_registry_path=args.build_registry_path, asset_registry_path=args.asset_registry_path, output_dir=args.output,
+        template_path=args.template_path, workers=args.workers, asset_checksum=args.asset_checksum, asset_link=args.asset_link, func_cache_path=args.func_cache, compress=args.compress, compress_level=args.compress_level,
+        minify=args.minify, fingerprint_assets=args.fingerprint_assets, write_workers=args.write_workers, write_queue_size=args.write_queue_size, fsync=args.fsync,
+        stream=args.stream, stream_buffer_size=args.stream_buffer_size, track_content_access=args.track_content_access)
+
+def serve_cache(directory, host, port):
+    """
+    Serve a build cache over http until interrupted, returns the exit code
+
+    :param directory: The directory to store the build cache in
+    :param host: The host to listen on
+    :param port: The port to listen on
+    """
+
+    try:
+        server = BuildCache.create_cache_server(directory, host, port)
+    except OSError as e:
+        print("Failed to serve build cache on " + host + ":" + str(port) + ": " + str(e))
+        return 1
+
+    print("Serving build cache '" + directory + "' on http://" + host + ":" + str(server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+def main(argv=None):
+    """
+    Run the siteforge command, returns the exit code
+
+    :param argv: The arguments, taken from the command line if not passed
+    """
+
+    args = create_parser().parse_args(argv)
+
+    if args.command == "serve-builds":
+        return 0 if Daemon.BuildDaemon(args.socket).serve() else 1
+
+    if args.command == "serve-cache":
+        return serve_cache(args.directory, args.host, args.port)
+
+    request = create_request(args)
+    if request is None:
+        return 1
+
+    response = Daemon.send_request(request, args.socket)
+    if response is None:
+        return 1
+    if not response[Daemon.RESPONSE_VAR_OK_NOTATION]:
+        print(response[Daemon.RESPONSE_VAR_ERROR_NOTATION])
+        return 1
+
+    if Daemon.RESPONSE_VAR_SESSIONS_NOTATION in response:
+        print(json.dumps(response[Daemon.RESPONSE_VAR_SESSIONS_NOTATION], indent=1))
+    elif Daemon.RESPONSE_VAR_SUMMARY_NOTATION in response:
+        if response[Daemon.RESPONSE_VAR_CHANGES_NOTATION] == {}:
+            print("Nothing changed since the previous build")
+        else:
+            print("Built in " + format(response[Daemon.RESPONSE_VAR_DURATION_NOTATION] * 1000, ".1f") + " ms")
+            print(response[Daemon.RESPONSE_VAR_SUMMARY_NOTATION])
+        if response[Daemon.RESPONSE_VAR_RESULT_NOTATION]["failed"]:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import gzip
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from . import manifest as Manifest
+from . import profiling as Profiling
+
+COMPRESSED_EXTENSION = ".gz"
+COMPRESSIBLE_EXTENSIONS = [".html", ".htm", ".css", ".js", ".mjs", ".json", ".svg", ".xml", ".txt", ".map"]
+DEFAULT_COMPRESSION_LEVEL = 9
+DEFAULT_COMPRESSION_WORKERS = os.cpu_count() or 1
+
+""" Containing functionality to write precompressed siblings of output files, so servers don't have to compress on every request
+    """
+
+class CompressionResult:
+    """
+    Outcome of compressing files\n
+    All paths are relative to the compressed directory. Hashes map each compressed file to the hash of its source
+    """
+
+    def __init__(self):
+        self.compressed = []
+        self.skipped = []
+        self.deleted = []
+        self.hashes = {}
+
+def is_compressible(path):
+    """
+    Check if a file is worth compressing, which are text files
+
+    :param path: Path to the file
+    """
+
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+def compress_bytes(data, level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Gzip compress bytes\n
+    No modification time is stored, so equal data always compresses to equal bytes
+
+    :param data: The bytes to compress
+    :param level: Compression level, from 1 (fastest) to 9 (smallest)
+    """
+
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def _write_compressed(path, data):
+    temp_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + "." + secrets.token_hex(8) + ".tmp")
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _compress_file(directory, relative_path, previous_hash, level):
+    """ Compress a single file, unless its source is unchanged. Returns the hash of the source and whether it was compressed
+    """
+
+    path = os.path.join(directory, relative_path)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    source_hash = Manifest.hash_bytes(data)
+    compressed_path = path + COMPRESSED_EXTENSION
+    if source_hash == previous_hash and os.path.exists(compressed_path):
+        return source_hash, False
+
+    _write_compressed(compressed_path, compress_bytes(data, level))
+    return source_hash, True
+
+def compress_files(directory, files, previous_hashes=None, level=DEFAULT_COMPRESSION_LEVEL, workers=DEFAULT_COMPRESSION_WORKERS):
+    """
+    Write a compressed sibling ending with .gz for each compressible file\n
+    Files whose source hash equals the hash of the previous run are skipped.
+    Compressed siblings of files that were compressed in the previous run but no longer exist are deleted
+
+    :param directory: The directory the file paths are relative to
+    :param files: Paths of the files to compress, relative to the directory. Files that are not compressible are left out
+    :param previous_hashes: Hashes of the previous run, see `CompressionResult`
+    :param level: Compression level, from 1 (fastest) to 9 (smallest)
+    :param workers: Number of threads to compress with
+    """
+
+    result = CompressionResult()
+    previous_hashes = previous_hashes or {}
+    files = sorted(set(f for f in files if is_compressible(f)))
+
+    def compress(relative_path):
+        try:
+            return _compress_file(directory, relative_path, previous_hashes.get(relative_path), level)
+        except OSError as e:
+            print("Failed to compress '" + relative_path + "': " + str(e))
+            return None
+
+    if workers <= 1 or len(files) <= 1:
+        outcomes = [compress(f) for f in files]
+    else:
+        # zlib lets go of the GIL while compressing, so threads compress in parallel
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            outcomes = list(executor.map(compress, files))
+
+    for relative_path, outcome in zip(files, outcomes):
+        if outcome is None:
+            continue
+
+        source_hash, compressed = outcome
+        result.hashes[relative_path] = source_hash
+        if compressed:
+            result.compressed.append(relative_path)
+        else:
+            result.skipped.append(relative_path)
+        Profiling.count_cache("compression", not compressed)
+
+    for relative_path, source_hash in sorted(previous_hashes.items()):
+        if relative_path in result.hashes:
+            continue
+
+        path = os.path.join(directory, relative_path)
+        if os.path.exists(path):
+            # Not part of this run, but still there
+            result.hashes[relative_path] = source_hash
+            continue
+
+        compressed_path = path + COMPRESSED_EXTENSION
+        if os.path.abspath(compressed_path).startswith(os.path.join(os.path.abspath(directory), "")) and os.path.isfile(compressed_path):
+            os.remove(compressed_path)
+            result.deleted.append(relative_path + COMPRESSED_EXTENSION)
+
+    return result
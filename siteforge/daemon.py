@@ -0,0 +1,256 @@
+import json
+import os
+import socket
+import time
+from . import builder
+from . import minify as Minify
+from . import session as Session
+
+DEFAULT_SOCKET_PATH = ".siteforge-daemon.sock"
+
+COMMAND_BUILD = "build"
+COMMAND_REBUILD = "rebuild"
+COMMAND_STATUS = "status"
+COMMAND_STOP = "stop"
+COMMANDS = [COMMAND_BUILD, COMMAND_REBUILD, COMMAND_STATUS, COMMAND_STOP]
+
+REQUEST_VAR_COMMAND_NOTATION = "command"
+REQUEST_VAR_SESSION_NOTATION = "session"
+
+RESPONSE_VAR_OK_NOTATION = "ok"
+RESPONSE_VAR_ERROR_NOTATION = "error"
+RESPONSE_VAR_RESULT_NOTATION = "result"
+RESPONSE_VAR_SUMMARY_NOTATION = "summary"
+RESPONSE_VAR_CHANGES_NOTATION = "changes"
+RESPONSE_VAR_DURATION_NOTATION = "duration"
+RESPONSE_VAR_SESSIONS_NOTATION = "sessions"
+
+# Set in the session of a request instead of transforms, as transforms can't be sent over the socket
+SESSION_VAR_MINIFY_NOTATION = "minify"
+
+# Session arguments holding paths, resolved by the client as the daemon may run in another working directory
+SESSION_PATH_ARGS = ["content_path", "build_registry_path", "asset_registry_path", "output_dir", "func_cache_path", "template_path"]
+
+# Requests and responses are single lines of json
+MESSAGE_SEPARATOR = b"\n"
+RECEIVE_SIZE = 64 * 1024
+
+""" Containing functionality to keep builds warm in a long running process, building on request over a Unix domain socket
+    """
+
+def _send_message(connection, message):
+    connection.sendall(json.dumps(message).encode("utf-8") + MESSAGE_SEPARATOR)
+
+def _receive_message(connection):
+    """ Receive a single message, returns None when the connection closed before a complete message was received
+    """
+
+    data = b""
+    while not MESSAGE_SEPARATOR in data:
+        received = connection.recv(RECEIVE_SIZE)
+        if not received:
+            return None
+        data += received
+    return json.loads(data.split(MESSAGE_SEPARATOR, 1)[0].decode("utf-8"))
+
+def _error(message):
+    return {RESPONSE_VAR_OK_NOTATION: False, RESPONSE_VAR_ERROR_NOTATION: message}
+
+class BuildDaemon:
+    """
+    Keeps builds warm in memory in between requests\n
+    A `session.BuildSession` is kept per distinct set of session arguments, so loaded content, resolved functions,
+    lookup structures and compiled templates are reused by every following request. Each session renders with templates of its own. Building again only reloads
+    and renders what changed since the previous build of the session. Requests are handled one at a time
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH):
+        """
+        :param socket_path: Path of the Unix domain socket to listen on
+        """
+
+        self.socket_path = socket_path
+        self.sessions = {}
+        self.running = False
+
+    def get_session(self, args):
+        """
+        Get the session for a set of session arguments, creating it if there isn't one yet
+
+        :param args: Arguments of `session.BuildSession`, with minify instead of transforms
+        """
+
+        key = json.dumps(args, sort_keys=True)
+        if not key in self.sessions:
+            session_args = dict(args)
+            if session_args.pop(SESSION_VAR_MINIFY_NOTATION, False):
+                session_args["transforms"] = Minify.MINIFY_TRANSFORMS
+            self.sessions[key] = Session.BuildSession(**session_args)
+        return self.sessions[key]
+
+    def handle(self, request):
+        """
+        Handle a request, returning the response\n
+        Building a session for the first time loads and builds the site completely, rebuilding it also renders every page again.
+        Otherwise only what changed is built
+
+        :param request: The request, holding a command and for builds the session arguments
+        """
+
+        if not isinstance(request, dict):
+            return _error("Request is not a json object")
+
+        command = request.get(REQUEST_VAR_COMMAND_NOTATION)
+        if command == COMMAND_STOP:
+            self.running = False
+            return {RESPONSE_VAR_OK_NOTATION: True}
+        if command == COMMAND_STATUS:
+            return {RESPONSE_VAR_OK_NOTATION: True, RESPONSE_VAR_SESSIONS_NOTATION: [json.loads(key) for key in self.sessions]}
+        if not command in COMMANDS:
+            return _error("Unknown command '" + str(command) + "', expected one of " + ", ".join(COMMANDS))
+
+        args = request.get(REQUEST_VAR_SESSION_NOTATION)
+        if not isinstance(args, dict):
+            return _error("Build request is missing '" + REQUEST_VAR_SESSION_NOTATION + "'")
+
+        key = json.dumps(args, sort_keys=True)
+        is_new = not key in self.sessions
+        try:
+            session = self.get_session(args)
+        except TypeError as e:
+            return _error("Invalid session: " + str(e))
+
+        start = time.perf_counter()
+        try:
+            if is_new or command == COMMAND_REBUILD:
+                changes = None
+                result = session.build(force=command == COMMAND_REBUILD)
+            else:
+                changes = session.poll()
+                result = session.build(changes) if changes else builder.BuildResult()
+        except Exception as e:
+            # A session that never built completely is built from scratch by the next request
+            if is_new:
+                del self.sessions[key]
+            return _error(type(e).__name__ + ": " + str(e))
+        duration = time.perf_counter() - start
+
+        return {
+            RESPONSE_VAR_OK_NOTATION: True,
+            RESPONSE_VAR_CHANGES_NOTATION: None if changes is None else {kind: sorted(files) for kind, files in changes.items()},
+            RESPONSE_VAR_DURATION_NOTATION: duration,
+            RESPONSE_VAR_RESULT_NOTATION: result.to_json(),
+            RESPONSE_VAR_SUMMARY_NOTATION: result.summary()
+        }
+
+    def _remove_stale_socket(self):
+        """ Remove a socket left behind by a daemon that stopped, returns False if a daemon is still listening on it
+        """
+
+        if not os.path.exists(self.socket_path):
+            return True
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            try:
+                connection.connect(self.socket_path)
+                return False
+            except OSError:
+                pass
+
+        os.remove(self.socket_path)
+        return True
+
+    def serve(self):
+        """
+        Listen on the socket and handle requests until a stop request is received\n
+        Returns False if the daemon couldn't listen on the socket
+        """
+
+        if not hasattr(socket, "AF_UNIX"):
+            print("Failed to serve builds as Unix domain sockets aren't supported on this platform")
+            return False
+
+        if not self._remove_stale_socket():
+            print("Failed to serve builds on '" + self.socket_path + "' as another daemon is listening on it")
+            return False
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(self.socket_path)
+            server.listen()
+            print("Serving builds on '" + self.socket_path + "'")
+
+            self.running = True
+            while self.running:
+                connection, _ = server.accept()
+                with connection:
+                    self._serve_connection(connection)
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+        return True
+
+    def _serve_connection(self, connection):
+        try:
+            request = _receive_message(connection)
+        except ValueError as e:
+            _send_message(connection, _error("Request is not valid json: " + str(e)))
+            return
+        except OSError as e:
+            print("Failed to receive request: " + str(e))
+            return
+
+        if request is None:
+            return
+
+        response = self.handle(request)
+        if response.get(RESPONSE_VAR_SUMMARY_NOTATION) is not None:
+            print(str(request.get(REQUEST_VAR_COMMAND_NOTATION)).capitalize() + " of '" + str(request[REQUEST_VAR_SESSION_NOTATION].get("output_dir")) + "' took " + format(response[RESPONSE_VAR_DURATION_NOTATION] * 1000, ".1f") + " ms")
+        elif not response[RESPONSE_VAR_OK_NOTATION]:
+            print(response[RESPONSE_VAR_ERROR_NOTATION])
+
+        try:
+            _send_message(connection, response)
+        except OSError as e:
+            print("Failed to respond to request: " + str(e))
+
+def send_request(request, socket_path=DEFAULT_SOCKET_PATH):
+    """
+    Send a request to a running daemon and wait for its response\n
+    Returns None if no daemon could be reached
+
+    :param request: The request, see `BuildDaemon.handle`
+    :param socket_path: Path of the Unix domain socket the daemon listens on
+    """
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("Failed to reach the build daemon as Unix domain sockets aren't supported on this platform")
+        return None
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except OSError as e:
+            print("Failed to reach the build daemon on '" + socket_path + "': " + str(e))
+            return None
+
+        _send_message(connection, request)
+        return _receive_message(connection)
+
+def create_build_request(command, **session_args):
+    """
+    Create a build request, resolving paths so they don't depend on the working directory of the daemon\n
+    Templates are loaded from the templates directory in the working directory of the client unless a template path is passed
+
+    :param command: The command, `COMMAND_BUILD` or `COMMAND_REBUILD`
+    :param session_args: Arguments of `session.BuildSession`, with minify instead of transforms
+    """
+
+    if session_args.get("template_path") is None:
+        session_args["template_path"] = builder.DEFAULT_TEMPLATE_PATH
+    for name in SESSION_PATH_ARGS:
+        if session_args.get(name) is not None:
+            session_args[name] = os.path.abspath(session_args[name])
+    return {REQUEST_VAR_COMMAND_NOTATION: command, REQUEST_VAR_SESSION_NOTATION: session_args}
@@ -0,0 +1,197 @@
+import json
+import os
+from jinja2 import nodes
+from jinja2.exceptions import TemplateNotFound
+from jinja2.ext import Extension
+from markupsafe import Markup
+from . import access_tracking as AccessTracking
+from . import build_cache as BuildCache
+from . import manifest as Manifest
+from . import profiling as Profiling
+
+FRAGMENT_CACHE_VERSION = 1
+
+FRAGMENT_CACHE_VAR_VERSION_NOTATION = "version"
+FRAGMENT_CACHE_VAR_STAMP_NOTATION = "stamp"
+FRAGMENT_CACHE_VAR_FRAGMENTS_NOTATION = "fragments"
+
+""" Containing functionality to render blocks shared between pages once, with a {% cache %} tag in templates
+    """
+
+def _get_globals_state(environment):
+    """ Get the globals of an environment templates can read as data, leaving out functions and classes
+    """
+
+    return {name: value for name, value in environment.globals.items() if not callable(value)}
+
+def get_template_stamp(environment, state=None):
+    """
+    Get a hash of the source of all templates of an environment, the globals they can read and the code rendering them\n
+    Fragments kept in between builds are only reused while it is the same. Returns None if the templates can't be listed
+
+    :param environment: The jinja2 environment
+    :param state: Optional json serializable state functions called by templates read, like the asset urls `asset_url` returns
+    """
+
+    try:
+        names = sorted(environment.loader.list_templates())
+    except (AttributeError, TypeError):
+        return None
+
+    sources = {}
+    for name in names:
+        try:
+            sources[name] = Manifest.hash_bytes(environment.loader.get_source(environment, name)[0].encode("utf-8"))
+        except TemplateNotFound:
+            continue
+    return Manifest.hash_json({"code": BuildCache.get_code_version(), "templates": sources, "globals": _get_globals_state(environment), "state": state})
+
+class FragmentCache:
+    """
+    Rendered fragments of templates by their key\n
+    A fragment is keyed by the block it was rendered from and the key and values passed to its {% cache %} tag, see `FragmentCacheExtension`.
+    Fragments rendered since the cache was last collected from are kept apart, so build processes can send them back to the main process\n
+    Lookups are counted as hits when a fragment was reused and misses when it had to be rendered
+    """
+
+    def __init__(self):
+        self.fragments = {}
+        self.hits = 0
+        self.misses = 0
+        self._added = {}
+
+    def clear(self):
+        """ Forget all fragments, as they may depend on content or templates that changed
+        """
+
+        self.fragments.clear()
+        self._added.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, block, values):
+        """
+        Get the key of a fragment
+
+        :param block: The template and position within it of the {% cache %} tag
+        :param values: The key and values passed to the tag
+        """
+
+        return Manifest.hash_json([block, AccessTracking.untrack(values)])
+
+    def render(self, block, values, caller):
+        """
+        Get a rendered fragment, rendering it if it wasn't rendered before
+
+        :param block: The template and position within it of the {% cache %} tag
+        :param values: The key and values passed to the tag
+        :param caller: Function rendering the body of the tag
+        """
+
+        key = self.get_key(block, values)
+        fragment = self.fragments.get(key)
+        Profiling.count_cache("fragments", fragment is not None)
+        if fragment is not None:
+            self.hits += 1
+            return fragment
+
+        self.misses += 1
+        fragment = caller()
+        self.fragments[key] = fragment
+        self._added[key] = fragment
+        return fragment
+
+    def take_collected(self):
+        """ Take the fragments rendered and the hits and misses counted since last taken, see `merge`
+        """
+
+        collected = self._added, self.hits, self.misses
+        self._added = {}
+        self.hits = 0
+        self.misses = 0
+        return collected
+
+    def merge(self, fragments, hits, misses):
+        """
+        Merge what another cache collected, like the cache of a build process
+
+        :param fragments: Fragments rendered by the other cache
+        :param hits: Hits counted by the other cache
+        :param misses: Misses counted by the other cache
+        """
+
+        self.fragments.update(fragments)
+        self.hits += hits
+        self.misses += misses
+
+    def load(self, path, stamp):
+        """
+        Load fragments kept by a previous build\n
+        Fragments are ignored if they were rendered from other templates or by other code
+
+        :param path: File the fragments were saved to
+        :param stamp: The current template stamp, see `get_template_stamp`
+        """
+
+        if stamp is None or not os.path.exists(path):
+            return
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            print("Ignoring fragment cache '" + path + "' as it can't be read")
+            return
+
+        if not isinstance(data, dict) or data.get(FRAGMENT_CACHE_VAR_VERSION_NOTATION) != FRAGMENT_CACHE_VERSION or data.get(FRAGMENT_CACHE_VAR_STAMP_NOTATION) != stamp:
+            return
+
+        for key, (text, markup) in data.get(FRAGMENT_CACHE_VAR_FRAGMENTS_NOTATION, {}).items():
+            self.fragments[key] = Markup(text) if markup else text
+
+    def save(self, path, stamp):
+        """
+        Keep the fragments for later builds
+
+        :param path: File to save the fragments to
+        :param stamp: The current template stamp, see `get_template_stamp`. Nothing is saved if it is None
+        """
+
+        if stamp is None:
+            print("Not keeping fragment cache '" + path + "' as the templates can't be listed")
+            return
+
+        fragments = {key: [str(fragment), isinstance(fragment, Markup)] for key, fragment in self.fragments.items()}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({FRAGMENT_CACHE_VAR_VERSION_NOTATION: FRAGMENT_CACHE_VERSION, FRAGMENT_CACHE_VAR_STAMP_NOTATION: stamp, FRAGMENT_CACHE_VAR_FRAGMENTS_NOTATION: fragments}, f)
+
+class FragmentCacheExtension(Extension):
+    """
+    Adds a {% cache key %}...{% endcache %} tag to templates, rendering its body once and reusing it wherever the tag is used again with the same key\n
+    Values the body depends on are passed after the key, like {% cache "nav", Info.Menu %}. A fragment is only reused when the key and
+    all values are equal, so content read within the body should be passed along. Fragments are kept in the `FragmentCache` of the environment,
+    as `environment.fragment_cache`
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        values = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            values.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+
+        # Blocks are told apart by their template and position in it, so equal keys in different blocks don't share fragments
+        index = getattr(parser, "_fragment_block_count", 0)
+        parser._fragment_block_count = index + 1
+        block = nodes.Const(str(parser.name) + ":" + str(index))
+        return nodes.CallBlock(self.call_method("_render", [block, nodes.List(values)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, block, values, caller):
+        return self.environment.fragment_cache.render(block, values, caller)
@@ -1,12 +1,104 @@
 import argparse
-from siteforge.builder import build_site
+import sys
+from siteforge import profiling
+from siteforge.asset_sync import SYNC_LINK_COPY, SYNC_LINK_MODES
+from siteforge.compression import DEFAULT_COMPRESSION_LEVEL
+from siteforge.builder import DEFAULT_FUNC_CONCURRENCY, DEFAULT_STREAM_BUFFER_SIZE, build_site, compile_templates, set_bytecode_cache, use_template_bundle
+from siteforge.json_utils import DEFAULT_LAZY_CACHE_SIZE
+from siteforge.minify import MINIFY_TRANSFORMS
+from siteforge.page_writer import DEFAULT_WRITE_QUEUE_SIZE, DEFAULT_WRITE_WORKERS
+from siteforge.session import BuildSession
+from siteforge.sharding import parse_shard
+from siteforge.watch import DEFAULT_POLL_INTERVAL, watch
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--content_path', type=str, required=True)
 parser.add_argument('--build_registry_path', type=str, required=True)
 parser.add_argument('--asset_registry_path', type=str, required=True)
 parser.add_argument('--output', type=str, required=True)
+parser.add_argument('--workers', type=int, default=1, help="Number of processes to build pages with")
+parser.add_argument('--incremental', action='store_true', help="Only build pages that changed since the previous build")
+parser.add_argument('--asset_checksum', action='store_true', help="Compare assets by content instead of modification time")
+parser.add_argument('--asset_link', type=str, choices=SYNC_LINK_MODES, default=SYNC_LINK_COPY, help="How to bring assets over to the output")
+parser.add_argument('--bytecode_cache', type=str, help="Directory to cache compiled templates in between runs")
+parser.add_argument('--compile_templates', type=str, help="Precompile all templates into a bundle at this path and build with it")
+parser.add_argument('--template_bundle', type=str, help="Build with templates precompiled into a bundle at this path")
+parser.add_argument('--write_workers', type=int, default=DEFAULT_WRITE_WORKERS, help="Number of threads per build process writing pages while the next pages are rendered")
+parser.add_argument('--write_queue_size', type=int, default=DEFAULT_WRITE_QUEUE_SIZE, help="Maximum number of rendered pages waiting to be written per build process")
+parser.add_argument('--fsync', action='store_true', help="Flush written pages to disk in one batch once all pages are written")
+parser.add_argument('--stream', action='store_true', help="Write pages to disk while rendering them, so large pages aren't held in memory as a whole")
+parser.add_argument('--stream_buffer_size', type=int, default=DEFAULT_STREAM_BUFFER_SIZE, help="Number of bytes buffered before writing to disk when streaming pages")
+parser.add_argument('--track_content_access', action='store_true', help="When building incrementally, only build pages again when content they read while rendering changed")
+parser.add_argument('--build_cache', type=str, help="Directory or http url of a build cache shared between builds, to fetch pages and transformed assets built before from")
+parser.add_argument('--fragment_cache', type=str, help="File to keep fragments rendered by {% cache %} tags in between builds, reused while templates don't change")
+parser.add_argument('--shard', type=parse_shard, help="Only build shard i of N, denoted as i/N. Merge the output of all shards with merge_shards.py")
+parser.add_argument('--lazy_content', action='store_true', help="Only load content files once a page uses them")
+parser.add_argument('--lazy_cache_size', type=int, default=DEFAULT_LAZY_CACHE_SIZE, help="Maximum number of lazily loaded content files kept loaded at a time")
+parser.add_argument('--func_cache', type=str, help="File to keep results of content functions with a ttl in between builds")
+parser.add_argument('--func_concurrency', type=int, default=DEFAULT_FUNC_CONCURRENCY, help="Maximum number of content functions running at a time, for functions registered as async or with thread=True")
+parser.add_argument('--content_workers', type=int, default=1, help="Number of threads to read and parse content files with")
+parser.add_argument('--parse_cache', type=str, help="Directory to cache parsed content files in between builds")
+parser.add_argument('--watch', action='store_true', help="Keep running and rebuild what changed while editing, always building incrementally")
+parser.add_argument('--watch_interval', type=float, default=DEFAULT_POLL_INTERVAL, help="Seconds between polling for changes when watching")
+parser.add_argument('--compress', action='store_true', help="Write gzip compressed siblings of built pages and text assets")
+parser.add_argument('--compress_level', type=int, choices=range(1, 10), default=DEFAULT_COMPRESSION_LEVEL, help="Compression level, from 1 (fastest) to 9 (smallest)")
+parser.add_argument('--fingerprint_assets', action='store_true', help="Copy assets with a hash of their content in their name, link to them with asset_url in templates")
+parser.add_argument('--minify', action='store_true', help="Minify built pages and css assets")
+parser.add_argument('--profile', type=str, help="Measure where the time of the build goes and write the results as json to this path")
+parser.add_argument('--profile_trace', type=str, help="Measure where the time of the build goes and write a Chrome trace to this path")
+
+# Options of builds that watching doesn't support, as it keeps all content loaded and builds the whole site in one session
+WATCH_UNSUPPORTED_ARGS = ["lazy_content", "lazy_cache_size", "content_workers", "parse_cache", "build_cache", "fragment_cache", "shard"]
+
+def save_profile(args):
+    profiler = profiling.disable()
+    if profiler is None:
+        return
+
+    if args.profile:
+        profiler.save(args.profile)
+    if args.profile_trace:
+        profiler.save_chrome_trace(args.profile_trace)
 
 if __name__ == "__main__":
     args = parser.parse_args()
-    build_site(args.content_path, args.build_registry_path, args.asset_registry_path, args.output)
\ No newline at end of file
+
+    if args.profile or args.profile_trace:
+        profiling.enable()
+
+    if args.bytecode_cache:
+        set_bytecode_cache(args.bytecode_cache)
+    if args.compile_templates:
+        compile_templates(args.compile_templates)
+        use_template_bundle(args.compile_templates)
+    elif args.template_bundle:
+        use_template_bundle(args.template_bundle)
+
+    transforms = MINIFY_TRANSFORMS if args.minify else None
+
+    if args.watch:
+        unsupported = [name for name in WATCH_UNSUPPORTED_ARGS if getattr(args, name) != parser.get_default(name)]
+        if unsupported:
+            parser.error("--watch can't be combined with --" + ", --".join(unsupported))
+
+        try:
+            watch(BuildSession(args.content_path, args.build_registry_path, args.asset_registry_path, args.output, workers=args.workers,
+                asset_checksum=args.asset_checksum, asset_link=args.asset_link, func_cache_path=args.func_cache, compress=args.compress,
+                compress_level=args.compress_level, transforms=transforms, fingerprint_assets=args.fingerprint_assets, write_workers=args.write_workers,
+                write_queue_size=args.write_queue_size, fsync=args.fsync, stream=args.stream, stream_buffer_size=args.stream_buffer_size,
+                track_content_access=args.track_content_access, func_concurrency=args.func_concurrency), args.watch_interval)
+        except KeyboardInterrupt:
+            save_profile(args)
+            sys.exit(0)
+
+    result = build_site(args.content_path, args.build_registry_path, args.asset_registry_path, args.output, workers=args.workers, incremental=args.incremental,
+        asset_checksum=args.asset_checksum, asset_link=args.asset_link, lazy_content=args.lazy_content, lazy_cache_size=args.lazy_cache_size,
+        func_cache_path=args.func_cache, content_workers=args.content_workers, parse_cache_dir=args.parse_cache, compress=args.compress,
+        compress_level=args.compress_level, transforms=transforms, fingerprint_assets=args.fingerprint_assets, write_workers=args.write_workers,
+        write_queue_size=args.write_queue_size, fsync=args.fsync, shard=args.shard, stream=args.stream, stream_buffer_size=args.stream_buffer_size,
+        track_content_access=args.track_content_access, build_cache=args.build_cache, func_concurrency=args.func_concurrency,
+        fragment_cache_path=args.fragment_cache)
+    save_profile(args)
+    print(result.summary())
+    if result.failed:
+        sys.exit(1)
\ No newline at end of file
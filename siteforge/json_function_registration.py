@@ -1,13 +1,210 @@
+import asyncio
+import inspect
+import json
+import os
+import time
+from . import profiling as Profiling
+
 JSON_FUNCTION_REFERENCES = {}
+JSON_FUNCTION_OPTIONS = {}
+
+class JsonFuncOptions:
+    """
+    Options of a function referenced through json\n
+    - pure: The function always returns the same result for the same arguments, so it's called once per build
+    - ttl: Seconds a result can be reused across builds, when building with a persistent `JsonFuncCache`
+    - thread: The function waits on I/O, so calls are run on threads concurrently with other calls
+    - coroutine: The function is an `async def` function, so calls are awaited concurrently with other calls. Detected when registering
+    """
+
+    def __init__(self, pure=False, ttl=None, thread=False, coroutine=False):
+        self.pure = pure
+        self.ttl = ttl
+        self.thread = thread
+        self.coroutine = coroutine
+
+    def is_cacheable(self):
+        return self.pure or self.ttl is not None
 
-def json_func(func):
+    def is_concurrent(self):
+        return self.thread or self.coroutine
+
+def json_func(func=None, pure=False, ttl=None, thread=False):
     """
     Register a function to be referenced through json\n
-    If wanting a function to be referenced by json, 
+    If wanting a function to be referenced by json,
     please use the @json_func above the function definition after importing this file\n
-    
+    Results can be cached by passing options, like @json_func(pure=True, ttl=3600). See `JsonFuncOptions`\n
+    Functions waiting on I/O, like reading file stats or running a subprocess, can be called concurrently with other calls
+    by registering them as `async def` functions, or with @json_func(thread=True)
+
     :param func: The function
+    :param pure: The function always returns the same result for the same arguments
+    :param ttl: Seconds a result can be reused across builds
+    :param thread: Run calls to the function on threads
     """
 
-    JSON_FUNCTION_REFERENCES[func.__name__] = func
-    return func
\ No newline at end of file
+    def _register(func):
+        JSON_FUNCTION_REFERENCES[func.__name__] = func
+        JSON_FUNCTION_OPTIONS[func.__name__] = JsonFuncOptions(pure, ttl, thread, inspect.iscoroutinefunction(func))
+        return func
+
+    # Used as @json_func without options
+    if func is not None:
+        return _register(func)
+
+    return _register
+
+def has_concurrent_functions():
+    """ Check if any registered function is called concurrently, see `JsonFuncOptions.is_concurrent`
+    """
+
+    return any(options.is_concurrent() for options in JSON_FUNCTION_OPTIONS.values())
+
+class JsonFuncCache:
+    """
+    Results of functions referenced through json\n
+    Calls with identical name and arguments to pure functions are only evaluated once per cache, use one cache per build.
+    With a path, results of functions with a ttl are also stored on disk and reused by later builds until they expire
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._results = {}
+        self._persistent = {}
+        self._running = {}
+
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._persistent = json.load(f)
+            except (OSError, ValueError):
+                print("Ignoring json function cache '" + path + "' as it can't be read")
+
+    def call(self, name, args, kwargs):
+        """
+        Call a registered function, or get its result from the cache
+
+        :param name: Name of the registered function
+        :param args: Arguments to call the function with
+        :param kwargs: Keyword arguments to call the function with
+        """
+
+        func = JSON_FUNCTION_REFERENCES[name]
+        options = JSON_FUNCTION_OPTIONS.get(name, JsonFuncOptions())
+        key = self._get_key(name, args, kwargs, options)
+        if key is None:
+            return func(*args, **kwargs)
+
+        found, value = self._get_result(key, options)
+        if found:
+            return value
+
+        value = func(*args, **kwargs)
+        self._set_result(key, options, value)
+        return value
+
+    async def call_async(self, name, args, kwargs, run):
+        """
+        Call a registered function within an event loop, or get its result from the cache\n
+        Identical calls to cacheable functions running at the same time are only evaluated once
+
+        :param name: Name of the registered function
+        :param args: Arguments to call the function with
+        :param kwargs: Keyword arguments to call the function with
+        :param run: Coroutine function evaluating the call, taking the function, arguments and keyword arguments
+        """
+
+        func = JSON_FUNCTION_REFERENCES[name]
+        options = JSON_FUNCTION_OPTIONS.get(name, JsonFuncOptions())
+        key = self._get_key(name, args, kwargs, options)
+        if key is None:
+            return await run(func, args, kwargs)
+
+        if key in self._running:
+            Profiling.count_cache("functions", True)
+            self.hits += 1
+            return await asyncio.shield(self._running[key])
+
+        found, value = self._get_result(key, options)
+        if found:
+            return value
+
+        self._running[key] = asyncio.ensure_future(run(func, args, kwargs))
+        try:
+            value = await self._running[key]
+        finally:
+            del self._running[key]
+
+        self._set_result(key, options, value)
+        return value
+
+    def _get_key(self, name, args, kwargs, options):
+        """ Get the key results of a call are cached by, or None if they aren't cached
+        """
+
+        if not options.is_cacheable():
+            return None
+
+        try:
+            return json.dumps([name, args, kwargs], sort_keys=True, separators=(",", ":"))
+        except TypeError:
+            # Arguments that aren't json can't be compared reliably
+            return None
+
+    def _get_result(self, key, options):
+        """ Get whether a result is cached for a call and the result, counting it as a miss when it isn't
+        """
+
+        if key in self._results:
+            Profiling.count_cache("functions", True)
+            self.hits += 1
+            return True, self._results[key]
+
+        if options.ttl is not None and key in self._persistent:
+            entry = self._persistent[key]
+            if time.time() - entry["time"] < options.ttl:
+                Profiling.count_cache("functions", True)
+                self.hits += 1
+                self._results[key] = entry["value"]
+                return True, entry["value"]
+
+        Profiling.count_cache("functions", False)
+        self.misses += 1
+        return False, None
+
+    def _set_result(self, key, options, value):
+        self._results[key] = value
+
+        if options.ttl is not None:
+            self._persistent[key] = {"time": time.time(), "ttl": options.ttl, "value": value}
+
+    def save(self):
+        """
+        Store results of functions with a ttl on disk, if the cache has a path\n
+        Expired results are left out
+        """
+
+        if self.path is None:
+            return
+
+        now = time.time()
+        persistent = {}
+        for key, entry in self._persistent.items():
+            if now - entry["time"] >= entry["ttl"]:
+                continue
+
+            # Results that aren't json are only cached for this build
+            try:
+                json.dumps(entry["value"])
+            except TypeError:
+                continue
+
+            persistent[key] = entry
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(persistent, f)
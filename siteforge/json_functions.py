@@ -6,6 +6,6 @@ from datetime import datetime
 Containing handy methods to be referenced by json
 """
 
-@json_func
+@json_func(pure=True)
 def current_year():
     return datetime.today().year
\ No newline at end of file
@@ -0,0 +1,174 @@
+import functools
+import json
+import operator
+from . import json_utils as JsonUtils
+
+QUERY_VAR_KEY_NOTATION = "Key"
+QUERY_VAR_VALUE_NOTATION = "Value"
+QUERY_VAR_OP_NOTATION = "Op"
+QUERY_VAR_AND_NOTATION = "And"
+QUERY_VAR_OR_NOTATION = "Or"
+
+KEY_PATH_SEPARATOR = "."
+
+QUERY_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge
+}
+
+""" Containing functionality to select json objects with queries of several conditions
+    """
+
+class QueryError(ValueError):
+    """
+    A query that can't be compiled
+    """
+
+_MISSING = object()
+
+def _get_path_value(json, path):
+    """ Get the value at a key path within a json object, or `_MISSING` if the path doesn't exist
+    """
+
+    value = json
+    for key in path:
+        if not isinstance(value, dict) or not key in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+class Condition:
+    """
+    Compares the value at a key path of an object against a value\n
+    A key path is a key, or keys leading into nested objects separated by dots like 'Meta.Year'
+    """
+
+    def __init__(self, key, op, value):
+        self.path = key.split(KEY_PATH_SEPARATOR)
+        self.op = op
+        self.compare = QUERY_OPERATORS[op]
+        self.value = value
+
+    def matches(self, json):
+        value = _get_path_value(json, self.path)
+        if value is _MISSING:
+            return False
+
+        try:
+            return bool(self.compare(value, self.value))
+        except TypeError:
+            # Values that can't be compared, like a string to a number, don't match
+            return False
+
+    def get_candidates(self, index):
+        """ Get the indexed objects that can match, a superset of the objects that do match
+        """
+
+        # Equality on a single key is a direct lookup
+        if self.op == "==" and len(self.path) == 1:
+            return index.get_filtered_objects(JsonUtils.JsonFilter(self.path[0], self.value))
+
+        return index.keys.get(self.path[0], [])
+
+class And:
+    """
+    Matches objects matching all of its queries
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    def matches(self, json):
+        return all(q.matches(json) for q in self.queries)
+
+    def get_candidates(self, index):
+        # Only the smallest set of candidates has to be checked against the other queries
+        smallest = None
+        for query in self.queries:
+            candidates = query.get_candidates(index)
+            if smallest is None or len(candidates) < len(smallest):
+                smallest = candidates
+            if not smallest:
+                break
+        return smallest if smallest is not None else []
+
+class Or:
+    """
+    Matches objects matching any of its queries
+    """
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    def matches(self, json):
+        return any(q.matches(json) for q in self.queries)
+
+    def get_candidates(self, index):
+        # Merge candidates of all queries, keeping the order of the indexed json
+        candidates = {}
+        for query in self.queries:
+            for candidate in query.get_candidates(index):
+                candidates[id(candidate)] = candidate
+        return sorted(candidates.values(), key=index.get_position)
+
+def _compile(where):
+    if not isinstance(where, dict):
+        raise QueryError("Query is not an object: " + str(where))
+
+    if QUERY_VAR_AND_NOTATION in where or QUERY_VAR_OR_NOTATION in where:
+        kind = QUERY_VAR_AND_NOTATION if QUERY_VAR_AND_NOTATION in where else QUERY_VAR_OR_NOTATION
+        queries = where[kind]
+        if not isinstance(queries, list) or not queries:
+            raise QueryError("'" + kind + "' requires a non empty array of queries")
+
+        compiled = [_compile(q) for q in queries]
+        return And(compiled) if kind == QUERY_VAR_AND_NOTATION else Or(compiled)
+
+    for required in [QUERY_VAR_KEY_NOTATION, QUERY_VAR_VALUE_NOTATION]:
+        if not required in where:
+            raise QueryError("Missing required query entry '" + required + "' in " + str(where))
+
+    op = where.get(QUERY_VAR_OP_NOTATION, "==")
+    if not op in QUERY_OPERATORS:
+        raise QueryError("Unknown query operator '" + str(op) + "', expected one of " + ", ".join(QUERY_OPERATORS))
+
+    return Condition(where[QUERY_VAR_KEY_NOTATION], op, where[QUERY_VAR_VALUE_NOTATION])
+
+@functools.lru_cache(maxsize=1024)
+def _compile_cached(where_json):
+    return _compile(json.loads(where_json))
+
+def compile_query(where):
+    """
+    Compile a Where clause into a query that can be executed against an index\n
+    A Where clause is either
+    - A condition: {"Key": "Id", "Value": "Project1"}, optionally with an "Op" of ==, !=, <, <=, > or >= where == is the default.
+    The key can be a path into nested objects separated by dots like 'Meta.Year'
+    - {"And": [...]} matching objects matching all clauses, or {"Or": [...]} matching objects matching any clause
+
+    Identical clauses are only compiled once. Raises a `QueryError` when the clause is not valid
+
+    :param where: The Where clause
+    """
+
+    try:
+        where_json = json.dumps(where, sort_keys=True)
+    except TypeError:
+        return _compile(where)
+
+    return _compile_cached(where_json)
+
+def execute_query(query, index):
+    """
+    Get the indexed objects matching a compiled query, in the order they are found in the indexed json\n
+    Only candidates found through the index are checked against the query instead of all objects
+
+    :param query: The query, see `compile_query`
+    :param index: The `json_utils.JsonIndex` to query
+    """
+
+    return [c for c in query.get_candidates(index) if query.matches(c)]
@@ -1,8 +1,26 @@
+import hashlib
 import json
 import os
+import pickle
+import secrets
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from . import profiling as Profiling
 JSON_EXTENSION = '.json'
 
+PARSE_CACHE_EXTENSION = '.pickle'
+
+# Use a faster json parser when installed, parsing json from bytes
+try:
+    import orjson
+    _DEFAULT_JSON_LOADS = orjson.loads
+except ImportError:
+    _DEFAULT_JSON_LOADS = json.loads
+
+_json_loads = _DEFAULT_JSON_LOADS
+
 """
 Containing utilities for json operations
 """
@@ -16,25 +34,77 @@ class JsonFilter:
         self.key = key
         self.value = value
 
-def load_objects(path):
+DEFAULT_LAZY_CACHE_SIZE = 64
+
+class LazyObjects(Mapping):
     """
-    Loading json data where the input is expected to be a path to input files\n
-    Data will be loaded in as a dictionary, where\n
+    Json data of input files that is only loaded once accessed\n
+    Behaves like the dictionary returned by `load_objects`, where
     - The key is the name of the file
-    - The value is the loaded json structure 
+    - The value is the loaded json structure, loaded the first time it is accessed
+
+    At most cache_size files are kept loaded at a time. The least recently accessed file is let go of first,
+    and loaded again when accessed later on
+    """
+
+    def __init__(self, path, process=None, cache_size=DEFAULT_LAZY_CACHE_SIZE, parse_cache_dir=None):
+        """
+        :param path: Path to the directory containing input files
+        :param process: Optional function processing loaded json data before it is cached
+        :param cache_size: Maximum number of files kept loaded at a time
+        :param parse_cache_dir: Optional directory to cache parsed files in, see `load_object`
+        """
+
+        self.files = _get_object_files(path)
+        self.process = process
+        self.cache_size = max(1, cache_size)
+        self.parse_cache_dir = parse_cache_dir
+        self._cache = OrderedDict()
+
+    def __getitem__(self, name):
+        if name in self._cache:
+            Profiling.count_cache("lazy content", True)
+            self._cache.move_to_end(name)
+            return self._cache[name]
+
+        Profiling.count_cache("lazy content", False)
+        data = load_object(self.files[name], self.parse_cache_dir)
+        if self.process is not None:
+            data = self.process(data)
+
+        self._cache[name] = data
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+        return data
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, name):
+        return name in self.files
+
+def _get_object_files(path):
+    """
+    Get the input files in a directory as a dictionary, where\n
+    - The key is the name of the file
+    - The value is the path to the file
     
     :param path: Path to the directory containing input files
     """
 
-    data = {}
+    files = {}
     if path == "":
         print("Failed to load data as requested path is empty")
-        return data
+        return files
 
     path = str(Path(path).resolve())
     if not os.path.exists(path):
         print("Failed to load data as requested path does not exist")
-        return data
+        return files
 
     for file in os.listdir(path):
         file = os.path.join(path, file)
@@ -42,11 +112,100 @@ def load_objects(path):
             print("Ignoring input data '" + file + "' as file is not a valid .json file")
             continue
 
-        name = Path(file).stem
-        data[name] = json.load(open(file, encoding="utf-8"))
+        files[Path(file).stem] = file
+
+    return files
+
+def load_objects(path, workers=1, parse_cache_dir=None):
+    """
+    Loading json data where the input is expected to be a path to input files\n
+    Data will be loaded in as a dictionary, where\n
+    - The key is the name of the file
+    - The value is the loaded json structure 
+    
+    :param path: Path to the directory containing input files
+    :param workers: Number of threads to read and parse files with
+    :param parse_cache_dir: Optional directory to cache parsed files in, see `load_object`
+    """
+
+    files = _get_object_files(path)
+
+    if workers <= 1 or len(files) <= 1:
+        return {name: load_object(file, parse_cache_dir) for name, file in files.items()}
+
+    # Results come back in the order of the files, so loading is deterministic
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        loaded = executor.map(lambda file: load_object(file, parse_cache_dir), files.values())
+        return dict(zip(files.keys(), loaded))
+
+def set_json_backend(loads):
+    """
+    Set the function used to parse json files\n
+    By default orjson is used when installed, otherwise the json module of the standard library
+    
+    :param loads: Function parsing json from bytes, or None to use the default again
+    """
+
+    global _json_loads
+    _json_loads = loads if loads is not None else _DEFAULT_JSON_LOADS
 
+def _get_parse_cache_path(path, parse_cache_dir):
+    return os.path.join(parse_cache_dir, hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest() + PARSE_CACHE_EXTENSION)
+
+def _load_parse_cache(cache_path, stat):
+    """ Get parsed data from the parse cache, or None if not cached or out of date
+    """
+
+    try:
+        with open(cache_path, "rb") as f:
+            mtime, size, data = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+
+    if mtime != stat.st_mtime_ns or size != stat.st_size:
+        return None
     return data
 
+def _save_parse_cache(cache_path, stat, data):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = cache_path + "." + secrets.token_hex(8) + ".tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            pickle.dump((stat.st_mtime_ns, stat.st_size, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # Not being able to cache only costs parsing the file again next time
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def load_object(path, parse_cache_dir=None):
+    """
+    Loading the json data of a single input file\n
+    With a parse cache directory, parsed data is cached in binary form keyed by path, modification time and size,
+    so files that didn't change are never parsed again
+    
+    :param path: Path to the json file
+    :param parse_cache_dir: Optional directory to cache parsed files in
+    """
+
+    with Profiling.phase("parse", Profiling.CATEGORY_CONTENT, content=Path(path).stem, path=str(path)):
+        if parse_cache_dir is None:
+            with open(path, 'rb') as f:
+                return _json_loads(f.read())
+
+        stat = os.stat(path)
+        cache_path = _get_parse_cache_path(path, parse_cache_dir)
+        data = _load_parse_cache(cache_path, stat)
+        Profiling.count_cache("parse", data is not None)
+        if data is not None:
+            return data
+
+        with open(path, 'rb') as f:
+            data = _json_loads(f.read())
+
+        _save_parse_cache(cache_path, stat, data)
+        return data
+
 def load_container(path, required_properties = []):
     """
     Loading json data where the input is expected to be a container\n
@@ -104,6 +263,155 @@ def _get_objects_with_key(json, key):
         for item in json:
             yield from _get_objects_with_key(item, key)
 
+class JsonIndex:
+    """
+    Inverted index over json values, mapping key-value pairs to the objects containing them\n
+    The json is walked once, lookups afterwards are hash lookups instead of a full recursive search\n
+    Indexed objects match what `get_filtered_objects` would find, in the same order:
+    - An object is indexed under each of its keys, unless that key was already passed on the way down
+    - Values that are not hashable (lists, objects) are only indexed by key and compared one by one on lookup
+
+    The position of each object in the json is kept, so results of several lookups can be merged in order.
+    Json added to the index can be replaced later on, keeping its position relative to other added json, see `replace`
+    """
+
+    def __init__(self, json=None):
+        self.pairs = {}
+        self.keys = {}
+        self.positions = {}
+        self._groups = {}
+        self._group_count = 0
+
+        if json is not None:
+            self.add(json)
+
+    def add(self, json):
+        """
+        Add (part of) the input json to the index\n
+        Can be called multiple times, objects added later are ordered after already indexed objects
+        
+        :param json: The input json
+        """
+
+        self._groups[id(json)] = self._group_count
+        self._group_count += 1
+        self._add(json, set(), self._groups[id(json)], None)
+
+    def replace(self, previous, json):
+        """
+        Replace json added to the index by other json, like a content file that changed, without indexing everything again\n
+        The objects of the json take the position of the previous json. Json that wasn't added before is added after all indexed objects
+        
+        :param previous: The json as passed to `add`, or None if there was no previous json
+        :param json: The json replacing it, or None to remove the previous json
+        """
+
+        group = self._groups.pop(id(previous), None) if previous is not None else None
+        if group is not None:
+            self._remove(previous)
+        if json is None:
+            return
+        if group is None:
+            self.add(json)
+            return
+
+        # Objects are appended to the lists they are indexed in, sort those back into the order of the indexed json
+        self._groups[id(json)] = group
+        touched = {}
+        self._add(json, set(), group, touched)
+        for objects in touched.values():
+            objects.sort(key=self.get_position)
+
+    def _remove(self, json):
+        removed = set()
+        keys = set()
+        pairs = set()
+        pending = [json]
+        while pending:
+            value = pending.pop()
+            if isinstance(value, dict):
+                removed.add(id(value))
+                self.positions.pop(id(value), None)
+                for k, v in value.items():
+                    keys.add(k)
+                    if _is_hashable(v):
+                        pairs.add((k, v))
+                    elif isinstance(v, (dict, list)):
+                        pending.append(v)
+            elif isinstance(value, list):
+                pending.extend(value)
+
+        for lookup, lookup_keys in [(self.keys, keys), (self.pairs, pairs)]:
+            for key in lookup_keys:
+                if key in lookup:
+                    lookup[key] = [o for o in lookup[key] if not id(o) in removed]
+                    if not lookup[key]:
+                        del lookup[key]
+
+    def _add(self, json, passed_keys, group, touched):
+        if isinstance(json, dict):
+            self.positions.setdefault(id(json), (group, len(self.positions)))
+            for k, v in json.items():
+                if not k in passed_keys:
+                    self.keys.setdefault(k, []).append(json)
+                    if touched is not None:
+                        touched[id(self.keys[k])] = self.keys[k]
+                    if _is_hashable(v):
+                        self.pairs.setdefault((k, v), []).append(json)
+                        if touched is not None:
+                            touched[id(self.pairs[(k, v)])] = self.pairs[(k, v)]
+
+                # Objects below a matching key are not searched for that same key
+                if isinstance(v, (dict, list)):
+                    newly_passed = not k in passed_keys
+                    if newly_passed:
+                        passed_keys.add(k)
+                    self._add(v, passed_keys, group, touched)
+                    if newly_passed:
+                        passed_keys.remove(k)
+        elif isinstance(json, list):
+            for item in json:
+                self._add(item, passed_keys, group, touched)
+
+    def get_filtered_objects(self, filter):
+        """
+        Get the indexed objects based on a key-value filter
+        
+        :param filter: The filter, has to be of the JSonFilter type
+        """
+
+        if not isinstance(filter, JsonFilter):
+            print("Failed to get filtered json object as one of the filtered items passed through is not a filter")
+            return []
+
+        if _is_hashable(filter.value):
+            return list(self.pairs.get((filter.key, filter.value), []))
+
+        # Unhashable values can't be looked up, compare against every object with the key instead
+        return [r for r in self.keys.get(filter.key, []) if r[filter.key] == filter.value]
+
+    def get_position(self, json):
+        """
+        Get the position of an indexed object within the indexed json, in the order objects are found in
+        
+        :param json: The indexed object
+        """
+
+        return self.positions.get(id(json), (self._group_count, len(self.positions)))
+
+def _is_hashable(value):
+    """
+    Check if a json value can be used as a key in a hash lookup
+    
+    :param value: The json value
+    """
+
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
 def get_filtered_objects(json, filter):
     """
     Get (part of) the input json based on a key-value filter
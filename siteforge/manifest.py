@@ -0,0 +1,363 @@
+import hashlib
+import json
+import os
+from jinja2 import meta, nodes
+from . import access_tracking as AccessTracking
+from jinja2.exceptions import TemplateNotFound
+
+MANIFEST_FILE_NAME = ".siteforge-manifest.json"
+MANIFEST_VERSION = 1
+
+MANIFEST_VAR_VERSION_NOTATION = "version"
+MANIFEST_VAR_PAGES_NOTATION = "pages"
+MANIFEST_VAR_ASSETS_NOTATION = "assets"
+MANIFEST_VAR_COMPRESSED_NOTATION = "compressed"
+MANIFEST_VAR_SHARD_NOTATION = "shard"
+
+FINGERPRINT_VAR_BOUND_SOURCES_NOTATION = "boundSources"
+
+""" Containing functionality to keep track of what the build output depends on
+    """
+
+def hash_bytes(data):
+    """
+    Hash bytes for storing in the manifest
+
+    :param data: The bytes to hash
+    """
+
+    return hashlib.sha256(data).hexdigest()
+
+def hash_json(value):
+    """
+    Hash a json value for storing in the manifest\n
+    Equal json values always result in the same hash, regardless of the order of keys
+
+    :param value: The json value to hash
+    """
+
+    return hash_bytes(json.dumps(value, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8"))
+
+def create_manifest():
+    """ Create an empty manifest
+    """
+
+    return {MANIFEST_VAR_VERSION_NOTATION: MANIFEST_VERSION, MANIFEST_VAR_PAGES_NOTATION: {}, MANIFEST_VAR_ASSETS_NOTATION: [], MANIFEST_VAR_COMPRESSED_NOTATION: {}}
+
+def load_manifest(output_dir, name=MANIFEST_FILE_NAME):
+    """
+    Load the manifest of a previous build\n
+    Returns an empty manifest if there is no (valid) manifest for the output directory
+
+    :param output_dir: The output directory of the build
+    :param name: File name of the manifest within the output directory
+    """
+
+    path = os.path.join(output_dir, name)
+    if not os.path.exists(path):
+        return create_manifest()
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        print("Ignoring build manifest '" + path + "' as it can't be read")
+        return create_manifest()
+
+    if not isinstance(manifest, dict) or manifest.get(MANIFEST_VAR_VERSION_NOTATION) != MANIFEST_VERSION:
+        print("Ignoring build manifest '" + path + "' as it was written by a different version")
+        return create_manifest()
+
+    return manifest
+
+def save_manifest(output_dir, manifest, name=MANIFEST_FILE_NAME):
+    """
+    Save the manifest of a build to the output directory
+
+    :param output_dir: The output directory of the build
+    :param manifest: The manifest to save
+    :param name: File name of the manifest within the output directory
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, name)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+class TemplateDependencies:
+    """
+    What a template depends on, including templates it extends, includes or imports\n
+    Names are the variables the templates look up, including globals of the environment like `asset_url`
+    """
+
+    def __init__(self, templates, names, dynamic):
+        self.templates = templates
+        self.names = names
+        self.dynamic = dynamic
+
+class DependencyResolver:
+    """
+    Resolves what pages depend on and hashes it, so it can be compared against a previous build\n
+    Templates are analysed statically, a page depends on:
+    - The source of its template and all templates it extends, includes or imports
+    - The content files whose (capitalized) name is referenced by any of those templates
+    - Its build registry entry and the content bound to it
+
+    When content access is tracked, a page depends on the content values it read while rendering instead of whole content files,
+    see `access_tracking.py`\n
+    Hashes are calculated once per resolver. When content or templates change, invalidate what changed with `invalidate_content`
+    and `invalidate_templates`, or use a new resolver
+    """
+
+    def __init__(self, environment, content):
+        self.environment = environment
+        self.content = content
+        self._template_hashes = {}
+        self._template_references = {}
+        self._content_hashes = {}
+        self._access_hashes = {}
+        self._content_names = None
+        self._content_version = None
+
+    def invalidate_content(self, names):
+        """
+        Forget the hashes of content files that changed, were added or were removed
+
+        :param names: Names of the content files, as used as key in the loaded content
+        """
+
+        names = set(names)
+        for name in names:
+            self._content_hashes.pop(name, None)
+
+        # Accesses read content by its capitalized name
+        self._content_names = None
+        self._content_version = None
+        capitalized = set(name.capitalize() for name in names)
+        for access in list(self._access_hashes):
+            parsed = AccessTracking.parse_access(access)
+            if parsed is None or parsed[1][0] in capitalized:
+                del self._access_hashes[access]
+
+    def invalidate_templates(self, template_names):
+        """
+        Forget the analysis of templates that changed, were added or were removed\n
+        Templates depending on them are analysed through them again, so only the templates themselves need to be passed
+
+        :param template_names: Names of the templates
+        """
+
+        for name in template_names:
+            self._template_hashes.pop(name, None)
+            self._template_references.pop(name, None)
+
+    def get_template_hash(self, template_name):
+        """
+        Get the hash of the source of a template
+
+        :param template_name: Name of the template
+        """
+
+        if not template_name in self._template_hashes:
+            self._analyse_template(template_name)
+        return self._template_hashes[template_name]
+
+    def _analyse_template(self, template_name):
+        try:
+            source, _, _ = self.environment.loader.get_source(self.environment, template_name)
+        except TemplateNotFound:
+            # Missing templates fail to render, hash them as missing so they are retried once they exist
+            self._template_hashes[template_name] = None
+            self._template_references[template_name] = ([], set(), False)
+            return
+
+        ast = self.environment.parse(source)
+        references = list(meta.find_referenced_templates(ast))
+        dynamic = None in references
+
+        self._template_hashes[template_name] = hash_bytes(source.encode("utf-8"))
+        # Globals of the environment aren't reported as undeclared, look them up separately
+        names = meta.find_undeclared_variables(ast)
+        names.update(n.name for n in ast.find_all(nodes.Name) if n.ctx == "load" and n.name in self.environment.globals)
+        self._template_references[template_name] = ([r for r in references if r is not None], names, dynamic)
+
+    def get_template_dependencies(self, template_name):
+        """
+        Get the templates and variable names a template depends on
+
+        :param template_name: Name of the template
+        """
+
+        templates = []
+        names = set()
+        dynamic = False
+
+        pending = [template_name]
+        while pending:
+            name = pending.pop()
+            if name in templates:
+                continue
+
+            self.get_template_hash(name)
+            references, referenced_names, referenced_dynamic = self._template_references[name]
+
+            templates.append(name)
+            names.update(referenced_names)
+            dynamic = dynamic or referenced_dynamic
+            pending.extend(references)
+
+        # Templates referenced through variables can't be known up front, depend on all templates instead
+        if dynamic:
+            for name in self.environment.loader.list_templates():
+                if not name in templates:
+                    templates.append(name)
+
+        return TemplateDependencies(sorted(templates), names, dynamic)
+
+    def get_content_hash(self, name):
+        """
+        Get the hash of a loaded content file
+
+        :param name: Name of the content file, as used as key in the loaded content
+        """
+
+        if not name in self._content_hashes:
+            self._content_hashes[name] = hash_json(self.content[name])
+        return self._content_hashes[name]
+
+    def get_content_version(self):
+        """
+        Get a hash of all loaded content files\n
+        Changes whenever any content file changes, is added or is removed
+        """
+
+        if self._content_version is None:
+            self._content_version = hash_json({name: self.get_content_hash(name) for name in self.content})
+        return self._content_version
+
+    def get_access_hash(self, access):
+        """
+        Get the hash of what a recorded content access reads, see `access_tracking.py`\n
+        Returns None if the access doesn't read anything in the content anymore
+
+        :param access: The access, formatted as by `access_tracking.format_access`
+        """
+
+        if not access in self._access_hashes:
+            self._access_hashes[access] = self._hash_access(access)
+        return self._access_hashes[access]
+
+    def _hash_access(self, access):
+        parsed = AccessTracking.parse_access(access)
+        if parsed is None:
+            return None
+
+        # Templates read content by its capitalized name
+        if self._content_names is None:
+            self._content_names = {k.capitalize(): k for k in self.content}
+
+        kind, path = parsed
+        name = self._content_names.get(path[0])
+        if name is None:
+            return None
+
+        try:
+            return hash_json(AccessTracking.resolve_access(self.content[name], kind, path[1:]))
+        except (LookupError, TypeError):
+            return None
+
+    def get_access_hashes(self, accessed):
+        """
+        Get the hashes of what recorded content accesses read, see `get_access_hash`
+
+        :param accessed: The accesses, formatted as by `access_tracking.format_access`
+        """
+
+        return {access: self.get_access_hash(access) for access in accessed}
+
+    def get_page_fingerprint(self, build_entry, template_name, get_processed_content, accessed=None, queried=False, previous=None):
+        """
+        Get everything a page depends on as hashes\n
+        A page needs to be rebuilt when its fingerprint differs from the one of the previous build\n
+        Content bound by querying the loaded content is only queried again when any content file changed since the previous build
+
+        :param build_entry: The build registry entry of the page
+        :param template_name: Name of the template the page is rendered with
+        :param get_processed_content: Function getting the content bound to the page
+        :param accessed: When tracking content access, the content accesses recorded when the page was last rendered
+        :param queried: Whether content is bound to the page by querying the loaded content
+        :param previous: The fingerprint of the page in the previous build, see `get_previous_fingerprint`
+        """
+
+        dependencies = self.get_template_dependencies(template_name)
+
+        fingerprint = {
+            "entry": hash_json(build_entry),
+            "templates": {name: self.get_template_hash(name) for name in dependencies.templates},
+            "content": {k: self.get_content_hash(k) for k in self.content if k.capitalize() in dependencies.names}
+        }
+
+        # Queries search all content files, so the bound content stays the same as long as none of them changed
+        if queried:
+            sources = self.get_content_version()
+            if isinstance(previous, dict) and "bound" in previous and previous.get("entry") == fingerprint["entry"] \
+                    and previous.get(FINGERPRINT_VAR_BOUND_SOURCES_NOTATION) == sources:
+                fingerprint["bound"] = previous["bound"]
+            fingerprint[FINGERPRINT_VAR_BOUND_SOURCES_NOTATION] = sources
+
+        if not "bound" in fingerprint:
+            fingerprint["bound"] = hash_json(get_processed_content())
+
+        if accessed is not None:
+            fingerprint["content"] = self.get_access_hashes(accessed)
+            fingerprint["tracked"] = True
+
+        return fingerprint
+
+def get_previous_fingerprint(manifest, output):
+    """
+    Get the fingerprint a page had in a previous build\n
+    Returns None if the page wasn't built by it
+
+    :param manifest: The manifest of the previous build
+    :param output: The output path of the page, as denoted in the build registry
+    """
+
+    return manifest.get(MANIFEST_VAR_PAGES_NOTATION, {}).get(output)
+
+def strip_bound_sources(fingerprint):
+    """ Get a page fingerprint without the version of the content its bound content was queried from
+    """
+
+    return {k: v for k, v in fingerprint.items() if k != FINGERPRINT_VAR_BOUND_SOURCES_NOTATION}
+
+def get_tracked_accesses(manifest, output):
+    """
+    Get the content accesses recorded for a page by a previous build tracking content access\n
+    Returns an empty list if content access wasn't tracked for the page
+
+    :param manifest: The manifest of the previous build
+    :param output: The output path of the page, as denoted in the build registry
+    """
+
+    previous = get_previous_fingerprint(manifest, output)
+    if not isinstance(previous, dict) or not previous.get("tracked"):
+        return []
+    return list(previous.get("content", {}))
+
+def is_page_up_to_date(manifest, output_dir, output, fingerprint):
+    """
+    Check if a page of the previous build can be kept as is
+
+    :param manifest: The manifest of the previous build
+    :param output_dir: The output directory of the build
+    :param output: The output path of the page, as denoted in the build registry
+    :param fingerprint: The fingerprint of the page for the current build
+    """
+
+    # The content the bound content was queried from changes along with other content, what is bound is compared instead
+    previous = get_previous_fingerprint(manifest, output)
+    if not isinstance(previous, dict) or strip_bound_sources(previous) != strip_bound_sources(fingerprint):
+        return False
+
+    return os.path.exists(os.path.join(output_dir, output))
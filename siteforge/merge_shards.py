@@ -0,0 +1,14 @@
+import argparse
+import sys
+from siteforge.sharding import merge_shards
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--output', type=str, required=True, help="The output directory the output of all shards was combined in")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    result = merge_shards(args.output)
+    if not result.is_valid():
+        sys.exit(1)
+    print("Merged " + str(len(result.outputs)) + " output(s)")
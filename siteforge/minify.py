@@ -0,0 +1,100 @@
+import re
+from .transform import OutputTransform
+
+# Elements whose content is left untouched, as whitespace in them is significant or not html
+HTML_PRESERVED_ELEMENTS = ["pre", "textarea", "script", "style"]
+
+# Tags may hold a '>' within quoted attribute values, and only start with a name, '/' or '!', so a '<' in text isn't taken for one
+_HTML_TAG_BODY = r"(?:\"[^\"]*\"|'[^']*'|[^'\">])*"
+_HTML_TOKEN = re.compile(
+    r"(?P<preserved><(?P<element>" + "|".join(HTML_PRESERVED_ELEMENTS) + r")\b" + _HTML_TAG_BODY + r">.*?</(?P=element)\s*>)"
+    r"|(?P<comment><!--.*?-->)"
+    r"|(?P<tag></?[A-Za-z!?]" + _HTML_TAG_BODY + r">)",
+    re.IGNORECASE | re.DOTALL)
+_HTML_STYLE = re.compile(r"(<style\b" + _HTML_TAG_BODY + r">)(.*?)(</style\s*>)", re.IGNORECASE | re.DOTALL)
+_HTML_TAG_PART = re.compile(r"(\"[^\"]*\"|'[^']*')|(\s*=\s*)|\s+")
+# The space before a self closing slash is only dropped after a quote or the tag name, an unquoted value would take the slash in
+_HTML_SELF_CLOSING_SPACE = re.compile(r"(\"|'|^<[^\s\"'=/>]+) />$")
+_WHITESPACE = re.compile(r"\s+")
+
+_CSS_TOKEN = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|([^\"'/]+|/)", re.DOTALL)
+_CSS_SPACE_AROUND = re.compile(r"\s*([{};,>])\s*")
+_CSS_SPACE_AFTER_COLON = re.compile(r":\s+")
+
+""" Containing functionality to minify html and css output
+    """
+
+def _collapse_whitespace(text):
+    # Any run of whitespace renders as a single space, keep a newline when there was one so output stays readable
+    return _WHITESPACE.sub(lambda m: "\n" if "\n" in m.group(0) else " ", text)
+
+def _minify_tag(tag):
+    tag = _HTML_TAG_PART.sub(lambda m: m.group(1) or ("=" if m.group(2) else " "), tag)
+    # Only the end of the tag is touched, a quoted value may hold ' >' as well
+    if tag.endswith(" >"):
+        tag = tag[:-2] + ">"
+    return _HTML_SELF_CLOSING_SPACE.sub(r"\1/>", tag)
+
+def minify_html(text):
+    """
+    Minify html\n
+    Comments are removed and runs of whitespace are collapsed into a single character, which renders the same.
+    Conditional comments and the content of pre, textarea and script elements are kept as is, style elements are minified as css
+
+    :param text: The html to minify
+    """
+
+    parts = []
+    position = 0
+    pending = ""
+    for match in _HTML_TOKEN.finditer(text):
+        pending += text[position:match.start()]
+        position = match.end()
+
+        # Removed comments join the text around them
+        if match.group("comment") is not None and not match.group("comment").startswith("<!--[if"):
+            continue
+
+        parts.append(_collapse_whitespace(pending))
+        pending = ""
+
+        if match.group("preserved") is not None:
+            preserved = match.group("preserved")
+            if match.group("element").lower() == "style":
+                preserved = _HTML_STYLE.sub(lambda m: _minify_tag(m.group(1)) + minify_css(m.group(2)) + m.group(3), preserved)
+            parts.append(preserved)
+        elif match.group("comment") is not None:
+            parts.append(match.group("comment"))
+        else:
+            parts.append(_minify_tag(match.group("tag")))
+
+    parts.append(_collapse_whitespace(pending + text[position:]))
+    return "".join(parts).strip()
+
+def minify_css(text):
+    """
+    Minify css\n
+    Comments are removed except for comments starting with /*! (like licenses), whitespace is collapsed
+    and removed around braces, semicolons, commas and child selectors. Strings are kept as is
+
+    :param text: The css to minify
+    """
+
+    parts = []
+    for string, comment, code in _CSS_TOKEN.findall(text):
+        if string:
+            parts.append(string)
+        elif comment:
+            if comment.startswith("/*!"):
+                parts.append(comment)
+        else:
+            code = _WHITESPACE.sub(" ", code)
+            code = _CSS_SPACE_AROUND.sub(r"\1", code)
+            code = _CSS_SPACE_AFTER_COLON.sub(":", code)
+            parts.append(code)
+
+    return "".join(parts).replace(";}", "}").strip()
+
+HTML_MINIFY_TRANSFORM = OutputTransform("minify html", minify_html, [".html", ".htm"])
+CSS_MINIFY_TRANSFORM = OutputTransform("minify css", minify_css, [".css"], [".min.css"])
+MINIFY_TRANSFORMS = [HTML_MINIFY_TRANSFORM, CSS_MINIFY_TRANSFORM]
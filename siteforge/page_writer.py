@@ -0,0 +1,140 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from . import profiling as Profiling
+
+DEFAULT_WRITE_WORKERS = 0
+DEFAULT_WRITE_QUEUE_SIZE = 64
+
+""" Containing functionality to write pages on writer threads while the next pages are rendered
+    """
+
+def fsync_file(path):
+    """
+    Flush a file to disk
+
+    :param path: Path to the file
+    """
+
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def fsync_directory(path):
+    """
+    Flush a directory to disk, so files renamed into it survive a crash\n
+    Directories can't be opened on Windows, where this does nothing
+
+    :param path: Path to the directory
+    """
+
+    if os.name == "nt":
+        return
+    fsync_file(path)
+
+class PageWriter:
+    """
+    Writes pages while the next pages are rendered\n
+    Pages are put in a bounded queue that writer threads take them from. When the writers fall behind, submitting a page
+    waits until there is room in the queue, so rendered pages never pile up in memory. Without writer threads pages are written
+    right away. Pages rendered in chunks are written right away as well, as producing the chunks is rendering them\n
+    With fsync, written pages are flushed to disk in one batch when the writer is closed. Pages only count as written once flushed
+    """
+
+    def __init__(self, write, workers=DEFAULT_WRITE_WORKERS, queue_size=DEFAULT_WRITE_QUEUE_SIZE, fsync=False):
+        """
+        :param write: Function writing a page, taking the path and content (or chunks of content) and returning whether it was written
+        :param workers: Number of writer threads, 0 to write pages right away
+        :param queue_size: Maximum number of pages waiting to be written
+        :param fsync: Flush written pages to disk when closing the writer
+        """
+
+        self.write = write
+        self.fsync = fsync
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._unsynced = []
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def submit(self, path, content):
+        """
+        Queue a page to be written\n
+        Returns a future resolving to whether the page was written, see `builder.write`
+
+        :param path: Path to write to
+        :param content: The content to write, or an iterable of chunks of content
+        """
+
+        future = Future()
+        if not self._threads or not isinstance(content, str):
+            self._write(future, path, content)
+            return future
+
+        if self._queue.full():
+            Profiling.count("write queue full")
+        self._queue.put((future, path, content))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._write(*item)
+
+    def _write(self, future, path, content):
+        try:
+            written = self.write(path, content)
+        except BaseException as e:
+            future.set_exception(e)
+            return
+
+        if written and self.fsync:
+            with self._lock:
+                self._unsynced.append((future, path))
+        else:
+            future.set_result(written)
+
+    def close(self):
+        """
+        Wait for all queued pages to be written, and flush them to disk when using fsync
+        """
+
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+        if not self._unsynced:
+            return
+
+        with Profiling.phase("fsync"):
+            directories = set()
+            for future, path in self._unsynced:
+                try:
+                    fsync_file(path)
+                    directories.add(os.path.dirname(os.path.abspath(path)))
+                    future.set_result(True)
+                except OSError as e:
+                    future.set_exception(e)
+
+            # Failing to flush a directory doesn't lose the content of the pages in it
+            for directory in sorted(directories):
+                try:
+                    fsync_directory(directory)
+                except OSError as e:
+                    print("Failed to flush directory '" + directory + "': " + str(e))
+
+        self._unsynced = []
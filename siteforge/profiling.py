@@ -0,0 +1,285 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+CATEGORY_PHASE = "phase"
+CATEGORY_PAGE = "page"
+CATEGORY_CONTENT = "content"
+
+""" Containing functionality to measure where the time of a build goes
+    """
+
+class ProfileEvent:
+    """
+    A measured span of time\n
+    Times are in seconds as given by `time.perf_counter`
+    """
+
+    def __init__(self, name, category, start, duration, args, pid, tid):
+        self.name = name
+        self.category = category
+        self.start = start
+        self.duration = duration
+        self.args = args
+        self.pid = pid
+        self.tid = tid
+
+class Profiler:
+    """
+    Collects timings, counters and cache statistics of a build\n
+    Results can be exported as json with `to_json` or as Chrome trace events with `to_chrome_trace`,
+    which can be opened in chrome://tracing or https://ui.perfetto.dev
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []
+        self.counters = {}
+        self.caches = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name, category=CATEGORY_PHASE, **args):
+        """
+        Measure the time spent within the context\n
+        The arguments are stored with the event and can be added to from within the context
+
+        :param name: Name of what is measured
+        :param category: Category of the event, see `CATEGORY_PHASE`, `CATEGORY_PAGE` and `CATEGORY_CONTENT`
+        """
+
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(name, category, start, time.perf_counter() - start, **args)
+
+    def record(self, name, category, start, duration, **args):
+        """
+        Record an already measured span of time
+
+        :param name: Name of what is measured
+        :param category: Category of the event
+        :param start: Start time as given by `time.perf_counter`
+        :param duration: Duration in seconds
+        """
+
+        event = ProfileEvent(name, category, start, duration, args, os.getpid(), threading.get_ident())
+        with self._lock:
+            self.events.append(event)
+
+    def count(self, name, value=1):
+        """
+        Add to a counter
+
+        :param name: Name of the counter
+        :param value: Value to add
+        """
+
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def count_cache(self, name, hit):
+        """
+        Count a cache lookup
+
+        :param name: Name of the cache
+        :param hit: Whether the lookup was a hit
+        """
+
+        with self._lock:
+            hits, misses = self.caches.get(name, (0, 0))
+            self.caches[name] = (hits + 1, misses) if hit else (hits, misses + 1)
+
+    def merge(self, events, counters, caches):
+        """
+        Merge in what was collected by a profiler in another process, see `take_collected`
+        """
+
+        with self._lock:
+            self.events.extend(events)
+            for name, value in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, (hits, misses) in caches.items():
+                own_hits, own_misses = self.caches.get(name, (0, 0))
+                self.caches[name] = (own_hits + hits, own_misses + misses)
+
+    def take_collected(self):
+        """
+        Take everything collected so far, leaving the profiler empty\n
+        Used to send what was collected in a build process back to the main process
+        """
+
+        with self._lock:
+            collected = (self.events, self.counters, self.caches)
+            self.events = []
+            self.counters = {}
+            self.caches = {}
+        return collected
+
+    def get_phase_times(self):
+        """
+        Get the total time spent per phase in seconds
+        """
+
+        phases = {}
+        for event in self.events:
+            if event.category == CATEGORY_PHASE:
+                phases[event.name] = phases.get(event.name, 0) + event.duration
+        return phases
+
+    def _group_events(self, category, key):
+        """ Group the events of a category by one of their arguments, summing up time per event name
+        """
+
+        groups = {}
+        for event in self.events:
+            group = event.args.get(key)
+            if event.category != category or group is None:
+                continue
+
+            entry = groups.setdefault(group, {})
+            entry[event.name] = entry.get(event.name, 0) + event.duration
+            for k, v in event.args.items():
+                if k != key:
+                    entry[k] = v
+        return groups
+
+    def to_json(self):
+        """
+        Get the results as json\n
+        Containing total time per phase, render time per template, time and bytes written per output,
+        time per content file, counters and cache hit rates
+        """
+
+        templates = {}
+        for event in self.events:
+            template = event.args.get("template")
+            if event.category == CATEGORY_PAGE and event.name == "render" and template is not None:
+                entry = templates.setdefault(template, {"count": 0, "total": 0, "max": 0})
+                entry["count"] += 1
+                entry["total"] += event.duration
+                entry["max"] = max(entry["max"], event.duration)
+
+        caches = {}
+        for name, (hits, misses) in self.caches.items():
+            caches[name] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0}
+
+        return {
+            "phases": self.get_phase_times(),
+            "templates": templates,
+            "outputs": self._group_events(CATEGORY_PAGE, "output"),
+            "content": self._group_events(CATEGORY_CONTENT, "content"),
+            "counters": dict(self.counters),
+            "caches": caches
+        }
+
+    def to_chrome_trace(self):
+        """
+        Get the events in the Chrome trace event format
+        """
+
+        events = []
+        for event in sorted(self.events, key=lambda e: e.start):
+            events.append({
+                "name": event.name,
+                "cat": event.category,
+                "ph": "X",
+                "ts": (event.start - self.origin) * 1000000,
+                "dur": event.duration * 1000000,
+                "pid": event.pid,
+                "tid": event.tid,
+                "args": event.args
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        """
+        Save the results as json, see `to_json`
+
+        :param path: Path to save to
+        """
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=1, default=str)
+
+    def save_chrome_trace(self, path):
+        """
+        Save the events in the Chrome trace event format, see `to_chrome_trace`
+
+        :param path: Path to save to
+        """
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+
+# The profiler everything is measured with, None when not profiling
+ACTIVE_PROFILER = None
+
+def enable(profiler=None):
+    """
+    Start profiling, returns the profiler results are collected in
+
+    :param profiler: Profiler to collect in, a new one if not passed
+    """
+
+    global ACTIVE_PROFILER
+    ACTIVE_PROFILER = profiler if profiler is not None else Profiler()
+    return ACTIVE_PROFILER
+
+def disable():
+    """
+    Stop profiling, returns the profiler results were collected in
+    """
+
+    global ACTIVE_PROFILER
+    profiler = ACTIVE_PROFILER
+    ACTIVE_PROFILER = None
+    return profiler
+
+def is_enabled():
+    return ACTIVE_PROFILER is not None
+
+@contextmanager
+def profile():
+    """
+    Profile everything within the context, yielding the profiler results are collected in
+    """
+
+    profiler = enable()
+    try:
+        yield profiler
+    finally:
+        disable()
+
+@contextmanager
+def phase(name, category=CATEGORY_PHASE, **args):
+    """
+    Measure the time spent within the context when profiling, see `Profiler.phase`
+    """
+
+    profiler = ACTIVE_PROFILER
+    if profiler is None:
+        yield args
+        return
+
+    with profiler.phase(name, category, **args) as event_args:
+        yield event_args
+
+def count(name, value=1):
+    """
+    Add to a counter when profiling, see `Profiler.count`
+    """
+
+    if ACTIVE_PROFILER is not None:
+        ACTIVE_PROFILER.count(name, value)
+
+def count_cache(name, hit):
+    """
+    Count a cache lookup when profiling, see `Profiler.count_cache`
+    """
+
+    if ACTIVE_PROFILER is not None:
+        ACTIVE_PROFILER.count_cache(name, hit)
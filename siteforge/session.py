@@ -0,0 +1,284 @@
+import os
+from . import asset_sync as AssetSync
+from . import builder
+from . import compression as Compression
+from . import json_function_registration
+from . import json_utils as JsonUtils
+from . import manifest as Manifest
+from . import page_writer as PageWriter
+from . import profiling as Profiling
+from . import template_cache as TemplateCache
+from jinja2 import FileSystemLoader
+from pathlib import Path
+
+CHANGE_CONTENT = "content"
+CHANGE_BUILD_REGISTRY = "build_registry"
+CHANGE_ASSET_REGISTRY = "asset_registry"
+CHANGE_TEMPLATES = "templates"
+CHANGE_ASSETS = "assets"
+
+""" Containing functionality to keep a build warm in memory and rebuild only what changed
+    """
+
+def _get_snapshot_entry(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _snapshot_directory(path, extension=None, recursive=True):
+    """ Snapshot modification times and sizes of all files in a directory tree, or only those directly in the directory when not recursive
+    """
+
+    snapshot = {}
+    for root, dirs, files in os.walk(path):
+        if not recursive:
+            # Stop walking below the directory itself
+            dirs.clear()
+
+        for file in files:
+            if extension is not None and not file.endswith(extension):
+                continue
+
+            file = os.path.join(root, file)
+            entry = _get_snapshot_entry(file)
+            if entry is not None:
+                snapshot[file] = entry
+    return snapshot
+
+def _get_changed_files(previous, current):
+    """ Get the files that were added, changed or removed between two snapshots
+    """
+
+    return set(p for p in previous.keys() | current.keys() if previous.get(p) != current.get(p))
+
+class BuildSession:
+    """
+    A build of the site kept in memory between builds\n
+    Content, registries, the jinja2 environment and the build manifest are kept loaded.
+    Polling for changes only reloads what changed, after which only affected pages are rendered again.
+    The content index and template analysis are kept as well, only updating the entries of changed files, see `builder.ContentLookups`.
+    When tracking content access, pages are only affected by changes to content they read, see `access_tracking.py`\n
+    With a template path the session renders with a jinja2 environment of its own, so sessions of different sites don't share templates
+    or fragments. Otherwise it renders with `builder.env`
+    """
+
+    def __init__(self, content_path, build_registry_path, asset_registry_path, output_dir, *, workers=1, asset_checksum=False, asset_link=AssetSync.SYNC_LINK_COPY, func_cache_path=None, compress=False, compress_level=Compression.DEFAULT_COMPRESSION_LEVEL, transforms=None, fingerprint_assets=False, write_workers=PageWriter.DEFAULT_WRITE_WORKERS, write_queue_size=PageWriter.DEFAULT_WRITE_QUEUE_SIZE, fsync=False, stream=False, stream_buffer_size=builder.DEFAULT_STREAM_BUFFER_SIZE, track_content_access=False, func_concurrency=builder.DEFAULT_FUNC_CONCURRENCY, template_path=None):
+        self.content_path = content_path
+        self.build_registry_path = build_registry_path
+        self.asset_registry_path = asset_registry_path
+        self.output_dir = Path(output_dir).resolve()
+        self.workers = workers
+        self.asset_checksum = asset_checksum
+        self.asset_link = asset_link
+        self.func_cache_path = func_cache_path
+        self.func_cache = None
+        self.compress = compress
+        self.compress_level = compress_level
+        self.transforms = transforms
+        self.fingerprint_assets = fingerprint_assets
+        self.asset_urls = {}
+        self.write_workers = write_workers
+        self.write_queue_size = write_queue_size
+        self.fsync = fsync
+        self.stream = stream
+        self.stream_buffer_size = stream_buffer_size
+        self.track_content_access = track_content_access
+        self.func_concurrency = func_concurrency
+        self.env = builder.create_environment(template_path) if template_path is not None else None
+
+        self.content = {}
+        self.lookups = builder.ContentLookups(self.content)
+        self.build_registry = []
+        self.asset_registry = []
+        self.manifest = Manifest.load_manifest(self.output_dir)
+        self.snapshots = {}
+        self._polled_snapshots = None
+
+    def _get_template_paths(self):
+        loader = (self.env or builder.env).loader
+        if isinstance(loader, TemplateCache.TemplateBundleLoader):
+            loader = loader.source_loader
+
+        if isinstance(loader, FileSystemLoader):
+            return list(loader.searchpath)
+        return []
+
+    def _get_asset_source_paths(self):
+        return [Path(os.path.join(self.asset_registry_path, asset_entry[builder.ASSET_REGISTRY_EXPECTED_VAR_SOURCE_NOTATION])).resolve() for asset_entry in self.asset_registry]
+
+    def take_snapshots(self):
+        """
+        Snapshot all files the build depends on, per kind of change
+        """
+
+        snapshots = {}
+        # Content is only loaded from files directly in the content directory, see `json_utils.load_objects`
+        snapshots[CHANGE_CONTENT] = _snapshot_directory(self.content_path, JsonUtils.JSON_EXTENSION, recursive=False) if os.path.isdir(self.content_path) else {}
+        snapshots[CHANGE_BUILD_REGISTRY] = {self.build_registry_path: _get_snapshot_entry(self.build_registry_path)}
+        snapshots[CHANGE_ASSET_REGISTRY] = {self.asset_registry_path: _get_snapshot_entry(self.asset_registry_path)}
+
+        snapshots[CHANGE_TEMPLATES] = {}
+        for path in self._get_template_paths():
+            snapshots[CHANGE_TEMPLATES].update(_snapshot_directory(path))
+
+        snapshots[CHANGE_ASSETS] = {}
+        for path in self._get_asset_source_paths():
+            snapshots[CHANGE_ASSETS].update(_snapshot_directory(path))
+
+        return snapshots
+
+    def poll(self):
+        """
+        Check what changed since the last build\n
+        Returns the changed files per kind of change, only containing kinds that changed. Building these changes marks
+        the files as seen as they were when polling, so files changed in between are picked up by the next poll
+        """
+
+        snapshots = self.take_snapshots()
+        self._polled_snapshots = snapshots
+        changes = {}
+        for kind, snapshot in snapshots.items():
+            changed = _get_changed_files(self.snapshots.get(kind, {}), snapshot)
+            if changed:
+                changes[kind] = changed
+        return changes
+
+    def _get_template_names(self, paths):
+        """ Get the names of templates by their paths, as they are loaded by
+        """
+
+        names = set()
+        for path in paths:
+            for search_path in self._get_template_paths():
+                relative_path = os.path.relpath(path, search_path)
+                if not relative_path.startswith(os.pardir):
+                    names.add(Path(relative_path).as_posix())
+        return names
+
+    def _reload_content_file(self, path):
+        name = Path(path).stem
+        previous = self.content.get(name)
+        if not os.path.exists(path):
+            self.content.pop(name, None)
+            self.lookups.replace_content(name, previous)
+            return
+
+        # Keep the previous content while the file is being edited
+        try:
+            data = JsonUtils.load_object(path)
+        except (OSError, ValueError) as e:
+            print("Failed to reload content '" + path + "': " + str(e))
+            return
+
+        try:
+            self.content[name] = builder.process_content_value(data, self.func_cache, self.func_concurrency)
+        except Exception as e:
+            print("Failed to ressolve functions of content '" + path + "', " + type(e).__name__ + ": " + str(e))
+            return
+        self.lookups.replace_content(name, previous)
+
+    def _reload_registry(self, load, path, previous):
+        """ Reload a registry, keeping the previous registry while the file is being edited
+        """
+
+        try:
+            return load(path)
+        except (OSError, ValueError) as e:
+            print("Failed to reload registry '" + path + "': " + str(e))
+            return previous
+
+    def load(self):
+        """
+        Load everything needed to build the site
+        """
+
+        # The asset registry denotes what asset sources to snapshot
+        self.asset_registry = builder.load_asset_registry(self.asset_registry_path)
+
+        # Snapshot before loading, so changes made while loading are picked up by the next poll
+        self.snapshots = self.take_snapshots()
+        self.content = builder.load_content(self.content_path, func_cache=self.func_cache, func_concurrency=self.func_concurrency)
+        self.lookups = builder.ContentLookups(self.content)
+        with Profiling.phase("load registries"):
+            self.build_registry = builder.load_build_registry(self.build_registry_path)
+
+    def build(self, changes=None, force=False):
+        """
+        Build the site, only rendering pages that changed since the previous build\n
+        Without changes passed the site is loaded and built completely, otherwise only what changed is reloaded.
+        Returns the `BuildResult`
+
+        :param changes: The changes as returned by `poll`
+        :param force: Render all pages again, also those that didn't change since the previous build
+        """
+
+        # Pure functions are evaluated once per build
+        self.func_cache = json_function_registration.JsonFuncCache(self.func_cache_path)
+
+        polled_snapshots, self._polled_snapshots = self._polled_snapshots, None
+        if changes is None:
+            self.load()
+            changes = {CHANGE_CONTENT: True, CHANGE_BUILD_REGISTRY: True, CHANGE_ASSET_REGISTRY: True, CHANGE_TEMPLATES: True, CHANGE_ASSETS: True}
+        else:
+            # Files changed since polling are still seen as changed by the next poll
+            self.snapshots = polled_snapshots if polled_snapshots is not None else self.take_snapshots()
+
+            with Profiling.phase("load content"):
+                for path in sorted(changes.get(CHANGE_CONTENT, [])):
+                    self._reload_content_file(path)
+            if CHANGE_BUILD_REGISTRY in changes:
+                self.build_registry = self._reload_registry(builder.load_build_registry, self.build_registry_path, self.build_registry)
+            if CHANGE_ASSET_REGISTRY in changes:
+                self.asset_registry = self._reload_registry(builder.load_asset_registry, self.asset_registry_path, self.asset_registry)
+                # Asset sources may have moved along with the registry
+                self.snapshots[CHANGE_ASSETS] = self.take_snapshots()[CHANGE_ASSETS]
+            if CHANGE_TEMPLATES in changes:
+                # Templates loaded from a bundle are not checked for changes by jinja2 itself
+                (self.env or builder.env).cache.clear()
+                self.lookups.invalidate_templates(self._get_template_names(changes[CHANGE_TEMPLATES]))
+
+        result = builder.BuildResult()
+        manifest = Manifest.create_manifest()
+
+        # Without the pages of the previous build no page is up to date, while removed assets are still deleted
+        previous_manifest = self.manifest
+        if force:
+            previous_manifest = dict(self.manifest)
+            previous_manifest[Manifest.MANIFEST_VAR_PAGES_NOTATION] = {}
+            changes = dict(changes, **{CHANGE_TEMPLATES: True})
+
+        asset_urls_changed = False
+        if CHANGE_ASSET_REGISTRY in changes or CHANGE_ASSETS in changes:
+            with Profiling.phase("copy assets"):
+                builder.copy_assets(self.asset_registry, self.asset_registry_path, self.output_dir, result, checksum=self.asset_checksum, link=self.asset_link,
+                    previous_manifest=previous_manifest, manifest=manifest, transforms=self.transforms, fingerprint=self.fingerprint_assets)
+            if self.fingerprint_assets:
+                builder.write_asset_manifest(self.output_dir, result.asset_urls)
+            asset_urls_changed = result.asset_urls != self.asset_urls
+            self.asset_urls = result.asset_urls
+        else:
+            manifest[Manifest.MANIFEST_VAR_ASSETS_NOTATION] = self.manifest.get(Manifest.MANIFEST_VAR_ASSETS_NOTATION, [])
+
+        # Pages link to fingerprinted assets, so they are built again when the fingerprint of an asset changes
+        if CHANGE_CONTENT in changes or CHANGE_BUILD_REGISTRY in changes or CHANGE_TEMPLATES in changes or asset_urls_changed:
+            with Profiling.phase("build pages"), builder.use_environment(self.env):
+                builder.build_pages(self.build_registry, self.content, self.output_dir, workers=self.workers, previous_manifest=previous_manifest, manifest=manifest,
+                    transforms=self.transforms, asset_urls=self.asset_urls, result=result, write_workers=self.write_workers, write_queue_size=self.write_queue_size,
+                    fsync=self.fsync, stream=self.stream, stream_buffer_size=self.stream_buffer_size, track_access=self.track_content_access, lookups=self.lookups)
+        else:
+            manifest[Manifest.MANIFEST_VAR_PAGES_NOTATION] = self.manifest.get(Manifest.MANIFEST_VAR_PAGES_NOTATION, {})
+
+        if self.compress:
+            with Profiling.phase("compress output"):
+                builder.compress_output(self.output_dir, result, level=self.compress_level, previous_manifest=previous_manifest, manifest=manifest)
+
+        self.manifest = manifest
+        Manifest.save_manifest(self.output_dir, manifest)
+
+        self.func_cache.save()
+        result.func_cache_hits = self.func_cache.hits
+        result.func_cache_misses = self.func_cache.misses
+
+        return result
@@ -0,0 +1,177 @@
+import hashlib
+import os
+import re
+from . import manifest as Manifest
+
+SHARD_SEPARATOR = "/"
+SHARD_MANIFEST_FILE_NAME = ".siteforge-manifest.shard-{index}-of-{count}.json"
+SHARD_MANIFEST_FILE_PATTERN = re.compile(r"^\.siteforge-manifest\.shard-(\d+)-of-(\d+)\.json$")
+
+SHARD_VAR_INDEX_NOTATION = "index"
+SHARD_VAR_COUNT_NOTATION = "count"
+SHARD_VAR_OUTPUTS_NOTATION = "outputs"
+
+""" Containing functionality to split a build across independent invocations and merge what they built
+    """
+
+def get_shard_index(key, count):
+    """
+    Get the shard a key belongs to, from 1 up to and including the number of shards\n
+    Keys are hashed, so the same key always ends up in the same shard regardless of the machine or Python version
+
+    :param key: The key to partition by, like the output path of a page
+    :param count: The number of shards
+    """
+
+    return int(hashlib.sha1(key.encode("utf-8")).hexdigest(), 16) % count + 1
+
+class Shard:
+    """
+    One of a number of shards a build is split into\n
+    Pages are partitioned by their output path and asset registry entries by their source and destination,
+    so each page and asset is built by exactly one shard
+    """
+
+    def __init__(self, index, count):
+        """
+        :param index: Index of the shard, from 1 up to and including count
+        :param count: The number of shards
+        """
+
+        if count < 1 or index < 1 or index > count:
+            raise ValueError("shard '" + str(index) + SHARD_SEPARATOR + str(count) + "' is not one of 1 up to and including " + str(count))
+
+        self.index = index
+        self.count = count
+
+    def __str__(self):
+        return str(self.index) + SHARD_SEPARATOR + str(self.count)
+
+    def contains(self, key):
+        """
+        Check if a key belongs to this shard, see `get_shard_index`
+
+        :param key: The key to partition by
+        """
+
+        return get_shard_index(key, self.count) == self.index
+
+    def get_manifest_name(self):
+        """ Get the file name of the partial manifest this shard writes to the output directory
+        """
+
+        return SHARD_MANIFEST_FILE_NAME.format(index=self.index, count=self.count)
+
+def parse_shard(text):
+    """
+    Parse a shard denoted as 'i/N', like '2/4' for the second of four shards\n
+    Raises a ValueError if the shard isn't denoted correctly
+
+    :param text: The shard as text
+    """
+
+    parts = text.split(SHARD_SEPARATOR)
+    if len(parts) != 2 or not parts[0].strip().isdigit() or not parts[1].strip().isdigit():
+        raise ValueError("shard '" + text + "' is not denoted as i" + SHARD_SEPARATOR + "N")
+    return Shard(int(parts[0]), int(parts[1]))
+
+def get_asset_entry_key(asset_entry, source_notation, destination_notation):
+    """
+    Get the key an asset registry entry is partitioned by
+
+    :param asset_entry: The asset registry entry
+    :param source_notation: Key of the source in the entry
+    :param destination_notation: Key of the destination in the entry
+    """
+
+    return str(asset_entry[source_notation]) + " -> " + str(asset_entry[destination_notation])
+
+class MergeResult:
+    """
+    Outcome of merging the partial manifests of a sharded build\n
+    Outputs are the paths of all pages and assets built by any shard. Collisions are output paths written by more than one shard, as (path, shards) pairs.
+    Missing shards are the indices of shards without a partial manifest. Errors describe why the partial manifests couldn't be merged at all
+    """
+
+    def __init__(self):
+        self.manifest = Manifest.create_manifest()
+        self.outputs = []
+        self.collisions = []
+        self.missing = []
+        self.errors = []
+
+    def is_valid(self):
+        """ Check if the partial manifests merged without errors, collisions or missing shards
+        """
+
+        return not self.errors and not self.collisions and not self.missing
+
+def merge_manifests(manifests):
+    """
+    Merge the partial manifests of a sharded build into one manifest\n
+    Output paths written by more than one shard are reported as collisions
+
+    :param manifests: The partial manifests by shard index
+    """
+
+    result = MergeResult()
+    owners = {}
+    assets = set()
+    for index in sorted(manifests):
+        manifest = manifests[index]
+        result.manifest[Manifest.MANIFEST_VAR_PAGES_NOTATION].update(manifest.get(Manifest.MANIFEST_VAR_PAGES_NOTATION, {}))
+        result.manifest[Manifest.MANIFEST_VAR_COMPRESSED_NOTATION].update(manifest.get(Manifest.MANIFEST_VAR_COMPRESSED_NOTATION, {}))
+        assets.update(manifest.get(Manifest.MANIFEST_VAR_ASSETS_NOTATION, []))
+
+        shard = manifest.get(Manifest.MANIFEST_VAR_SHARD_NOTATION, {})
+        outputs = set(shard.get(SHARD_VAR_OUTPUTS_NOTATION, [])) | set(manifest.get(Manifest.MANIFEST_VAR_ASSETS_NOTATION, []))
+        for path in outputs:
+            owners.setdefault(path, []).append(index)
+
+    result.manifest[Manifest.MANIFEST_VAR_ASSETS_NOTATION] = sorted(assets)
+    result.outputs = sorted(owners)
+    result.collisions = sorted((path, shards) for path, shards in owners.items() if len(shards) > 1)
+    return result
+
+def merge_shards(output_dir):
+    """
+    Merge the partial manifests written by all shards of a build to the output directory\n
+    The output of all shards is expected to be combined in the output directory. The merged manifest is saved as the
+    manifest of the output directory, unless shards are missing or more than one shard wrote the same output path.
+    Returns the `MergeResult`
+
+    :param output_dir: The output directory the output of all shards was combined in
+    """
+
+    manifests = {}
+    counts = set()
+    names = sorted(os.listdir(output_dir)) if os.path.isdir(output_dir) else []
+    for name in names:
+        match = SHARD_MANIFEST_FILE_PATTERN.match(name)
+        if match is None:
+            continue
+
+        index, count = int(match.group(1)), int(match.group(2))
+        counts.add(count)
+        manifests[index] = Manifest.load_manifest(output_dir, name)
+
+    result = MergeResult()
+    if not manifests:
+        result.errors.append("Failed to merge shards in '" + str(output_dir) + "' as it contains no partial manifests")
+    elif len(counts) != 1:
+        result.errors.append("Failed to merge shards in '" + str(output_dir) + "' as partial manifests of builds split into " + ", ".join(str(c) for c in sorted(counts)) + " shards are mixed")
+
+    if result.errors:
+        print(result.errors[0])
+        return result
+
+    result = merge_manifests(manifests)
+    result.missing = [i for i in range(1, counts.pop() + 1) if not i in manifests]
+    for index in result.missing:
+        print("Missing partial manifest of shard " + str(index))
+    for path, shards in result.collisions:
+        print("Output '" + path + "' was written by shards " + ", ".join(str(s) for s in shards))
+
+    if result.is_valid():
+        Manifest.save_manifest(output_dir, result.manifest)
+    return result
@@ -0,0 +1,89 @@
+import os
+from jinja2 import BaseLoader, FileSystemBytecodeCache, ModuleLoader
+from jinja2.exceptions import TemplateNotFound
+
+""" Containing functionality to skip parsing and compiling templates on every build
+    """
+
+def create_bytecode_cache(directory):
+    """
+    Create an on disk cache for compiled templates\n
+    Cached templates are invalidated by jinja2 when the source of the template changes
+
+    :param directory: The directory to store the cache in. Created if it doesn't exist
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    return FileSystemBytecodeCache(directory)
+
+def compile_templates(environment, target):
+    """
+    Precompile all templates of an environment into a bundle that can be loaded with `TemplateBundleLoader`\n
+    The bundle is a zip file if the target ends with .zip, otherwise a directory
+
+    :param environment: The jinja2 environment to compile the templates of
+    :param target: Path to write the bundle to
+    """
+
+    if str(target).endswith(".zip"):
+        environment.compile_templates(target, zip="deflated")
+    else:
+        environment.compile_templates(target, zip=None)
+
+class TemplateBundleLoader(BaseLoader):
+    """
+    Loads templates from a bundle precompiled by `compile_templates`\n
+    Sources are still provided by the source loader, so templates can be analysed for dependencies.
+    Templates that are missing from the bundle or changed after compiling it are loaded from the source loader instead
+    """
+
+    def __init__(self, bundle_path, source_loader):
+        self.bundle_path = str(bundle_path)
+        self.source_loader = source_loader
+        self.bundle = ModuleLoader(self.bundle_path)
+
+    def __reduce__(self):
+        # The compiled bundle can't be pickled, build processes load the bundle themselves
+        return (TemplateBundleLoader, (self.bundle_path, self.source_loader))
+
+    def get_source(self, environment, template):
+        return self.source_loader.get_source(environment, template)
+
+    def list_templates(self):
+        return self.source_loader.list_templates()
+
+    def _get_compiled_mtime(self, name):
+        if os.path.isdir(self.bundle_path):
+            path = os.path.join(self.bundle_path, ModuleLoader.get_module_filename(name))
+        else:
+            path = self.bundle_path
+
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def _is_compiled_up_to_date(self, environment, name):
+        compiled_mtime = self._get_compiled_mtime(name)
+        if compiled_mtime is None:
+            return False
+
+        try:
+            _, filename, _ = self.source_loader.get_source(environment, name)
+        except TemplateNotFound:
+            # Templates only existing in the bundle can't be out of date
+            return True
+
+        if filename is None or not os.path.exists(filename):
+            return True
+
+        return os.path.getmtime(filename) <= compiled_mtime
+
+    def load(self, environment, name, globals=None):
+        if self._is_compiled_up_to_date(environment, name):
+            try:
+                return self.bundle.load(environment, name, globals)
+            except TemplateNotFound:
+                pass
+
+        return self.source_loader.load(environment, name, globals)
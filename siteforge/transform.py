@@ -0,0 +1,62 @@
+import os
+
+""" Containing functionality to transform output, like pages and assets, before it is written
+    """
+
+class OutputTransform:
+    """
+    Transforms the text of output files with one of its extensions before they are written\n
+    The function takes the text and returns the transformed text. Transforms are passed through to build processes,
+    so the function has to be defined at module level
+    """
+
+    def __init__(self, name, func, extensions, excluded_suffixes=None):
+        """
+        :param name: Name of the transform, used when reporting
+        :param func: Function transforming text
+        :param extensions: File extensions the transform applies to, like '.html'
+        :param excluded_suffixes: Optional file name endings the transform doesn't apply to, like '.min.css'
+        """
+
+        self.name = name
+        self.func = func
+        self.extensions = [e.lower() for e in extensions]
+        self.excluded_suffixes = [s.lower() for s in excluded_suffixes or []]
+
+    def applies(self, path):
+        """
+        Check if the transform applies to a file
+
+        :param path: Path of the file
+        """
+
+        path = str(path).lower()
+        if any(path.endswith(s) for s in self.excluded_suffixes):
+            return False
+        return os.path.splitext(path)[1] in self.extensions
+
+    def __call__(self, text):
+        return self.func(text)
+
+def get_applying_transforms(transforms, path):
+    """
+    Get the transforms that apply to a file, in order
+
+    :param transforms: The transforms, see `OutputTransform`
+    :param path: Path of the file
+    """
+
+    return [t for t in transforms or [] if t.applies(path)]
+
+def apply_transforms(transforms, path, text):
+    """
+    Transform the text of a file by all transforms applying to it, in order
+
+    :param transforms: The transforms, see `OutputTransform`
+    :param path: Path of the file
+    :param text: The text to transform
+    """
+
+    for transform in get_applying_transforms(transforms, path):
+        text = transform(text)
+    return text
@@ -0,0 +1,62 @@
+import time
+
+DEFAULT_POLL_INTERVAL = 0.5
+
+""" Containing functionality to keep rebuilding the site while it is being edited
+    """
+
+def rebuild_changes(session):
+    """
+    Rebuild what changed since the previous build of the session\n
+    Returns the changes, the `BuildResult` and the rebuild time in seconds, or None if nothing changed
+
+    :param session: The `BuildSession` to rebuild
+    """
+
+    changes = session.poll()
+    if not changes:
+        return None
+
+    start = time.perf_counter()
+    result = session.build(changes)
+    return changes, result, time.perf_counter() - start
+
+def report_rebuild(changes, result, duration):
+    """
+    Print what was rebuilt and how long it took
+
+    :param changes: The changes as returned by `BuildSession.poll`
+    :param result: The `BuildResult` of the rebuild
+    :param duration: The rebuild time in seconds
+    """
+
+    changed = ", ".join(kind + " (" + str(len(files)) + ")" for kind, files in sorted(changes.items()))
+    print("Rebuilt in " + format(duration * 1000, ".1f") + " ms after changes to " + changed)
+    print(result.summary())
+
+def watch(session, interval=DEFAULT_POLL_INTERVAL):
+    """
+    Build the site and keep rebuilding it on changes until interrupted\n
+    Changes are detected by polling modification times, so no file system notification services are needed.
+    A rebuild that fails is reported, after which polling for changes continues
+
+    :param session: The `BuildSession` to build
+    :param interval: Seconds between polling for changes
+    """
+
+    start = time.perf_counter()
+    result = session.build()
+    print("Built in " + format((time.perf_counter() - start) * 1000, ".1f") + " ms, watching for changes")
+    print(result.summary())
+
+    while True:
+        time.sleep(interval)
+
+        try:
+            rebuild = rebuild_changes(session)
+        except Exception as e:
+            print("Failed to rebuild, " + type(e).__name__ + ": " + str(e))
+            continue
+
+        if rebuild is not None:
+            report_rebuild(*rebuild)
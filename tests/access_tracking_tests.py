@@ -0,0 +1,130 @@
+import unittest
+
+import sys
+import os
+import tempfile
+
+from siteforge import access_tracking
+from siteforge import builder
+from siteforge import manifest
+from jinja2 import DictLoader
+
+"""
+Tests for access_tracking.py
+"""
+class AccessTrackingTests(unittest.TestCase):
+
+    TEMPLATES = {
+        "title.html": "{{ Data.Title }}",
+        "first.html": "{{ Data.Projects[0].Title }}",
+        "projects.html": "{% for p in Data.Projects %}{{ p.Title }}{% endfor %}",
+        "count.html": "{{ Data.Projects | length }}",
+        "json.html": "{{ Data.Projects[1] | tojson }}",
+        "missing.html": "{{ Data.Missing | default('none') }}"
+    }
+
+    def setUp(self):
+        self.loader = builder.env.loader
+        builder.env.loader = DictLoader(self.TEMPLATES)
+
+    def tearDown(self):
+        builder.env.loader = self.loader
+
+    def create_content(self):
+        return {"data": {"Title": "Site", "Projects": [{"Id": "Project1", "Title": "Project 1"}, {"Id": "Project2", "Title": "Project 2"}]}}
+
+    def render_tracked(self, template_name, content):
+        recorder = access_tracking.AccessRecorder()
+        page = builder.render(template_name, **{k.capitalize(): recorder.track(v, (k.capitalize(),)) for k, v in content.items()})
+        return page, recorder.get_accessed()
+
+    # Formatting
+
+    def test_format_access(self):
+        self.assertEqual(access_tracking.format_access(access_tracking.ACCESS_KIND_VALUE, ("Info", "Contact", "Email")), "Info.Contact.Email")
+        self.assertEqual(access_tracking.format_access(access_tracking.ACCESS_KIND_VALUE, ("Projects", 3, "Title")), "Projects[3].Title")
+        self.assertEqual(access_tracking.format_access(access_tracking.ACCESS_KIND_VALUE, ("Info", "e-mail")), 'Info["e-mail"]')
+        self.assertEqual(access_tracking.format_access(access_tracking.ACCESS_KIND_LENGTH, ("Projects",)), "len(Projects)")
+        self.assertEqual(access_tracking.format_access(access_tracking.ACCESS_KIND_KEYS, ("Info",)), "keys(Info)")
+
+    def test_parse_access(self):
+        for kind, path in [(access_tracking.ACCESS_KIND_VALUE, ("Info", "Contact", "Email")), (access_tracking.ACCESS_KIND_VALUE, ("Projects", 3, "Title")),
+                           (access_tracking.ACCESS_KIND_VALUE, ("Info", 'a "b"', "c")), (access_tracking.ACCESS_KIND_LENGTH, ("Projects",)), (access_tracking.ACCESS_KIND_KEYS, ("Info", "e-mail"))]:
+            self.assertEqual(access_tracking.parse_access(access_tracking.format_access(kind, path)), (kind, path))
+
+    def test_parse_access_invalid(self):
+        self.assertIsNone(access_tracking.parse_access("Projects[x]"))
+        self.assertIsNone(access_tracking.parse_access(".Title"))
+
+    def test_resolve_access(self):
+        content = self.create_content()["data"]
+        self.assertEqual(access_tracking.resolve_access(content, access_tracking.ACCESS_KIND_VALUE, ("Projects", 1, "Title")), "Project 2")
+        self.assertEqual(access_tracking.resolve_access(content, access_tracking.ACCESS_KIND_LENGTH, ("Projects",)), 2)
+        self.assertEqual(access_tracking.resolve_access(content, access_tracking.ACCESS_KIND_KEYS, ()), ["Projects", "Title"])
+        self.assertRaises(LookupError, access_tracking.resolve_access, content, access_tracking.ACCESS_KIND_VALUE, ("Projects", 2))
+        self.assertRaises(TypeError, access_tracking.resolve_access, content, access_tracking.ACCESS_KIND_VALUE, ("Title", 0))
+
+    # Recording
+
+    def test_record_value(self):
+        page, accessed = self.render_tracked("first.html", self.create_content())
+        self.assertEqual(page, "Project 1")
+        self.assertEqual(accessed, ["Data.Projects[0].Title"])
+
+    def test_record_iteration(self):
+        # Iterating records the length of the list and only the values read from its items
+        page, accessed = self.render_tracked("projects.html", self.create_content())
+        self.assertEqual(page, "Project 1Project 2")
+        self.assertEqual(accessed, ["Data.Projects[0].Title", "Data.Projects[1].Title", "len(Data.Projects)"])
+
+    def test_record_length(self):
+        page, accessed = self.render_tracked("count.html", self.create_content())
+        self.assertEqual(page, "2")
+        self.assertEqual(accessed, ["len(Data.Projects)"])
+
+    def test_record_tojson(self):
+        page, accessed = self.render_tracked("json.html", self.create_content())
+        self.assertEqual(page, builder.render("json.html", Data=self.create_content()["data"]))
+        self.assertEqual(accessed, ["Data.Projects[1]"])
+
+    def test_record_missing(self):
+        # Whether a key exists depends on the keys of the object
+        page, accessed = self.render_tracked("missing.html", self.create_content())
+        self.assertEqual(page, "none")
+        self.assertEqual(accessed, ["keys(Data)"])
+
+    # Invalidation
+
+    def test_build_pages_track_access(self):
+        build_registry = [{"template": name, "output": name} for name in ["title.html", "first.html", "projects.html", "count.html"]]
+        with tempfile.TemporaryDirectory() as output_dir:
+            content = self.create_content()
+            previous_manifest = manifest.create_manifest()
+            builder.build_pages(build_registry, content, output_dir, previous_manifest=manifest.create_manifest(), manifest=previous_manifest, track_access=True)
+            self.assertEqual(previous_manifest[manifest.MANIFEST_VAR_PAGES_NOTATION]["first.html"]["content"], {"Data.Projects[0].Title": manifest.hash_json("Project 1")})
+
+            # Only pages that read the changed project are built again
+            content["data"]["Projects"][1]["Title"] = "Project Two"
+            current_manifest = manifest.create_manifest()
+            result = builder.build_pages(build_registry, content, output_dir, previous_manifest=previous_manifest, manifest=current_manifest, track_access=True)
+            self.assertEqual(result.written, ["projects.html"])
+            self.assertEqual(result.up_to_date, ["title.html", "first.html", "count.html"])
+
+            # Adding a project changes the length of the list
+            content["data"]["Projects"].append({"Id": "Project3", "Title": "Project 3"})
+            result = builder.build_pages(build_registry, content, output_dir, previous_manifest=current_manifest, manifest=manifest.create_manifest(), track_access=True)
+            self.assertEqual(result.written, ["projects.html", "count.html"])
+
+    def test_build_pages_track_access_untracked_manifest(self):
+        # Pages built without tracking content access are built again the first time it is tracked
+        build_registry = [{"template": "title.html", "output": "title.html"}]
+        with tempfile.TemporaryDirectory() as output_dir:
+            previous_manifest = manifest.create_manifest()
+            builder.build_pages(build_registry, self.create_content(), output_dir, previous_manifest=manifest.create_manifest(), manifest=previous_manifest)
+
+            result = builder.build_pages(build_registry, self.create_content(), output_dir, previous_manifest=previous_manifest, manifest=manifest.create_manifest(), track_access=True)
+            self.assertEqual(result.up_to_date, [])
+            self.assertEqual(result.skipped, ["title.html"])
+
+if __name__ == '__main__':
+    unittest.main()
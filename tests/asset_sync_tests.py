@@ -0,0 +1,134 @@
+import unittest
+
+import sys
+import os
+import tempfile
+
+from siteforge import asset_sync
+
+"""
+Tests for asset_sync.py
+"""
+class AssetSyncTests(unittest.TestCase):
+
+    def write_file(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    # sync
+
+    def test_sync(self):
+        with tempfile.TemporaryDirectory() as destination:
+            result = asset_sync.sync("tests/resources/site/assets", destination)
+            self.assertEqual(result.files, ["css/style.css"])
+            self.assertEqual(result.copied, ["css/style.css"])
+            self.assertTrue(os.path.exists(os.path.join(destination, "css", "style.css")))
+
+    def test_sync_unchanged(self):
+        # Syncing again doesn't copy files that didn't change
+        with tempfile.TemporaryDirectory() as destination:
+            asset_sync.sync("tests/resources/site/assets", destination)
+            result = asset_sync.sync("tests/resources/site/assets", destination)
+            self.assertEqual(result.copied, [])
+            self.assertEqual(result.skipped, ["css/style.css"])
+
+    def test_sync_changed(self):
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as destination:
+            source_file = os.path.join(source, "file.txt")
+            self.write_file(source_file, "content")
+            asset_sync.sync(source, destination)
+
+            self.write_file(source_file, "changed")
+            os.utime(source_file, (0, 0))
+            result = asset_sync.sync(source, destination)
+            self.assertEqual(result.copied, ["file.txt"])
+            with open(os.path.join(destination, "file.txt"), encoding="utf-8") as f:
+                self.assertEqual(f.read(), "changed")
+
+    def test_sync_checksum(self):
+        # Comparing by checksum ignores modification times of files with identical content
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as destination:
+            source_file = os.path.join(source, "file.txt")
+            self.write_file(source_file, "content")
+            asset_sync.sync(source, destination)
+
+            os.utime(source_file, (0, 0))
+            result = asset_sync.sync(source, destination, checksum=True)
+            self.assertEqual(result.skipped, ["file.txt"])
+
+    def test_sync_hardlink(self):
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as destination:
+            source_file = os.path.join(source, "file.txt")
+            self.write_file(source_file, "content")
+            asset_sync.sync(source, destination, link=asset_sync.SYNC_LINK_HARDLINK)
+            self.assertTrue(os.path.samefile(source_file, os.path.join(destination, "file.txt")))
+
+    def test_sync_reflink_fallback(self):
+        # Reflinks fall back to copying on file systems not supporting them
+        with tempfile.TemporaryDirectory() as destination:
+            result = asset_sync.sync("tests/resources/site/assets", destination, link=asset_sync.SYNC_LINK_REFLINK)
+            self.assertEqual(result.copied, ["css/style.css"])
+            self.assertTrue(os.path.exists(os.path.join(destination, "css", "style.css")))
+
+    def test_sync_fingerprint(self):
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as destination:
+            source_file = os.path.join(source, "css", "style.css")
+            self.write_file(source_file, "body {}")
+
+            result = asset_sync.sync(source, destination, fingerprint=True)
+            fingerprinted = result.fingerprints["css/style.css"]
+            self.assertRegex(fingerprinted, r"^css/style\.[0-9a-f]{12}\.css$")
+            self.assertEqual(result.files, [fingerprinted])
+            self.assertTrue(os.path.exists(os.path.join(destination, fingerprinted)))
+
+            # Changed content is synced to a different path
+            self.write_file(source_file, "body { color: black; }")
+            result = asset_sync.sync(source, destination, fingerprint=True)
+            self.assertNotEqual(result.fingerprints["css/style.css"], fingerprinted)
+
+    def test_rewrite_css_urls(self):
+        asset_urls = {"assets/banner.png": "assets/banner.0123456789ab.png", "css/font.woff": "css/font.ba9876543210.woff"}
+        text = 'a { background: url("../assets/banner.png"); } b { src: url(font.woff?v=1) url(data:image/png;base64,AA==) url("../assets/other.png"); }'
+        self.assertEqual(asset_sync.rewrite_css_urls(text, "css/style.css", asset_urls),
+            'a { background: url("../assets/banner.0123456789ab.png"); } b { src: url(font.ba9876543210.woff?v=1) url(data:image/png;base64,AA==) url("../assets/other.png"); }')
+        self.assertEqual(asset_sync.rewrite_css_urls("a { background: url('/assets/banner.png'); }", "css/style.css", asset_urls), "a { background: url('/assets/banner.0123456789ab.png'); }")
+
+    def test_sync_fingerprint_rewrite(self):
+        # Stylesheets are fingerprinted after rewriting their references
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as destination:
+            self.write_file(os.path.join(source, "style.css"), 'a { background: url("banner.png"); }')
+            self.write_file(os.path.join(source, "banner.png"), "image")
+            fingerprints = asset_sync.get_fingerprints(source)
+            rewrite = lambda path, data: asset_sync.rewrite_stylesheet(fingerprints, "", path, data)
+
+            result = asset_sync.sync(source, destination, fingerprint=True, rewrite=rewrite)
+            self.assertEqual(result.fingerprints, asset_sync.get_fingerprints(source, rewrite=rewrite))
+            self.assertNotEqual(result.fingerprints["style.css"], fingerprints["style.css"])
+            with open(os.path.join(destination, result.fingerprints["style.css"]), "r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), 'a { background: url("' + fingerprints["banner.png"] + '"); }')
+
+    def test_get_fingerprinted_path(self):
+        self.assertEqual(asset_sync.get_fingerprinted_path("css/bootstrap.min.css", "0123456789abcdef"), "css/bootstrap.min.0123456789ab.css")
+        self.assertEqual(asset_sync.get_fingerprinted_path("LICENSE", "0123456789abcdef"), "LICENSE.0123456789ab")
+
+    def test_sync_not_existing_source(self):
+        with tempfile.TemporaryDirectory() as destination:
+            result = asset_sync.sync("tests/resources/not_existing_hopefully", destination)
+            self.assertEqual(result.files, [])
+
+    # delete_removed
+
+    def test_delete_removed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_file(os.path.join(directory, "kept.txt"), "")
+            self.write_file(os.path.join(directory, "folder", "removed.txt"), "")
+            self.write_file(os.path.join(directory, "unrelated.txt"), "")
+
+            deleted = asset_sync.delete_removed(directory, ["kept.txt", "folder/removed.txt"], ["kept.txt"])
+            self.assertEqual(deleted, ["folder/removed.txt"])
+            # Directories left empty are removed, files not synced before are left alone
+            self.assertEqual(sorted(os.listdir(directory)), ["kept.txt", "unrelated.txt"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+
+import sys
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from siteforge import build_cache
+from siteforge import builder
+from siteforge import minify
+from jinja2 import FileSystemLoader
+
+"""
+Tests for build_cache.py
+"""
+class BuildCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        # Work on a copy of the test site so it can be edited
+        self.directory = tempfile.TemporaryDirectory()
+        self.site = os.path.join(self.directory.name, "site")
+        self.cache_dir = os.path.join(self.directory.name, "cache")
+        shutil.copytree("tests/resources/site", self.site)
+
+        self.loader = builder.env.loader
+        builder.env.loader = FileSystemLoader("tests/resources/templates")
+
+    def tearDown(self):
+        builder.env.loader = self.loader
+        self.directory.cleanup()
+
+    def build_test_site(self, output_name, **kwargs):
+        return builder.build_site(os.path.join(self.site, "content"), os.path.join(self.site, "build_registry.json"), os.path.join(self.site, "asset_registry.json"),
+            os.path.join(self.directory.name, output_name), **kwargs)
+
+    def read_output(self, output_name, path):
+        with open(os.path.join(self.directory.name, output_name, path), "r", encoding="utf-8") as f:
+            return f.read()
+
+    # Stores
+
+    def test_directory_store(self):
+        store = build_cache.DirectoryStore(self.cache_dir)
+        key = "ab" * 32
+        self.assertIsNone(store.get(key))
+        self.assertTrue(store.put(key, b"data"))
+        self.assertEqual(store.get(key), b"data")
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, "ab", key)))
+
+    def test_open_store(self):
+        self.assertIsInstance(build_cache.open_store(self.cache_dir), build_cache.DirectoryStore)
+        self.assertIsInstance(build_cache.open_store("http://127.0.0.1:8765"), build_cache.HttpStore)
+
+    def test_is_cache_key(self):
+        self.assertTrue(build_cache.is_cache_key("0123456789abcdef" * 4))
+        self.assertFalse(build_cache.is_cache_key("../" + "a" * 61))
+        self.assertFalse(build_cache.is_cache_key("a" * 63))
+
+    # Building
+
+    def test_build_site_cached(self):
+        result = self.build_test_site("first", build_cache=self.cache_dir)
+        self.assertEqual(result.cached, [])
+        self.assertEqual(result.build_cache_misses, 3)
+
+        # A fresh output directory is built from the cache
+        result = self.build_test_site("second", build_cache=self.cache_dir)
+        self.assertEqual(result.cached, ["index.html", "project/project1.html", "project/project2.html"])
+        self.assertEqual(result.written, ["index.html", "project/project1.html", "project/project2.html"])
+        self.assertEqual(result.build_cache_hits, 3)
+        self.assertEqual(result.build_cache_misses, 0)
+        self.assertEqual(self.read_output("second", "index.html"), "<html>Site</html>")
+        self.assertEqual(self.read_output("second", "project/project2.html"), "<html>Project 2</html>")
+
+    def test_build_site_cached_content_changed(self):
+        self.build_test_site("first", build_cache=self.cache_dir)
+
+        # Only the page referencing the changed content is rendered again
+        path = os.path.join(self.site, "content", "data.json")
+        with open(path, "r", encoding="utf-8") as f:
+            data = f.read()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data.replace('"Title": "Site"', '"Title": "Changed"'))
+
+        result = self.build_test_site("second", build_cache=self.cache_dir)
+        self.assertEqual(result.cached, ["project/project1.html", "project/project2.html"])
+        self.assertEqual(self.read_output("second", "index.html"), "<html>Changed</html>")
+
+    def test_build_site_cached_transformed_assets(self):
+        self.build_test_site("first", build_cache=self.cache_dir, transforms=minify.MINIFY_TRANSFORMS)
+
+        result = self.build_test_site("second", build_cache=self.cache_dir, transforms=minify.MINIFY_TRANSFORMS)
+        self.assertEqual(result.build_cache_misses, 0)
+        self.assertEqual(result.assets_copied, ["static/css/style.css"])
+        self.assertEqual(self.read_output("second", "static/css/style.css"), self.read_output("first", "static/css/style.css"))
+        self.assertEqual(result.transform_savings, self.build_test_site("third", transforms=minify.MINIFY_TRANSFORMS).transform_savings)
+
+    def test_build_site_http_cache(self):
+        server = build_cache.create_cache_server(self.cache_dir, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = "http://127.0.0.1:" + str(server.server_address[1])
+            self.build_test_site("first", build_cache=url)
+
+            result = self.build_test_site("second", build_cache=url)
+            self.assertEqual(result.build_cache_hits, 3)
+            self.assertEqual(self.read_output("second", "index.html"), "<html>Site</html>")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_build_site_http_cache_unreachable(self):
+        # Find a port nothing listens on
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+
+        result = self.build_test_site("first", build_cache="http://127.0.0.1:" + str(port))
+        self.assertEqual(result.failed, [])
+        self.assertEqual(result.written, ["index.html", "project/project1.html", "project/project2.html"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,9 +2,19 @@ import unittest
 
 import sys
 import os
+import asyncio
+import hashlib
+import json
+import shutil
+import tempfile
+import threading
+import time
 
 from siteforge import builder
+from siteforge import manifest
+from siteforge import json_function_registration as registration
 from siteforge.json_function_registration import json_func
+from jinja2 import FileSystemLoader
 
 """
 Tests for builder.py
@@ -39,6 +49,123 @@ class BuilderTests(unittest.TestCase):
     def add(left, right):
         return left + right
 
+    # concurrent functions
+
+    def register_concurrent(self, func, **options):
+        # Concurrent functions change how all content is ressolved, so they are only registered for the test
+        json_func(func, **options)
+        self.addCleanup(registration.JSON_FUNCTION_REFERENCES.pop, func.__name__)
+        self.addCleanup(registration.JSON_FUNCTION_OPTIONS.pop, func.__name__)
+        return func
+
+    def create_running_counter(self):
+        counter = {"running": 0, "max": 0, "calls": 0}
+        lock = threading.Lock()
+
+        def enter():
+            with lock:
+                counter["calls"] += 1
+                counter["running"] += 1
+                counter["max"] = max(counter["max"], counter["running"])
+
+        def exit():
+            with lock:
+                counter["running"] -= 1
+
+        return counter, enter, exit
+
+    def test_process_content_value_async(self):
+        counter, enter, exit = self.create_running_counter()
+
+        async def concurrent_async(value, delay):
+            enter()
+            await asyncio.sleep(delay)
+            exit()
+            return value
+
+        self.register_concurrent(concurrent_async)
+
+        # Results end up in order, even though later calls finish first
+        value = {"items": [{"$func": "concurrent_async", "args": [i, 0.05 - i * 0.01]} for i in range(5)], "title": "Title"}
+        self.assertEqual(builder.process_content_value(value), {"items": [0, 1, 2, 3, 4], "title": "Title"})
+        self.assertEqual(counter["max"], 5)
+
+    def test_process_content_value_thread(self):
+        counter, enter, exit = self.create_running_counter()
+
+        def concurrent_thread(value):
+            enter()
+            time.sleep(0.02)
+            exit()
+            return value
+
+        self.register_concurrent(concurrent_thread, thread=True)
+
+        value = [{"$func": "concurrent_thread", "args": [i]} for i in range(6)]
+        self.assertEqual(builder.process_content_value(value, concurrency=2), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(counter["max"], 2)
+
+    def test_process_content_value_concurrent_nested(self):
+        async def concurrent_add(left, right):
+            return left + right
+
+        self.register_concurrent(concurrent_add)
+
+        value = {"$func": "concurrent_add", "args": [{"$func": "concurrent_add", "args": [1, 2]}], "kwargs": {"right": {"$func": "add", "args": [3, 4]}}}
+        self.assertEqual(builder.process_content_value(value), 10)
+
+    def test_process_content_value_concurrent_pure(self):
+        counter, enter, exit = self.create_running_counter()
+
+        async def concurrent_pure(value):
+            enter()
+            await asyncio.sleep(0.01)
+            exit()
+            return value
+
+        self.register_concurrent(concurrent_pure, pure=True)
+
+        # Identical calls running at the same time are evaluated once
+        cache = registration.JsonFuncCache()
+        value = [{"$func": "concurrent_pure", "args": [1]} for _ in range(3)]
+        self.assertEqual(builder.process_content_value(value, cache), [1, 1, 1])
+        self.assertEqual(counter["calls"], 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_process_content_value_concurrent_unused(self):
+        def concurrent_unused(value):
+            return value
+
+        self.register_concurrent(concurrent_unused, thread=True)
+
+        # Content not calling concurrent functions is ressolved without an event loop
+        run = asyncio.run
+        asyncio.run = None
+        try:
+            value = {"items": [{"Id": i} for i in range(3)], "add": {"$func": "add", "args": [1, 2]}}
+            self.assertEqual(builder.process_content_value(value), {"items": [{"Id": 0}, {"Id": 1}, {"Id": 2}], "add": 3})
+        finally:
+            asyncio.run = run
+
+    def test_process_content_value_concurrent_running_loop(self):
+        async def concurrent_double(value):
+            return value * 2
+
+        self.register_concurrent(concurrent_double)
+
+        async def resolve():
+            return builder.process_content_value([{"$func": "concurrent_double", "args": [i]} for i in range(3)])
+
+        self.assertEqual(asyncio.run(resolve()), [0, 2, 4])
+
+    def test_load_content_concurrent(self):
+        async def concurrent_zero():
+            return 0
+
+        self.register_concurrent(concurrent_zero)
+
+        self.assertEqual(builder.load_content("tests/resources/content/func/add"), {'add_args': {'add': 3}, 'add_kwargs': {'add': 3}})
+
     # load_build_registry
 
     def test_load_build_registry(self):
@@ -254,5 +381,361 @@ class BuilderTests(unittest.TestCase):
         expected['Friday'] = content['Entry']['Person']
         self.assertEqual(result, expected)
 
+    def test_get_processed_content_from_build_item_with_index(self):
+        content = {}
+        content['Entry'] = [
+            {
+                "Id": "Test",
+                "Title": "Cool Title"
+            },
+            {
+                "Id": "Test2",
+                "Title": "Cool 2nd Title"
+            }
+        ]
+
+        build_item_json = {
+            "template": "home.html",
+            "output": "index.html",
+            "boundContext": [
+                {
+                    "Name": "BoundEntry",
+                    "Where": {
+                        "Key": "Id",
+                        "Value": "Test2"
+                    }
+                }
+            ]
+        }
+
+        index = builder.build_content_index(content)
+        result = builder.get_processed_content_from_build_item(build_item_json, content, index)
+        # Expected is to be bound through the index
+        expected = {}
+        expected['BoundEntry'] = content['Entry'][1]
+        self.assertEqual(result, expected)
+
+    # write
+
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, "folder", "index.html")
+            self.assertTrue(builder.write(path, "content"))
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(f.read(), "content")
+            # No temporary files are left behind
+            self.assertEqual(os.listdir(os.path.dirname(path)), ["index.html"])
+
+    def test_write_unchanged(self):
+        # Writing identical content leaves the file untouched
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, "index.html")
+            builder.write(path, "content")
+            os.utime(path, (0, 0))
+            self.assertFalse(builder.write(path, "content"))
+            self.assertEqual(os.path.getmtime(path), 0)
+
+            self.assertTrue(builder.write(path, "changed"))
+            self.assertNotEqual(os.path.getmtime(path), 0)
+
+    def test_write_stream(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, "page", "index.html")
+            self.assertTrue(builder.write_stream(path, iter(["<html>", "content", "</html>"]), buffer_size=4))
+            self.assertEqual(self.read_output(output_dir, "page/index.html"), "<html>content</html>")
+
+            # Streaming identical content leaves the file untouched
+            os.utime(path, (0, 0))
+            self.assertFalse(builder.write_stream(path, iter(["<html>content", "</html>"])))
+            self.assertEqual(os.path.getmtime(path), 0)
+
+    def test_write_stream_failed(self):
+        # Failing to produce all chunks leaves the file on disk as it was
+        def chunks():
+            yield "partial"
+            raise ValueError("failed")
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, "index.html")
+            builder.write(path, "content")
+            self.assertRaises(ValueError, builder.write_stream, path, chunks())
+            self.assertEqual(os.listdir(output_dir), ["index.html"])
+            self.assertEqual(self.read_output(output_dir, "index.html"), "content")
+
+    # build_site
+
+    def setUp(self):
+        self.loader = builder.env.loader
+        builder.env.loader = FileSystemLoader("tests/resources/templates")
+
+    def tearDown(self):
+        builder.env.loader = self.loader
+
+    def build_test_site(self, output_dir, **kwargs):
+        return builder.build_site("tests/resources/site/content", "tests/resources/site/build_registry.json", "tests/resources/site/asset_registry.json", output_dir, **kwargs)
+
+    def read_output(self, output_dir, path):
+        with open(os.path.join(output_dir, path), encoding="utf-8") as f:
+            return f.read()
+
+    def test_build_site(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = self.build_test_site(output_dir)
+            self.assertEqual(result.failed, [])
+            self.assertEqual(self.read_output(output_dir, "index.html"), "<html>Site</html>")
+            self.assertEqual(self.read_output(output_dir, "project/project2.html"), "<html>Project 2</html>")
+            self.assertTrue(os.path.exists(os.path.join(output_dir, "static", "css", "style.css")))
+            self.assertEqual(len(result.written), 3)
+
+            # Building again doesn't write any of the pages as they are identical
+            result = self.build_test_site(output_dir)
+            self.assertEqual(result.written, [])
+            self.assertEqual(len(result.skipped), 3)
+
+    def test_build_site_stream(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            for write_workers in [0, 2]:
+                result = self.build_test_site(output_dir, stream=True, write_workers=write_workers)
+                self.assertEqual(result.failed, [])
+                self.assertEqual(self.read_output(output_dir, "index.html"), "<html>Site</html>")
+                self.assertEqual(self.read_output(output_dir, "project/project2.html"), "<html>Project 2</html>")
+
+            # Pages were streamed identical to the pages already on disk
+            self.assertEqual(len(result.skipped), 3)
+
+    def test_build_pages_stream_failed_page(self):
+        build_registry = [
+            {"template": "broken.html", "output": "broken.html"},
+            {"template": "page.html", "output": "index.html"}
+        ]
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = builder.build_pages(build_registry, {"data": {"Title": "Site"}}, output_dir, stream=True)
+            self.assertEqual([output for output, error in result.failed], ["broken.html"])
+            self.assertEqual(sorted(os.listdir(output_dir)), ["index.html"])
+
+    def test_build_site_workers(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = self.build_test_site(output_dir, workers=2)
+            self.assertEqual(result.failed, [])
+            self.assertEqual(self.read_output(output_dir, "project/project1.html"), "<html>Project 1</html>")
+            self.assertEqual(self.read_output(output_dir, "project/project2.html"), "<html>Project 2</html>")
+
+    def test_build_pages_failed_page(self):
+        # A failing page is reported without stopping the other pages from building
+        build_registry = [
+            {"template": "broken.html", "output": "broken.html"},
+            {"template": "page.html", "output": "index.html"}
+        ]
+        content = {"data": {"Title": "Site"}}
+
+        for workers in [1, 2]:
+            with tempfile.TemporaryDirectory() as output_dir:
+                result = builder.build_pages(build_registry, content, output_dir, workers=workers)
+                self.assertEqual([output for output, error in result.failed], ["broken.html"])
+                self.assertEqual(self.read_output(output_dir, "index.html"), "<html>Site</html>")
+
+    def test_build_site_lazy_content(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = self.build_test_site(output_dir, lazy_content=True)
+            self.assertEqual(result.failed, [])
+            self.assertEqual(self.read_output(output_dir, "index.html"), "<html>Site</html>")
+            self.assertEqual(self.read_output(output_dir, "project/project2.html"), "<html>Project 2</html>")
+
+    def test_build_page_lazy_content_unused(self):
+        # Content files not referenced by the template are never loaded
+        content = builder.load_content("tests/resources/more", lazy=True)
+        with tempfile.TemporaryDirectory() as output_dir:
+            context = builder.BuildContext(content, output_dir)
+            builder.build_page({"template": "page.html", "output": "index.html"}, context)
+            self.assertEqual(list(content._cache.keys()), ['data'])
+
+    def test_build_site_incremental(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = self.build_test_site(output_dir, incremental=True)
+            self.assertEqual(result.up_to_date, [])
+
+            # Nothing changed, so nothing is built again
+            result = self.build_test_site(output_dir, incremental=True)
+            self.assertEqual(result.up_to_date, ["index.html", "project/project1.html", "project/project2.html"])
+
+            self.assertEqual(result.assets_copied, [])
+            self.assertEqual(result.assets_skipped, ["static/css/style.css"])
+
+            # Removed output is built again
+            os.remove(os.path.join(output_dir, "index.html"))
+            result = self.build_test_site(output_dir, incremental=True)
+            self.assertEqual(result.up_to_date, ["project/project1.html", "project/project2.html"])
+            self.assertEqual(self.read_output(output_dir, "index.html"), "<html>Site</html>")
+
+    def test_build_pages_bound_incremental(self):
+        content = builder.load_content("tests/resources/site/content")
+        build_registry = builder.load_build_registry("tests/resources/site/build_registry.json")
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            first_manifest = manifest.create_manifest()
+            builder.build_pages(build_registry, content, output_dir, previous_manifest=manifest.create_manifest(), manifest=first_manifest)
+
+            # Bound content isn't queried again when no content changed, so content isn't indexed
+            lookups = builder.ContentLookups(content)
+            second_manifest = manifest.create_manifest()
+            result = builder.build_pages(build_registry, content, output_dir, previous_manifest=first_manifest, manifest=second_manifest, lookups=lookups)
+            self.assertEqual(result.up_to_date, ["index.html", "project/project1.html", "project/project2.html"])
+            self.assertIsNone(lookups._index)
+
+            # Of the pages bound to an item, only the page bound to the changed item is built again
+            content["data"]["Projects"][1]["Title"] = "Changed"
+            result = builder.build_pages(build_registry, content, output_dir, previous_manifest=second_manifest, manifest=manifest.create_manifest())
+            self.assertEqual(result.up_to_date, ["project/project1.html"])
+            self.assertEqual(result.written, ["project/project2.html"])
+            self.assertEqual(self.read_output(output_dir, "project/project2.html"), "<html>Changed</html>")
+
+    def test_build_site_assets_removed(self):
+        # Assets removed from the asset sources are deleted by builds that aren't incremental as well
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copytree("tests/resources/site", os.path.join(directory, "site"))
+            output_dir = os.path.join(directory, "output")
+            site = lambda path: os.path.join(directory, "site", path)
+            with open(site("assets/css/removed.css"), "w", encoding="utf-8") as f:
+                f.write("body {}")
+
+            builder.build_site(site("content"), site("build_registry.json"), site("asset_registry.json"), output_dir)
+            self.assertTrue(os.path.exists(os.path.join(output_dir, "static", "css", "removed.css")))
+
+            os.remove(site("assets/css/removed.css"))
+            result = builder.build_site(site("content"), site("build_registry.json"), site("asset_registry.json"), output_dir)
+            self.assertEqual(result.assets_deleted, ["static/css/removed.css"])
+            self.assertFalse(os.path.exists(os.path.join(output_dir, "static", "css", "removed.css")))
+
+    def test_copy_assets_removed(self):
+        # Assets removed from the asset sources are deleted from the output when a previous manifest is passed
+        with tempfile.TemporaryDirectory() as output_dir:
+            asset_registry = builder.load_asset_registry("tests/resources/site/asset_registry.json")
+            previous_manifest = manifest.create_manifest()
+            previous_manifest[manifest.MANIFEST_VAR_ASSETS_NOTATION] = ["static/css/removed.css"]
+            os.makedirs(os.path.join(output_dir, "static", "css"))
+            open(os.path.join(output_dir, "static", "css", "removed.css"), "w").close()
+
+            result = builder.BuildResult()
+            current_manifest = manifest.create_manifest()
+            builder.copy_assets(asset_registry, "tests/resources/site/asset_registry.json", output_dir, result, previous_manifest=previous_manifest, manifest=current_manifest)
+            self.assertEqual(result.assets_copied, ["static/css/style.css"])
+            self.assertEqual(result.assets_deleted, ["static/css/removed.css"])
+            self.assertEqual(current_manifest[manifest.MANIFEST_VAR_ASSETS_NOTATION], ["static/css/style.css"])
+
+    # asset fingerprinting
+
+    def test_asset_url(self):
+        builder.set_asset_urls({"css/style.css": "css/style.0123456789ab.css"})
+        try:
+            self.assertEqual(builder.asset_url("css/style.css"), "css/style.0123456789ab.css")
+            self.assertEqual(builder.asset_url("/css/style.css"), "/css/style.0123456789ab.css")
+            self.assertEqual(builder.asset_url("css/other.css"), "css/other.css")
+        finally:
+            builder.set_asset_urls(None)
+
+    def test_build_site_fingerprint_assets(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = self.build_test_site(output_dir, fingerprint_assets=True)
+            fingerprinted = result.asset_urls["static/css/style.css"]
+            self.assertEqual(result.assets_copied, [fingerprinted])
+            self.assertEqual(json.loads(self.read_output(output_dir, builder.ASSET_MANIFEST_FILE_NAME)), {"static/css/style.css": fingerprinted})
+
+            build_registry = [{"template": "assets.html", "output": "assets.html"}]
+            builder.build_pages(build_registry, {}, output_dir, asset_urls=result.asset_urls)
+            self.assertEqual(self.read_output(output_dir, "assets.html"), "<link rel=\"stylesheet\" href=\"/" + fingerprinted + "\">")
+
+    def test_copy_assets_fingerprint_stylesheet(self):
+        # Stylesheets link to the fingerprinted assets of other entries
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as output_dir:
+            for path, text in [("css/style.css", 'a { background: url("../assets/banner.png"); }'), ("assets/banner.png", "image")]:
+                os.makedirs(os.path.dirname(os.path.join(source, path)), exist_ok=True)
+                with open(os.path.join(source, path), "w", encoding="utf-8") as f:
+                    f.write(text)
+
+            asset_registry = [{"Source": "css", "Destination": "css"}, {"Source": "assets", "Destination": "assets"}]
+            result = builder.BuildResult()
+            builder.copy_assets(asset_registry, source, output_dir, result, fingerprint=True)
+            banner = result.asset_urls["assets/banner.png"]
+            stylesheet = self.read_output(output_dir, result.asset_urls["css/style.css"])
+            self.assertEqual(stylesheet, 'a { background: url("../assets/' + os.path.basename(banner) + '"); }')
+            self.assertIn(hashlib.sha256(stylesheet.encode("utf-8")).hexdigest()[:12], result.asset_urls["css/style.css"])
+            self.assertTrue(os.path.exists(os.path.join(output_dir, banner)))
+
+    def test_build_pages_fingerprint_assets_incremental(self):
+        # Pages linking to assets are built again when the fingerprint of an asset changes
+        build_registry = [{"template": "assets.html", "output": "assets.html"}, {"template": "page.html", "output": "index.html"}]
+        content = {"data": {"Title": "Site"}}
+        with tempfile.TemporaryDirectory() as output_dir:
+            previous_manifest = manifest.create_manifest()
+            builder.build_pages(build_registry, content, output_dir, previous_manifest=manifest.create_manifest(), manifest=previous_manifest, asset_urls={"static/css/style.css": "static/css/style.0123456789ab.css"})
+
+            current_manifest = manifest.create_manifest()
+            result = builder.build_pages(build_registry, content, output_dir, previous_manifest=previous_manifest, manifest=current_manifest, asset_urls={"static/css/style.css": "static/css/style.ba9876543210.css"})
+            self.assertEqual(result.written, ["assets.html"])
+            self.assertEqual(result.up_to_date, ["index.html"])
+
+    # forEach
+
+    def test_expand_build_registry(self):
+        content = {"data": {"Projects": [{"Id": "Project1"}, {"Id": "Project2"}]}}
+        build_registry = [
+            {"template": "page.html", "output": "index.html"},
+            {"template": "project.html", "output": "project/{Id}.html", "forEach": {"Name": "Project", "In": "data.Projects"}}
+        ]
+
+        result = builder.expand_build_registry(build_registry, content)
+        self.assertEqual([e["output"] for e in result], ["index.html", "project/Project1.html", "project/Project2.html"])
+        self.assertEqual(builder.get_processed_content_from_build_item(result[2], content), {"Project": {"Id": "Project2"}})
+
+    def test_expand_build_registry_failed(self):
+        content = {"data": {"Title": "Site", "Projects": [{"Id": "Project1"}, {"Title": "No id"}, {"Id": "Project1"}]}}
+        build_registry = [
+            {"template": "project.html", "output": "missing/{Id}.html", "forEach": {"Name": "Project", "In": "data.Missing"}},
+            {"template": "project.html", "output": "title/{Id}.html", "forEach": {"Name": "Project", "In": "data.Title"}},
+            {"template": "project.html", "output": "project/{Id}.html", "forEach": {"Name": "Project", "In": "data.Projects"}}
+        ]
+
+        # Entries and items that can't be expanded are reported, the rest is still expanded
+        result = builder.BuildResult()
+        expanded = builder.expand_build_registry(build_registry, content, result)
+        self.assertEqual([e["output"] for e in expanded], ["project/Project1.html"])
+        self.assertEqual([output for output, error in result.failed], ["missing/{Id}.html", "title/{Id}.html", "project/{Id}.html", "project/Project1.html"])
+
+    def test_expand_build_registry_missing(self):
+        content = {"data": {"Projects": [{"Id": "Project1"}]}}
+        build_registry = [
+            {"template": "project.html", "output": "name/{Id}.html", "forEach": {"In": "data.Projects"}},
+            {"template": "project.html", "output": "in/{Id}.html", "forEach": {"Name": "Project"}}
+        ]
+
+        result = builder.BuildResult()
+        self.assertEqual(builder.expand_build_registry(build_registry, content, result), [])
+        self.assertEqual(result.failed, [("name/{Id}.html", "Missing required forEach entry: Name"), ("in/{Id}.html", "Missing required forEach entry: In")])
+
+    def test_build_pages_for_each(self):
+        content = builder.load_content("tests/resources/site/content")
+        build_registry = [{"template": "project.html", "output": "project/{Id}.html", "forEach": {"Name": "Project", "In": "data.Projects"}}]
+
+        for workers in [1, 2]:
+            with tempfile.TemporaryDirectory() as output_dir:
+                result = builder.build_pages(build_registry, content, output_dir, workers=workers)
+                self.assertEqual(result.written, ["project/Project1.html", "project/Project2.html"])
+                self.assertEqual(self.read_output(output_dir, "project/Project2.html"), "<html>Project 2</html>")
+
+    def test_build_pages_for_each_incremental(self):
+        content = builder.load_content("tests/resources/site/content")
+        build_registry = [{"template": "project.html", "output": "project/{Id}.html", "forEach": {"Name": "Project", "In": "data.Projects"}}]
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            first_manifest = manifest.create_manifest()
+            builder.build_pages(build_registry, content, output_dir, previous_manifest=manifest.create_manifest(), manifest=first_manifest)
+
+            # Only the page of the changed item is built again
+            content["data"]["Projects"][1]["Title"] = "Changed"
+            result = builder.build_pages(build_registry, content, output_dir, previous_manifest=first_manifest, manifest=manifest.create_manifest())
+            self.assertEqual(result.up_to_date, ["project/Project1.html"])
+            self.assertEqual(result.written, ["project/Project2.html"])
+            self.assertEqual(self.read_output(output_dir, "project/Project2.html"), "<html>Changed</html>")
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import unittest
+
+import sys
+import os
+import gzip
+import tempfile
+
+from siteforge import builder
+from siteforge import compression
+from jinja2 import FileSystemLoader
+
+"""
+Tests for compression.py
+"""
+class CompressionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = builder.env.loader
+        builder.env.loader = FileSystemLoader("tests/resources/templates")
+
+    def tearDown(self):
+        builder.env.loader = self.loader
+
+    def write_file(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def test_compress_bytes_deterministic(self):
+        data = b"<html>" + b"a" * 1000 + b"</html>"
+        self.assertEqual(compression.compress_bytes(data), compression.compress_bytes(data))
+        self.assertEqual(gzip.decompress(compression.compress_bytes(data, 1)), data)
+
+    def test_is_compressible(self):
+        self.assertTrue(compression.is_compressible("index.html"))
+        self.assertTrue(compression.is_compressible("css/style.CSS"))
+        self.assertFalse(compression.is_compressible("image.png"))
+        self.assertFalse(compression.is_compressible("index.html.gz"))
+
+    def test_compress_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_file(os.path.join(directory, "index.html"), "<html>Index</html>")
+            self.write_file(os.path.join(directory, "css", "style.css"), "body {}")
+            self.write_file(os.path.join(directory, "image.png"), "not text")
+
+            for workers in [1, 2]:
+                result = compression.compress_files(directory, ["index.html", "css/style.css", "image.png"], workers=workers)
+                self.assertEqual(result.compressed, ["css/style.css", "index.html"])
+                with open(os.path.join(directory, "index.html.gz"), "rb") as f:
+                    self.assertEqual(gzip.decompress(f.read()), b"<html>Index</html>")
+            self.assertFalse(os.path.exists(os.path.join(directory, "image.png.gz")))
+
+            # Unchanged files are skipped
+            result = compression.compress_files(directory, ["index.html", "css/style.css"], result.hashes)
+            self.assertEqual(result.compressed, [])
+            self.assertEqual(result.skipped, ["css/style.css", "index.html"])
+
+            # Changed files are compressed again
+            self.write_file(os.path.join(directory, "index.html"), "<html>Changed</html>")
+            result = compression.compress_files(directory, ["index.html", "css/style.css"], result.hashes)
+            self.assertEqual(result.compressed, ["index.html"])
+
+    def test_compress_files_removed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_file(os.path.join(directory, "index.html"), "<html>Index</html>")
+            self.write_file(os.path.join(directory, "other.html"), "<html>Other</html>")
+            result = compression.compress_files(directory, ["index.html", "other.html"])
+
+            # Compressed siblings of removed files are deleted, files that still exist are kept track of
+            os.remove(os.path.join(directory, "index.html"))
+            result = compression.compress_files(directory, [], result.hashes)
+            self.assertEqual(result.deleted, ["index.html.gz"])
+            self.assertFalse(os.path.exists(os.path.join(directory, "index.html.gz")))
+            self.assertEqual(list(result.hashes), ["other.html"])
+
+    def test_build_site_compress(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            args = ("tests/resources/site/content", "tests/resources/site/build_registry.json", "tests/resources/site/asset_registry.json", output_dir)
+            result = builder.build_site(*args, compress=True)
+            self.assertEqual(result.compressed, ["index.html", "project/project1.html", "project/project2.html", "static/css/style.css"])
+            with gzip.open(os.path.join(output_dir, "project", "project1.html.gz"), "rb") as f:
+                self.assertEqual(f.read(), b"<html>Project 1</html>")
+
+            result = builder.build_site(*args, compress=True)
+            self.assertEqual(result.compressed, [])
+            self.assertEqual(len(result.compress_skipped), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+
+import sys
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from siteforge import builder
+from siteforge import cli
+from siteforge import daemon
+
+"""
+Tests for daemon.py and cli.py
+"""
+class DaemonTests(unittest.TestCase):
+
+    def setUp(self):
+        # Work on a copy of the test site so it can be edited
+        self.directory = tempfile.TemporaryDirectory()
+        self.site = os.path.join(self.directory.name, "site")
+        self.output_dir = os.path.join(self.directory.name, "output")
+        shutil.copytree("tests/resources/site", self.site)
+
+        self.daemon = daemon.BuildDaemon(os.path.join(self.directory.name, "daemon.sock"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_build_request(self, command=daemon.COMMAND_BUILD, **kwargs):
+        return daemon.create_build_request(command, content_path=os.path.join(self.site, "content"), build_registry_path=os.path.join(self.site, "build_registry.json"),
+            asset_registry_path=os.path.join(self.site, "asset_registry.json"), output_dir=self.output_dir, template_path="tests/resources/templates", **kwargs)
+
+    def edit(self, path, old, new):
+        path = os.path.join(self.site, path)
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text.replace(old, new))
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    # BuildDaemon
+
+    def test_handle_build(self):
+        response = self.daemon.handle(self.create_build_request())
+        self.assertTrue(response[daemon.RESPONSE_VAR_OK_NOTATION])
+        self.assertIsNone(response[daemon.RESPONSE_VAR_CHANGES_NOTATION])
+        self.assertEqual(len(response[daemon.RESPONSE_VAR_RESULT_NOTATION]["written"]), 3)
+
+        # The session is kept warm, building again only builds what changed
+        response = self.daemon.handle(self.create_build_request())
+        self.assertEqual(response[daemon.RESPONSE_VAR_CHANGES_NOTATION], {})
+        self.assertEqual(response[daemon.RESPONSE_VAR_RESULT_NOTATION]["written"], [])
+
+        self.edit("content/data.json", '"Title": "Site"', '"Title": "Changed"')
+        response = self.daemon.handle(self.create_build_request())
+        self.assertEqual(list(response[daemon.RESPONSE_VAR_CHANGES_NOTATION].keys()), ["content"])
+        self.assertEqual(response[daemon.RESPONSE_VAR_RESULT_NOTATION]["written"], ["index.html"])
+        self.assertEqual(len(self.daemon.sessions), 1)
+
+    def test_handle_rebuild(self):
+        self.daemon.handle(self.create_build_request())
+
+        # Every page is rendered again, also output changed outside of the build is written again
+        with open(os.path.join(self.output_dir, "index.html"), "w", encoding="utf-8") as f:
+            f.write("edited")
+        response = self.daemon.handle(self.create_build_request(daemon.COMMAND_REBUILD))
+        self.assertIsNone(response[daemon.RESPONSE_VAR_CHANGES_NOTATION])
+        self.assertEqual(response[daemon.RESPONSE_VAR_RESULT_NOTATION]["up_to_date"], [])
+        self.assertEqual(response[daemon.RESPONSE_VAR_RESULT_NOTATION]["written"], ["index.html"])
+        self.assertEqual(response[daemon.RESPONSE_VAR_RESULT_NOTATION]["skipped"], ["project/project1.html", "project/project2.html"])
+
+    def test_handle_sessions(self):
+        # Different session arguments are kept as separate sessions
+        self.daemon.handle(self.create_build_request())
+        self.daemon.handle(self.create_build_request(minify=True))
+        response = self.daemon.handle({daemon.REQUEST_VAR_COMMAND_NOTATION: daemon.COMMAND_STATUS})
+        self.assertEqual(len(response[daemon.RESPONSE_VAR_SESSIONS_NOTATION]), 2)
+
+    def test_handle_working_directory(self):
+        # Templates are found regardless of the working directory of the daemon
+        request = self.create_build_request()
+        cwd = os.getcwd()
+        os.chdir(self.directory.name)
+        try:
+            response = self.daemon.handle(request)
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(response[daemon.RESPONSE_VAR_RESULT_NOTATION]["failed"], [])
+        with open(os.path.join(self.output_dir, "index.html"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), "<html>Site</html>")
+
+    def test_handle_sessions_environment(self):
+        # Sessions render with templates and fragments of their own
+        self.daemon.handle(self.create_build_request())
+        self.daemon.handle(self.create_build_request(minify=True))
+        first, second = self.daemon.sessions.values()
+        self.assertIsNot(first.env, second.env)
+        self.assertIsNot(first.env, builder.env)
+
+    def test_handle_invalid(self):
+        self.assertFalse(self.daemon.handle([])[daemon.RESPONSE_VAR_OK_NOTATION])
+        self.assertFalse(self.daemon.handle({daemon.REQUEST_VAR_COMMAND_NOTATION: "unknown"})[daemon.RESPONSE_VAR_OK_NOTATION])
+        self.assertFalse(self.daemon.handle({daemon.REQUEST_VAR_COMMAND_NOTATION: daemon.COMMAND_BUILD})[daemon.RESPONSE_VAR_OK_NOTATION])
+        self.assertFalse(self.daemon.handle(self.create_build_request(not_existing=True))[daemon.RESPONSE_VAR_OK_NOTATION])
+        self.assertEqual(self.daemon.sessions, {})
+
+    # serve
+
+    def test_serve(self):
+        thread = threading.Thread(target=self.daemon.serve)
+        thread.start()
+        try:
+            for _ in range(100):
+                if os.path.exists(self.daemon.socket_path):
+                    break
+                time.sleep(0.01)
+
+            response = daemon.send_request(self.create_build_request(), self.daemon.socket_path)
+            self.assertTrue(response[daemon.RESPONSE_VAR_OK_NOTATION])
+            self.assertEqual(len(response[daemon.RESPONSE_VAR_RESULT_NOTATION]["written"]), 3)
+
+            # A second daemon doesn't take over the socket
+            self.assertFalse(daemon.BuildDaemon(self.daemon.socket_path).serve())
+        finally:
+            self.assertEqual(cli.main(["request", "stop", "--socket", self.daemon.socket_path]), 0)
+            thread.join()
+
+        self.assertFalse(os.path.exists(self.daemon.socket_path))
+        self.assertIsNone(daemon.send_request({daemon.REQUEST_VAR_COMMAND_NOTATION: daemon.COMMAND_STATUS}, self.daemon.socket_path))
+
+    def test_cli_request_missing_paths(self):
+        self.assertEqual(cli.main(["request", "build", "--socket", self.daemon.socket_path]), 1)
+
+if __name__ == '__main__':
+    unittest.main()
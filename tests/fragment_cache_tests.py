@@ -0,0 +1,141 @@
+import unittest
+
+import sys
+import os
+import tempfile
+
+from siteforge import builder
+from siteforge import fragment_cache
+from jinja2 import DictLoader, Environment
+
+CALLS = []
+
+def render_count(value):
+    CALLS.append(value)
+    return value
+
+"""
+Tests for fragment_cache.py
+"""
+class FragmentCacheTests(unittest.TestCase):
+
+    TEMPLATES = {
+        "nav.html": "{% cache 'nav' %}<nav>{{ render_count('nav') }}</nav>{% endcache %}",
+        "title.html": "{% cache 'title', Data.Title %}{{ render_count(Data.Title) }}{% endcache %}",
+        "blocks.html": "{% cache 'same' %}{{ render_count('first') }}{% endcache %}{% cache 'same' %}{{ render_count('second') }}{% endcache %}",
+        "page.html": "{% include 'nav.html' %}{{ Page.Title }}",
+        "head.html": "{% cache 'head' %}<link href=\"{{ asset_url('css/s.css') }}\">{% endcache %}"
+    }
+
+    def setUp(self):
+        CALLS.clear()
+        self.loader = builder.env.loader
+        builder.env.loader = DictLoader(dict(self.TEMPLATES))
+        builder.env.globals["render_count"] = render_count
+        builder.env.fragment_cache.clear()
+
+    def tearDown(self):
+        builder.env.loader = self.loader
+        del builder.env.globals["render_count"]
+        builder.env.fragment_cache.clear()
+
+    def create_build_registry(self, count):
+        return [{"template": "page.html", "output": "page" + str(i) + ".html", "boundContext": [{"Name": "Page", "Where": {"Key": "Id", "Value": i}}]} for i in range(count)]
+
+    def create_content(self, count):
+        return {"pages": [{"Id": i, "Title": "Page " + str(i)} for i in range(count)]}
+
+    # Rendering
+
+    def test_cache_tag(self):
+        for _ in range(3):
+            self.assertEqual(builder.render("nav.html"), "<nav>nav</nav>")
+        self.assertEqual(CALLS, ["nav"])
+
+    def test_cache_tag_values(self):
+        # Fragments are only reused for equal values
+        self.assertEqual(builder.render("title.html", Data={"Title": "A"}), "A")
+        self.assertEqual(builder.render("title.html", Data={"Title": "B"}), "B")
+        self.assertEqual(builder.render("title.html", Data={"Title": "A"}), "A")
+        self.assertEqual(CALLS, ["A", "B"])
+
+    def test_cache_tag_blocks(self):
+        # Equal keys in different blocks don't share fragments
+        self.assertEqual(builder.render("blocks.html"), "firstsecond")
+
+    def test_cache_tag_counts(self):
+        cache = fragment_cache.FragmentCache()
+        cache.render("block", ["key"], lambda: "fragment")
+        cache.render("block", ["key"], lambda: "other")
+        self.assertEqual(cache.fragments[cache.get_key("block", ["key"])], "fragment")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        fragments, hits, misses = cache.take_collected()
+        self.assertEqual((len(fragments), hits, misses), (1, 1, 1))
+        self.assertEqual(cache.take_collected(), ({}, 0, 0))
+
+    def test_environment_extension(self):
+        environment = Environment(loader=DictLoader({"nav.html": "{% cache 'nav' %}{{ value }}{% endcache %}"}), extensions=[fragment_cache.FragmentCacheExtension])
+        self.assertEqual(environment.get_template("nav.html").render(value=1), "1")
+        self.assertEqual(environment.get_template("nav.html").render(value=2), "1")
+        self.assertIsNot(environment.fragment_cache, builder.env.fragment_cache)
+
+    # Building
+
+    def test_build_pages(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = builder.build_pages(self.create_build_registry(4), self.create_content(4), output_dir)
+            self.assertEqual(len(result.written), 4)
+            self.assertEqual(CALLS, ["nav"])
+            self.assertEqual((result.fragment_cache_hits, result.fragment_cache_misses), (3, 1))
+
+            # Fragments are rendered again by the next build
+            result = builder.build_pages(self.create_build_registry(4), self.create_content(4), output_dir)
+            self.assertEqual(result.fragment_cache_misses, 1)
+
+    def test_build_pages_workers(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            result = builder.build_pages(self.create_build_registry(8), self.create_content(8), output_dir, workers=2)
+            self.assertEqual(result.failed, [])
+            self.assertEqual(result.fragment_cache_hits + result.fragment_cache_misses, 8)
+            with open(os.path.join(output_dir, "page7.html"), "r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), "<nav>nav</nav>Page 7")
+
+    def test_build_pages_kept(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, "fragments", "cache.json")
+            builder.build_pages(self.create_build_registry(2), self.create_content(2), output_dir, fragment_cache_path=path)
+
+            # Kept fragments are reused by the next build
+            result = builder.build_pages(self.create_build_registry(2), self.create_content(2), output_dir, fragment_cache_path=path)
+            self.assertEqual((result.fragment_cache_hits, result.fragment_cache_misses), (2, 0))
+            self.assertEqual(CALLS, ["nav"])
+
+            # Until templates change
+            builder.env.loader.mapping["nav.html"] = "{% cache 'nav' %}<nav>{{ render_count('changed') }}</nav>{% endcache %}"
+            result = builder.build_pages(self.create_build_registry(2), self.create_content(2), output_dir, fragment_cache_path=path)
+            self.assertEqual(result.fragment_cache_misses, 1)
+            with open(os.path.join(output_dir, "page1.html"), "r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), "<nav>changed</nav>Page 1")
+
+    def test_build_pages_kept_asset_urls(self):
+        # Kept fragments aren't reused once the asset urls they may link to change
+        build_registry = [{"template": "head.html", "output": "head.html"}]
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, "fragments", "cache.json")
+            builder.build_pages(build_registry, {}, output_dir, asset_urls={"css/s.css": "css/s.0123456789ab.css"}, fragment_cache_path=path)
+
+            result = builder.build_pages(build_registry, {}, output_dir, asset_urls={"css/s.css": "css/s.ba9876543210.css"}, fragment_cache_path=path)
+            self.assertEqual(result.fragment_cache_misses, 1)
+            with open(os.path.join(output_dir, "head.html"), "r", encoding="utf-8") as f:
+                self.assertEqual(f.read(), "<link href=\"css/s.ba9876543210.css\">")
+
+    def test_template_stamp_globals(self):
+        environment = Environment(loader=DictLoader(dict(self.TEMPLATES)))
+        stamp = fragment_cache.get_template_stamp(environment)
+        environment.globals["site_name"] = "Site"
+        self.assertNotEqual(fragment_cache.get_template_stamp(environment), stamp)
+        self.assertNotEqual(fragment_cache.get_template_stamp(environment, {"asset_urls": {}}), fragment_cache.get_template_stamp(environment))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+
+import sys
+import os
+import tempfile
+
+from siteforge import json_function_registration as registration
+from siteforge.json_function_registration import json_func
+
+CALLS = []
+
+"""
+Tests for json_function_registration.py
+"""
+class JsonFunctionRegistrationTests(unittest.TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+
+    # json test methods
+    @json_func
+    def registration_plain(value):
+        CALLS.append(value)
+        return value
+
+    @json_func(pure=True)
+    def registration_pure(value):
+        CALLS.append(value)
+        return value
+
+    @json_func(ttl=3600)
+    def registration_ttl(value):
+        CALLS.append(value)
+        return value
+
+    # json_func
+
+    def test_json_func(self):
+        self.assertIn("registration_plain", registration.JSON_FUNCTION_REFERENCES)
+        self.assertFalse(registration.JSON_FUNCTION_OPTIONS["registration_plain"].is_cacheable())
+
+    def test_json_func_options(self):
+        self.assertIn("registration_pure", registration.JSON_FUNCTION_REFERENCES)
+        self.assertTrue(registration.JSON_FUNCTION_OPTIONS["registration_pure"].pure)
+        self.assertEqual(registration.JSON_FUNCTION_OPTIONS["registration_ttl"].ttl, 3600)
+
+    def test_json_func_concurrent(self):
+        async def registration_async():
+            return 0
+
+        def registration_thread():
+            return 0
+
+        # Concurrent functions change how all content is ressolved, so they are only registered for the test
+        for func, options in [(registration_async, {}), (registration_thread, {"thread": True})]:
+            json_func(func, **options)
+            self.addCleanup(registration.JSON_FUNCTION_REFERENCES.pop, func.__name__)
+            self.addCleanup(registration.JSON_FUNCTION_OPTIONS.pop, func.__name__)
+
+        self.assertTrue(registration.JSON_FUNCTION_OPTIONS["registration_async"].coroutine)
+        self.assertTrue(registration.JSON_FUNCTION_OPTIONS["registration_thread"].is_concurrent())
+        self.assertFalse(registration.JSON_FUNCTION_OPTIONS["registration_plain"].is_concurrent())
+        self.assertTrue(registration.has_concurrent_functions())
+
+    # JsonFuncCache
+
+    def test_json_func_cache_not_cacheable(self):
+        cache = registration.JsonFuncCache()
+        cache.call("registration_plain", [1], {})
+        cache.call("registration_plain", [1], {})
+        self.assertEqual(CALLS, [1, 1])
+
+    def test_json_func_cache_pure(self):
+        # Identical calls are evaluated once, different arguments are evaluated separately
+        cache = registration.JsonFuncCache()
+        self.assertEqual(cache.call("registration_pure", [1], {}), 1)
+        self.assertEqual(cache.call("registration_pure", [1], {}), 1)
+        self.assertEqual(cache.call("registration_pure", [2], {}), 2)
+        self.assertEqual(CALLS, [1, 2])
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 2)
+
+    def test_json_func_cache_pure_not_persistent(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.json")
+            cache = registration.JsonFuncCache(path)
+            cache.call("registration_pure", [1], {})
+            cache.save()
+
+            # Pure results are only reused within the same cache
+            registration.JsonFuncCache(path).call("registration_pure", [1], {})
+            self.assertEqual(CALLS, [1, 1])
+
+    def test_json_func_cache_ttl(self):
+        # Results of functions with a ttl are reused by later caches
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.json")
+            cache = registration.JsonFuncCache(path)
+            cache.call("registration_ttl", [], {"value": 1})
+            cache.save()
+
+            cache = registration.JsonFuncCache(path)
+            self.assertEqual(cache.call("registration_ttl", [], {"value": 1}), 1)
+            self.assertEqual(CALLS, [1])
+            self.assertEqual(cache.hits, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+import sys
+import os
+
+from siteforge import builder
+from siteforge import json_query
+from siteforge import json_utils
+
+"""
+Tests for json_query.py
+"""
+class JsonQueryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.content = {
+            "projects": [
+                {"Id": "Project1", "Year": 2019, "Meta": {"Kind": "game"}},
+                {"Id": "Project2", "Year": 2021, "Meta": {"Kind": "tool"}},
+                {"Id": "Project3", "Year": 2023, "Meta": {"Kind": "game"}},
+                {"Id": "Project4", "Year": "unknown", "Meta": {"Kind": "game"}}
+            ]
+        }
+        self.index = builder.build_content_index(self.content)
+
+    def query(self, where):
+        return [r["Id"] for r in json_query.execute_query(json_query.compile_query(where), self.index)]
+
+    # compile_query
+
+    def test_equality(self):
+        self.assertEqual(self.query({"Key": "Id", "Value": "Project2"}), ["Project2"])
+
+    def test_operators(self):
+        self.assertEqual(self.query({"Key": "Year", "Op": ">=", "Value": 2021}), ["Project2", "Project3"])
+        self.assertEqual(self.query({"Key": "Year", "Op": "<", "Value": 2021}), ["Project1"])
+        self.assertEqual(self.query({"Key": "Id", "Op": "!=", "Value": "Project1"}), ["Project2", "Project3", "Project4"])
+
+    def test_key_path(self):
+        self.assertEqual(self.query({"Key": "Meta.Kind", "Value": "game"}), ["Project1", "Project3", "Project4"])
+        self.assertEqual(self.query({"Key": "Meta.Missing", "Value": "game"}), [])
+
+    def test_and(self):
+        where = {"And": [{"Key": "Meta.Kind", "Value": "game"}, {"Key": "Year", "Op": ">", "Value": 2020}]}
+        self.assertEqual(self.query(where), ["Project3"])
+
+    def test_or(self):
+        # Results are in the order of the content, not the order of the queries
+        where = {"Or": [{"Key": "Id", "Value": "Project3"}, {"Key": "Year", "Op": "<", "Value": 2020}]}
+        self.assertEqual(self.query(where), ["Project1", "Project3"])
+
+    def test_nested(self):
+        where = {"Or": [{"Key": "Id", "Value": "Project2"}, {"And": [{"Key": "Meta.Kind", "Value": "game"}, {"Key": "Year", "Op": ">=", "Value": 2023}]}]}
+        self.assertEqual(self.query(where), ["Project2", "Project3"])
+
+    def test_invalid(self):
+        for where in [{"Key": "Id"}, {"Value": "Project1"}, {"Key": "Id", "Op": "~", "Value": 1}, {"And": []}, {"Or": "Id"}, "Id"]:
+            with self.assertRaises(json_query.QueryError):
+                json_query.compile_query(where)
+
+    def test_compiled_once(self):
+        where = {"Key": "Year", "Op": ">", "Value": 2020}
+        self.assertIs(json_query.compile_query(where), json_query.compile_query(dict(where)))
+
+    def test_same_as_json_filter(self):
+        # A single equality finds the same objects as a filter
+        content = {"data": {"Person": {"Name": "Eric", "Friend": {"Name": "Eric"}}, "Other": [{"Name": "Eric"}, {"Name": "Anna"}]}}
+        index = builder.build_content_index(content)
+        result = json_query.execute_query(json_query.compile_query({"Key": "Name", "Value": "Eric"}), index)
+        self.assertEqual(result, index.get_filtered_objects(json_utils.JsonFilter("Name", "Eric")))
+
+    # bound context
+
+    def test_get_processed_content_from_build_item(self):
+        build_item = {
+            "template": "project.html",
+            "output": "project.html",
+            "boundContext": [{"Name": "Project", "Where": {"And": [{"Key": "Meta.Kind", "Value": "tool"}, {"Key": "Year", "Op": ">", "Value": 2020}]}}]
+        }
+        result = builder.get_processed_content_from_build_item(build_item, self.content, self.index)
+        self.assertEqual(result, {"Project": self.content["projects"][1]})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,8 @@ import unittest
 
 import sys
 import os
+import json
+import tempfile
 
 from siteforge import json_utils
 
@@ -43,6 +45,77 @@ class JsonUtilsTests(unittest.TestCase):
         # Loading from a path with invalid formatted data (not .json) should return an empty collection
         self.assertEqual(json_utils.load_objects("tests/resources/wrong_format"), {})
         
+    def test_load_objects_workers(self):
+        # Loading with multiple threads results in the same data
+        result = json_utils.load_objects("tests/resources/more", workers=2)
+        self.assertEqual(result, json_utils.load_objects("tests/resources/more"))
+
+    # load_object
+
+    def test_load_object_parse_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "data.json")
+            cache_dir = os.path.join(directory, "cache")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write('{"key": "value"}')
+
+            self.assertEqual(json_utils.load_object(path, cache_dir), {"key": "value"})
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            # Unchanged files are served from the cache without parsing
+            parsed = []
+            json_utils.set_json_backend(lambda data: parsed.append(data) or json.loads(data))
+            try:
+                self.assertEqual(json_utils.load_object(path, cache_dir), {"key": "value"})
+                self.assertEqual(parsed, [])
+
+                # Changed files are parsed again
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write('{"key": "changed"}')
+                os.utime(path, (0, 0))
+                self.assertEqual(json_utils.load_object(path, cache_dir), {"key": "changed"})
+                self.assertEqual(len(parsed), 1)
+            finally:
+                json_utils.set_json_backend(None)
+
+    # LazyObjects
+
+    def test_lazy_objects(self):
+        # Lazily loaded objects are equal to objects loaded up front
+        result = json_utils.LazyObjects("tests/resources/more")
+        self.assertEqual(dict(result), json_utils.load_objects("tests/resources/more"))
+
+    def test_lazy_objects_load_on_access(self):
+        loaded = []
+        def process(data):
+            loaded.append(data)
+            return data
+
+        result = json_utils.LazyObjects("tests/resources/more", process)
+        self.assertEqual(sorted(result.keys()), ['data', 'data2'])
+        self.assertEqual(loaded, [])
+
+        self.assertEqual(result['data2'], {'Person': {'Name': 'Eric', 'Age': 62}})
+        result['data2']
+        # Only the accessed file is loaded, and only once
+        self.assertEqual(len(loaded), 1)
+
+    def test_lazy_objects_cache_size(self):
+        loaded = []
+        def process(data):
+            loaded.append(data)
+            return data
+
+        result = json_utils.LazyObjects("tests/resources/more", process, cache_size=1)
+        result['data']
+        result['data2']
+        # The first file was let go of and is loaded again
+        result['data']
+        self.assertEqual(len(loaded), 3)
+
+    def test_lazy_objects_not_existing_path(self):
+        self.assertEqual(len(json_utils.LazyObjects("tests/resources/not_existing_hopefully")), 0)
+
     # load_container
 
     def test_load_container(self):
@@ -153,5 +226,97 @@ class JsonUtilsTests(unittest.TestCase):
 
         self.assertEqual(result, [])
 
+    # JsonIndex
+
+    def test_json_index_matching_key_value(self):
+        json = [
+            {
+                'key': 'value',
+                'AnotherKey': 'AnotherValue'
+            },
+            {
+                'key': 'DifferentValue'
+            }
+        ]
+
+        index = json_utils.JsonIndex(json)
+        result = index.get_filtered_objects(json_utils.JsonFilter(key="key", value="value"))
+
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0], json[0])
+
+    def test_json_index_not_matching(self):
+        json = {
+            'key': 'value'
+        }
+
+        index = json_utils.JsonIndex(json)
+
+        self.assertEqual(index.get_filtered_objects(json_utils.JsonFilter(key="incorrectKey", value="value")), [])
+        self.assertEqual(index.get_filtered_objects(json_utils.JsonFilter(key="key", value="incorrectValue")), [])
+
+    def test_json_index_unhashable_value(self):
+        json = [
+            {
+                'key': ['a', 'b']
+            },
+            {
+                'key': ['a']
+            }
+        ]
+
+        index = json_utils.JsonIndex(json)
+        result = index.get_filtered_objects(json_utils.JsonFilter(key="key", value=['a', 'b']))
+
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0], json[0])
+
+    def test_json_index_same_as_get_filtered_objects(self):
+        # Nested objects below a matching key are not found, same as when searching without an index
+        json = {
+            'Id': 'Parent',
+            'Child': {
+                'Id': 'Child',
+                'Name': {
+                    'Name': 'Nested',
+                    'Id': 'Nested'
+                }
+            },
+            'Children': [
+                {'Id': 'First'},
+                {'Id': 'Second', 'Name': 'Second'}
+            ]
+        }
+
+        index = json_utils.JsonIndex(json)
+        for key, value in [('Id', 'Parent'), ('Id', 'Child'), ('Id', 'Nested'), ('Id', 'Second'), ('Name', 'Nested'), ('Name', 'Second')]:
+            filter = json_utils.JsonFilter(key=key, value=value)
+            self.assertEqual(index.get_filtered_objects(filter), json_utils.get_filtered_objects(json, filter))
+
+    def test_json_index_replace(self):
+        # Replaced json keeps its position among the other indexed json
+        first = [{'Kind': 'a', 'Id': 1}]
+        second = [{'Kind': 'a', 'Id': 2}, {'Kind': 'b', 'Id': 3}]
+        third = [{'Kind': 'a', 'Id': 4}]
+        index = json_utils.JsonIndex()
+        for json in [first, second, third]:
+            index.add(json)
+
+        replaced = [{'Kind': 'a', 'Id': 5}]
+        index.replace(second, replaced)
+        filter = json_utils.JsonFilter(key="Kind", value="a")
+        self.assertEqual([o['Id'] for o in index.get_filtered_objects(filter)], [1, 5, 4])
+        self.assertEqual(index.get_filtered_objects(json_utils.JsonFilter(key="Kind", value="b")), [])
+        self.assertEqual([o['Id'] for o in index.keys['Id']], [1, 5, 4])
+
+        # Removed json is no longer found, added json is found after all other json
+        index.replace(first, None)
+        index.replace(None, [{'Kind': 'a', 'Id': 6}])
+        self.assertEqual([o['Id'] for o in index.get_filtered_objects(filter)], [5, 4, 6])
+
+    def test_json_index_none_filter(self):
+        index = json_utils.JsonIndex({'key': 'value'})
+        self.assertEqual(index.get_filtered_objects(None), [])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,71 @@
+import unittest
+
+import sys
+import os
+import tempfile
+
+from siteforge import manifest
+from jinja2 import Environment, FileSystemLoader, DictLoader
+
+"""
+Tests for manifest.py
+"""
+class ManifestTests(unittest.TestCase):
+
+    # hash_json
+
+    def test_hash_json_key_order(self):
+        # Key order shouldn't matter for the hash
+        self.assertEqual(manifest.hash_json({'a': 1, 'b': 2}), manifest.hash_json({'b': 2, 'a': 1}))
+        self.assertNotEqual(manifest.hash_json({'a': 1}), manifest.hash_json({'a': 2}))
+
+    # load_manifest / save_manifest
+
+    def test_load_manifest_not_existing(self):
+        # Loading a manifest that doesn't exist results in an empty manifest
+        with tempfile.TemporaryDirectory() as output_dir:
+            self.assertEqual(manifest.load_manifest(output_dir), manifest.create_manifest())
+
+    def test_save_and_load_manifest(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            saved = manifest.create_manifest()
+            saved[manifest.MANIFEST_VAR_PAGES_NOTATION]['index.html'] = {'entry': 'hash'}
+            manifest.save_manifest(output_dir, saved)
+            self.assertEqual(manifest.load_manifest(output_dir), saved)
+
+    def test_load_manifest_different_version(self):
+        # A manifest of a different version is ignored
+        with tempfile.TemporaryDirectory() as output_dir:
+            saved = manifest.create_manifest()
+            saved[manifest.MANIFEST_VAR_VERSION_NOTATION] = -1
+            manifest.save_manifest(output_dir, saved)
+            self.assertEqual(manifest.load_manifest(output_dir), manifest.create_manifest())
+
+    # DependencyResolver
+
+    def test_get_template_dependencies(self):
+        env = Environment(loader=FileSystemLoader("tests/resources/templates"))
+        resolver = manifest.DependencyResolver(env, {})
+        dependencies = resolver.get_template_dependencies("project.html")
+        self.assertEqual(dependencies.templates, ["base.html", "project.html"])
+        self.assertEqual(dependencies.names, {"Project"})
+        self.assertFalse(dependencies.dynamic)
+
+    def test_get_template_dependencies_dynamic(self):
+        # Templates included through a variable make the template depend on all templates
+        env = Environment(loader=DictLoader({"page.html": "{% include name %}", "other.html": "", "unrelated.html": ""}))
+        resolver = manifest.DependencyResolver(env, {})
+        dependencies = resolver.get_template_dependencies("page.html")
+        self.assertEqual(dependencies.templates, ["other.html", "page.html", "unrelated.html"])
+        self.assertTrue(dependencies.dynamic)
+
+    def test_get_page_fingerprint_content(self):
+        # Only content referenced by the template is part of the fingerprint
+        env = Environment(loader=DictLoader({"page.html": "{{ Info.Title }}"}))
+        content = {'info': {'Title': 'Title'}, 'projects': []}
+        resolver = manifest.DependencyResolver(env, content)
+        fingerprint = resolver.get_page_fingerprint({'template': 'page.html', 'output': 'index.html'}, 'page.html', lambda: None)
+        self.assertEqual(list(fingerprint['content'].keys()), ['info'])
+
+if __name__ == '__main__':
+    unittest.main()
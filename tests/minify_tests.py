@@ -0,0 +1,119 @@
+import unittest
+
+import sys
+import os
+import tempfile
+
+from siteforge import asset_sync
+from siteforge import builder
+from siteforge import minify
+from siteforge.transform import OutputTransform
+from jinja2 import FileSystemLoader
+
+"""
+Tests for minify.py and transform.py
+"""
+class MinifyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = builder.env.loader
+        builder.env.loader = FileSystemLoader("tests/resources/templates")
+
+    def tearDown(self):
+        builder.env.loader = self.loader
+
+    # minify_html
+
+    def test_minify_html_whitespace(self):
+        html = "<html>\n  <body  class=\"a  b\"  id = x >\n    <p>Hello   <b>world</b> !</p>\n  </body>\n</html>\n"
+        self.assertEqual(minify.minify_html(html), "<html>\n<body class=\"a  b\" id=x>\n<p>Hello <b>world</b> !</p>\n</body>\n</html>")
+
+    def test_minify_html_self_closing(self):
+        # An unquoted value would take in the slash without the space before it
+        self.assertEqual(minify.minify_html('<input value=a />'), '<input value=a />')
+        self.assertEqual(minify.minify_html('<input  value="a"  />'), '<input value="a"/>')
+        self.assertEqual(minify.minify_html('<br />'), '<br/>')
+
+    def test_minify_html_quoted_gt(self):
+        # A '>' in a quoted value doesn't end the tag
+        html = '<a  title="a > b"  href=x>link</a>'
+        self.assertEqual(minify.minify_html(html), '<a title="a > b" href=x>link</a>')
+
+    def test_minify_html_lt_text(self):
+        # A '<' in text isn't taken for a tag
+        html = "<p>a < b  and  c > d</p>"
+        self.assertEqual(minify.minify_html(html), "<p>a < b and c > d</p>")
+
+    def test_minify_html_comments(self):
+        html = "<p>a <!-- comment --> b</p><!--[if IE]><p>IE</p><![endif]-->"
+        self.assertEqual(minify.minify_html(html), "<p>a b</p><!--[if IE]><p>IE</p><![endif]-->")
+
+    def test_minify_html_preserved(self):
+        # Whitespace in pre, textarea and script is significant
+        html = "<pre>  a\n   b </pre>  <textarea> a  b</textarea> <script> var a  =  1; </script>"
+        self.assertEqual(minify.minify_html(html), html.replace("</pre>  <textarea>", "</pre> <textarea>"))
+
+    def test_minify_html_style(self):
+        self.assertEqual(minify.minify_html("<style> body { color: red; } </style>"), "<style>body{color:red}</style>")
+
+    # minify_css
+
+    def test_minify_css(self):
+        css = "/* comment */\nbody ,  p > a {\n  margin: 0 auto ;\n  color : red;\n}\n"
+        self.assertEqual(minify.minify_css(css), "body,p>a{margin:0 auto;color :red}")
+
+    def test_minify_css_kept(self):
+        # Strings, license comments, descendant pseudo selectors and calc expressions are kept intact
+        css = "/*! license */ a :hover { content: \"a  ;  b\"; width: calc(1px + 2px); }"
+        self.assertEqual(minify.minify_css(css), "/*! license */ a :hover{content:\"a  ;  b\";width:calc(1px + 2px)}")
+
+    # transforms
+
+    def test_transform_applies(self):
+        self.assertTrue(minify.CSS_MINIFY_TRANSFORM.applies("css/style.css"))
+        self.assertFalse(minify.CSS_MINIFY_TRANSFORM.applies("css/bootstrap.min.css"))
+        self.assertFalse(minify.HTML_MINIFY_TRANSFORM.applies("css/style.css"))
+
+    def test_sync_transformed(self):
+        upper = OutputTransform("upper", str.upper, [".txt"])
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "source")
+            destination = os.path.join(directory, "destination")
+            os.makedirs(source)
+            with open(os.path.join(source, "a.txt"), "w", encoding="utf-8") as f:
+                f.write("text")
+            with open(os.path.join(source, "b.bin"), "wb") as f:
+                f.write(b"\xff\xfe")
+
+            result = asset_sync.sync(source, destination, transforms=[upper])
+            self.assertEqual(result.copied, ["a.txt", "b.bin"])
+            self.assertEqual(result.savings, {"a.txt": 0})
+            with open(os.path.join(destination, "a.txt"), encoding="utf-8") as f:
+                self.assertEqual(f.read(), "TEXT")
+
+            # The transformed file is only written again when it changes
+            result = asset_sync.sync(source, destination, transforms=[upper])
+            self.assertEqual(result.skipped, ["a.txt", "b.bin"])
+
+    def test_build_site_minify(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            args = ("tests/resources/site/content", "tests/resources/site/build_registry.json", "tests/resources/site/asset_registry.json", output_dir)
+            result = builder.build_site(*args, transforms=minify.MINIFY_TRANSFORMS)
+            self.assertEqual(result.failed, [])
+            self.assertEqual(sorted(result.transform_savings), ["index.html", "project/project1.html", "project/project2.html", "static/css/style.css"])
+            self.assertIn("Transformed 4 file(s)", result.summary())
+
+            # Enabling transforms builds pages again when building incrementally
+            builder.build_site(*args, incremental=True)
+            result = builder.build_site(*args, incremental=True, transforms=minify.MINIFY_TRANSFORMS)
+            self.assertEqual(result.up_to_date, [])
+
+    def test_build_site_minify_stream(self):
+        # Pages that are transformed are rendered as a whole, even when streaming
+        with tempfile.TemporaryDirectory() as output_dir:
+            args = ("tests/resources/site/content", "tests/resources/site/build_registry.json", "tests/resources/site/asset_registry.json", output_dir)
+            result = builder.build_site(*args, transforms=minify.MINIFY_TRANSFORMS, stream=True)
+            self.assertIn("index.html", result.transform_savings)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+
+import sys
+import os
+import tempfile
+import threading
+
+from siteforge import builder
+from siteforge import page_writer
+from jinja2 import FileSystemLoader
+
+"""
+Tests for page_writer.py
+"""
+class PageWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = builder.env.loader
+        builder.env.loader = FileSystemLoader("tests/resources/templates")
+
+    def tearDown(self):
+        builder.env.loader = self.loader
+
+    def read_output(self, output_dir, path):
+        with open(os.path.join(output_dir, path), encoding="utf-8") as f:
+            return f.read()
+
+    # PageWriter
+
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for workers in [0, 2]:
+                with page_writer.PageWriter(builder.write, workers) as writer:
+                    futures = [writer.submit(os.path.join(directory, str(i) + ".html"), "page " + str(i)) for i in range(10)]
+                self.assertTrue(all(f.done() for f in futures))
+                self.assertEqual(self.read_output(directory, "3.html"), "page 3")
+
+            # Unchanged pages are not written again
+            self.assertEqual([f.result() for f in futures], [False] * 10)
+
+    def test_backpressure(self):
+        # Submitting waits while the queue is full
+        release = threading.Event()
+        written = []
+
+        def write(path, content):
+            release.wait()
+            written.append(path)
+            return True
+
+        writer = page_writer.PageWriter(write, workers=1, queue_size=1)
+        writer.submit("a", "")
+        writer.submit("b", "")
+
+        submitted = threading.Event()
+        thread = threading.Thread(target=lambda: (writer.submit("c", ""), submitted.set()))
+        thread.start()
+        self.assertFalse(submitted.wait(0.1))
+
+        release.set()
+        thread.join()
+        writer.close()
+        self.assertEqual(written, ["a", "b", "c"])
+
+    def test_write_failed(self):
+        def write(path, content):
+            raise OSError("disk full")
+
+        with page_writer.PageWriter(write, workers=1) as writer:
+            future = writer.submit("a", "")
+        self.assertRaises(OSError, future.result)
+
+    def test_fsync(self):
+        # Written pages are only reported as written once flushed to disk
+        with tempfile.TemporaryDirectory() as directory:
+            writer = page_writer.PageWriter(builder.write, workers=2, fsync=True)
+            future = writer.submit(os.path.join(directory, "index.html"), "page")
+            writer.close()
+            self.assertTrue(future.result())
+
+    # build_pages
+
+    def test_build_pages_write_workers(self):
+        build_registry = [
+            {"template": "broken.html", "output": "broken.html"},
+            {"template": "page.html", "output": "index.html"},
+            {"template": "page.html", "output": "other.html"}
+        ]
+        content = {"data": {"Title": "Site"}}
+
+        for workers in [1, 2]:
+            with tempfile.TemporaryDirectory() as output_dir:
+                result = builder.build_pages(build_registry, content, output_dir, workers=workers, write_workers=2, write_queue_size=1, fsync=True)
+                self.assertEqual([output for output, error in result.failed], ["broken.html"])
+                self.assertEqual(result.written, ["index.html", "other.html"])
+                self.assertEqual(self.read_output(output_dir, "other.html"), "<html>Site</html>")
+
+    def test_build_pages_write_failed(self):
+        # Failing to write a page is reported as a failed page
+        with tempfile.TemporaryDirectory() as output_dir:
+            open(os.path.join(output_dir, "file"), "w").close()
+            build_registry = [{"template": "page.html", "output": "file/index.html"}, {"template": "page.html", "output": "index.html"}]
+            result = builder.build_pages(build_registry, {"data": {"Title": "Site"}}, output_dir, write_workers=2)
+            self.assertEqual([output for output, error in result.failed], ["file/index.html"])
+            self.assertEqual(result.written, ["index.html"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+
+import sys
+import os
+import json
+import tempfile
+
+from siteforge import builder
+from siteforge import profiling
+from jinja2 import FileSystemLoader
+
+"""
+Tests for profiling.py
+"""
+class ProfilingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = builder.env.loader
+        builder.env.loader = FileSystemLoader("tests/resources/templates")
+
+    def tearDown(self):
+        builder.env.loader = self.loader
+        profiling.disable()
+
+    def build_test_site(self, output_dir, **kwargs):
+        return builder.build_site("tests/resources/site/content", "tests/resources/site/build_registry.json", "tests/resources/site/asset_registry.json", output_dir, **kwargs)
+
+    def test_phase_not_profiling(self):
+        # Measuring without an active profiler does nothing
+        with profiling.phase("nothing", value=1) as args:
+            args["more"] = 2
+        self.assertFalse(profiling.is_enabled())
+
+    def test_phase(self):
+        with profiling.profile() as profiler:
+            with profiling.phase("outer"):
+                with profiling.phase("render", profiling.CATEGORY_PAGE, output="index.html", template="page.html") as args:
+                    args["bytes"] = 10
+
+        self.assertFalse(profiling.is_enabled())
+        result = profiler.to_json()
+        self.assertIn("outer", result["phases"])
+        self.assertEqual(result["templates"]["page.html"]["count"], 1)
+        self.assertEqual(result["outputs"]["index.html"]["bytes"], 10)
+
+    def test_count_cache(self):
+        profiler = profiling.enable()
+        profiling.count_cache("test", True)
+        profiling.count_cache("test", True)
+        profiling.count_cache("test", False)
+        profiling.count("counter", 3)
+
+        result = profiler.to_json()
+        self.assertEqual(result["caches"]["test"]["hits"], 2)
+        self.assertEqual(result["caches"]["test"]["misses"], 1)
+        self.assertAlmostEqual(result["caches"]["test"]["hit_rate"], 2 / 3)
+        self.assertEqual(result["counters"]["counter"], 3)
+
+    def test_merge(self):
+        # What a build process collected ends up in the profiler of the main process
+        worker = profiling.Profiler()
+        worker.count("counter")
+        worker.count_cache("test", True)
+        with worker.phase("worker phase"):
+            pass
+
+        profiler = profiling.Profiler()
+        profiler.count("counter")
+        profiler.merge(*worker.take_collected())
+
+        self.assertEqual(worker.events, [])
+        self.assertEqual(profiler.counters["counter"], 2)
+        self.assertEqual(profiler.caches["test"], (1, 0))
+        self.assertIn("worker phase", profiler.get_phase_times())
+
+    def test_build_site(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            with profiling.profile() as profiler:
+                result = self.build_test_site(output_dir)
+            self.assertEqual(result.failed, [])
+
+        result = profiler.to_json()
+        for phase in ["load content", "resolve functions", "load registries", "build pages", "copy assets"]:
+            self.assertIn(phase, result["phases"])
+
+        self.assertEqual(sorted(result["outputs"]), ["index.html", "project/project1.html", "project/project2.html"])
+        self.assertEqual(result["templates"]["project.html"]["count"], 2)
+        self.assertIn("bound context", result["outputs"]["project/project1.html"])
+        self.assertIn("data", result["content"])
+
+        # All written pages are counted, the first build writes every page
+        self.assertEqual(result["counters"]["bytes written"], sum(o["bytes"] for o in result["outputs"].values()))
+        self.assertEqual(result["caches"]["output"]["misses"], 3)
+
+    def test_build_site_workers(self):
+        # Pages built in other processes are measured as well
+        with tempfile.TemporaryDirectory() as output_dir:
+            with profiling.profile() as profiler:
+                self.build_test_site(output_dir, workers=2)
+
+        result = profiler.to_json()
+        self.assertEqual(sorted(result["outputs"]), ["index.html", "project/project1.html", "project/project2.html"])
+
+    def test_build_site_incremental(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            self.build_test_site(output_dir, incremental=True)
+            with profiling.profile() as profiler:
+                self.build_test_site(output_dir, incremental=True)
+
+        result = profiler.to_json()
+        self.assertEqual(result["caches"]["pages"]["hits"], 3)
+        self.assertEqual(result["outputs"], {})
+
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            with profiling.profile() as profiler:
+                self.build_test_site(os.path.join(output_dir, "site"))
+
+            profiler.save(os.path.join(output_dir, "profile.json"))
+            profiler.save_chrome_trace(os.path.join(output_dir, "trace.json"))
+
+            with open(os.path.join(output_dir, "profile.json"), encoding="utf-8") as f:
+                self.assertIn("phases", json.load(f))
+            with open(os.path.join(output_dir, "trace.json"), encoding="utf-8") as f:
+                trace = json.load(f)
+
+        self.assertTrue(trace["traceEvents"])
+        for event in trace["traceEvents"]:
+            self.assertEqual(event["ph"], "X")
+            self.assertGreaterEqual(event["dur"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
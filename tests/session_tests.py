@@ -0,0 +1,177 @@
+import unittest
+
+import sys
+import os
+import shutil
+import tempfile
+
+from siteforge import builder
+from siteforge import session
+from siteforge import watch
+from siteforge import json_function_registration as registration
+from siteforge.json_function_registration import json_func
+from jinja2 import FileSystemLoader
+
+def failing_function():
+    raise RuntimeError("failed")
+
+"""
+Tests for session.py and watch.py
+"""
+class SessionTests(unittest.TestCase):
+
+    def setUp(self):
+        # Work on a copy of the test site so it can be edited
+        self.directory = tempfile.TemporaryDirectory()
+        self.site = os.path.join(self.directory.name, "site")
+        self.output_dir = os.path.join(self.directory.name, "output")
+        shutil.copytree("tests/resources/site", self.site)
+        shutil.copytree("tests/resources/templates", os.path.join(self.site, "templates"))
+
+        self.loader = builder.env.loader
+        builder.env.loader = FileSystemLoader(os.path.join(self.site, "templates"))
+
+        self.session = session.BuildSession(os.path.join(self.site, "content"), os.path.join(self.site, "build_registry.json"), os.path.join(self.site, "asset_registry.json"), self.output_dir)
+
+    def tearDown(self):
+        builder.env.loader = self.loader
+        self.directory.cleanup()
+
+    def edit(self, path, old, new):
+        path = os.path.join(self.site, path)
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text.replace(old, new))
+        # Make sure the change is noticed on file systems with coarse modification times
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    def read_output(self, path):
+        with open(os.path.join(self.output_dir, path), encoding="utf-8") as f:
+            return f.read()
+
+    # BuildSession
+
+    def test_build(self):
+        result = self.session.build()
+        self.assertEqual(len(result.written), 3)
+        self.assertEqual(result.assets_copied, ["static/css/style.css"])
+        self.assertEqual(self.session.poll(), {})
+
+    def test_build_content_change(self):
+        self.session.build()
+        self.edit("content/data.json", '"Title": "Site"', '"Title": "Changed"')
+
+        changes = self.session.poll()
+        self.assertEqual(list(changes.keys()), [session.CHANGE_CONTENT])
+
+        # Only the page depending on the changed title is rendered again
+        result = self.session.build(changes)
+        self.assertEqual(result.written, ["index.html"])
+        self.assertEqual(result.up_to_date, ["project/project1.html", "project/project2.html"])
+        self.assertEqual(self.read_output("index.html"), "<html>Changed</html>")
+
+    def test_build_change_after_poll(self):
+        # Files changed in between polling and building are picked up by the next poll
+        self.session.build()
+        self.edit("content/data.json", '"Title": "Site"', '"Title": "Changed"')
+        changes = self.session.poll()
+        self.edit("templates/project.html", "{{Project.Title}}", "{{Project.Id}}")
+        self.session.build(changes)
+
+        changes = self.session.poll()
+        self.assertEqual(list(changes.keys()), [session.CHANGE_TEMPLATES])
+        self.session.build(changes)
+        self.assertEqual(self.read_output("project/project1.html"), "<html>Project1</html>")
+
+    def test_poll_content_subdirectory(self):
+        # Content in subdirectories isn't loaded by a full build, so changes to it aren't either
+        self.session.build()
+        os.makedirs(os.path.join(self.site, "content", "sub"))
+        with open(os.path.join(self.site, "content", "sub", "extra.json"), "w", encoding="utf-8") as f:
+            f.write("{}")
+        self.assertEqual(self.session.poll(), {})
+
+    def test_build_lookups_kept(self):
+        # The content index and template analysis are kept in between builds, updating only what changed
+        self.session.build()
+        lookups = self.session.lookups
+        index = lookups.get_index()
+        self.edit("content/data.json", '"Title": "Project 1"', '"Title": "Changed"')
+        self.edit("templates/project.html", "{{Project.Title}}", "{{Project.Title}}!")
+
+        result = self.session.build(self.session.poll())
+        self.assertIs(self.session.lookups, lookups)
+        self.assertIs(lookups.get_index(), index)
+        self.assertEqual(result.written, ["project/project1.html", "project/project2.html"])
+        self.assertEqual(self.read_output("project/project1.html"), "<html>Changed!</html>")
+
+    def test_build_template_change(self):
+        self.session.build()
+        self.edit("templates/project.html", "{{Project.Title}}", "{{Project.Id}}")
+
+        changes = self.session.poll()
+        self.assertEqual(list(changes.keys()), [session.CHANGE_TEMPLATES])
+
+        result = self.session.build(changes)
+        self.assertEqual(result.written, ["project/project1.html", "project/project2.html"])
+        self.assertEqual(self.read_output("project/project1.html"), "<html>Project1</html>")
+
+    def test_build_asset_change(self):
+        self.session.build()
+        self.edit("assets/css/style.css", "black", "white")
+
+        result = self.session.build(self.session.poll())
+        self.assertEqual(result.assets_copied, ["static/css/style.css"])
+        self.assertEqual(result.written, [])
+
+    def test_build_asset_change_fingerprint(self):
+        self.session.fingerprint_assets = True
+        self.session.build()
+        self.edit("assets/css/style.css", "black", "white")
+
+        # Pages are built again as the fingerprinted path of the asset changed, the previous asset is deleted
+        previous = self.session.asset_urls["static/css/style.css"]
+        result = self.session.build(self.session.poll())
+        self.assertEqual(result.assets_copied, [self.session.asset_urls["static/css/style.css"]])
+        self.assertEqual(result.assets_deleted, [previous])
+        self.assertEqual(result.up_to_date, ["index.html", "project/project1.html", "project/project2.html"])
+
+    def test_build_registry_invalid(self):
+        # A registry saved half edited keeps the previous registry
+        self.session.build()
+        with open(os.path.join(self.site, "build_registry.json"), "a", encoding="utf-8") as f:
+            f.write("{")
+        self.edit("build_registry.json", "", "")
+
+        changes, result, duration = watch.rebuild_changes(self.session)
+        self.assertEqual(list(changes.keys()), [session.CHANGE_BUILD_REGISTRY])
+        self.assertEqual(len(self.session.build_registry), 3)
+        self.assertEqual(result.failed, [])
+
+    def test_build_content_function_failed(self):
+        # Content whose functions fail to ressolve keeps the previous content
+        self.session.build()
+        self.edit("content/data.json", '"Title": "Site"', '"Title": {"$func": "failing_function"}')
+        json_func(failing_function)
+        self.addCleanup(registration.JSON_FUNCTION_REFERENCES.pop, "failing_function")
+        self.addCleanup(registration.JSON_FUNCTION_OPTIONS.pop, "failing_function")
+
+        watch.rebuild_changes(self.session)
+        self.assertEqual(self.read_output("index.html"), "<html>Site</html>")
+
+    # rebuild_changes
+
+    def test_rebuild_changes(self):
+        self.session.build()
+        self.assertIsNone(watch.rebuild_changes(self.session))
+
+        self.edit("build_registry.json", '"output": "index.html"', '"output": "home.html"')
+        changes, result, duration = watch.rebuild_changes(self.session)
+        self.assertEqual(list(changes.keys()), [session.CHANGE_BUILD_REGISTRY])
+        self.assertEqual(result.written, ["home.html"])
+        self.assertGreaterEqual(duration, 0)
+
+if __name__ == '__main__':
+    unittest.main()
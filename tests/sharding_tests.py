@@ -0,0 +1,102 @@
+import unittest
+
+import sys
+import os
+import tempfile
+
+from siteforge import builder
+from siteforge import manifest
+from siteforge import sharding
+from jinja2 import FileSystemLoader
+
+"""
+Tests for sharding.py
+"""
+class ShardingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = builder.env.loader
+        builder.env.loader = FileSystemLoader("tests/resources/templates")
+
+    def tearDown(self):
+        builder.env.loader = self.loader
+
+    def build_test_site(self, output_dir, **kwargs):
+        return builder.build_site("tests/resources/site/content", "tests/resources/site/build_registry.json", "tests/resources/site/asset_registry.json", output_dir, **kwargs)
+
+    # Shard
+
+    def test_parse_shard(self):
+        shard = sharding.parse_shard("2/4")
+        self.assertEqual((shard.index, shard.count), (2, 4))
+        self.assertEqual(str(shard), "2/4")
+        self.assertEqual(shard.get_manifest_name(), ".siteforge-manifest.shard-2-of-4.json")
+
+    def test_parse_shard_invalid(self):
+        for text in ["", "2", "a/4", "0/4", "5/4", "1/0", "1/2/3"]:
+            self.assertRaises(ValueError, sharding.parse_shard, text)
+
+    def test_get_shard_index(self):
+        # Partitioning doesn't depend on the process, so independent invocations agree
+        self.assertEqual(sharding.get_shard_index("index.html", 4), int("f6013a00b362253c64368d6eebc50ea2131754e2", 16) % 4 + 1)
+        indices = [sharding.get_shard_index("page" + str(i) + ".html", 4) for i in range(100)]
+        self.assertEqual(set(indices), {1, 2, 3, 4})
+
+    # build_site
+
+    def test_build_site_shards(self):
+        with tempfile.TemporaryDirectory() as output_dir, tempfile.TemporaryDirectory() as full_output_dir:
+            outputs = []
+            for index in [1, 2, 3]:
+                result = self.build_test_site(output_dir, shard=sharding.Shard(index, 3))
+                outputs.extend(result.written + result.assets_copied)
+
+            # Each page and asset is built by exactly one shard
+            full_result = self.build_test_site(full_output_dir)
+            self.assertEqual(sorted(outputs), sorted(full_result.written + full_result.assets_copied))
+
+            result = sharding.merge_shards(output_dir)
+            self.assertTrue(result.is_valid())
+            self.assertEqual(result.outputs, sorted(outputs))
+            self.assertEqual(manifest.load_manifest(output_dir)[manifest.MANIFEST_VAR_ASSETS_NOTATION], ["static/css/style.css"])
+
+    def test_build_site_shards_fingerprint_assets(self):
+        # Pages link to fingerprinted assets copied by other shards
+        with tempfile.TemporaryDirectory() as output_dir, tempfile.TemporaryDirectory() as full_output_dir:
+            full_result = self.build_test_site(full_output_dir, fingerprint_assets=True)
+            for index in [1, 2]:
+                result = self.build_test_site(output_dir, shard=sharding.Shard(index, 2), fingerprint_assets=True)
+                self.assertEqual(result.asset_urls, full_result.asset_urls)
+
+    # merge
+
+    def create_shard_manifest(self, index, count, outputs, assets):
+        shard_manifest = manifest.create_manifest()
+        shard_manifest[manifest.MANIFEST_VAR_ASSETS_NOTATION] = assets
+        shard_manifest[manifest.MANIFEST_VAR_SHARD_NOTATION] = {sharding.SHARD_VAR_INDEX_NOTATION: index, sharding.SHARD_VAR_COUNT_NOTATION: count, sharding.SHARD_VAR_OUTPUTS_NOTATION: outputs}
+        return shard_manifest
+
+    def test_merge_manifests_collisions(self):
+        result = sharding.merge_manifests({
+            1: self.create_shard_manifest(1, 2, ["index.html"], ["static/style.css"]),
+            2: self.create_shard_manifest(2, 2, ["static/style.css"], ["static/other.css"])
+        })
+        self.assertEqual(result.collisions, [("static/style.css", [1, 2])])
+        self.assertEqual(result.outputs, ["index.html", "static/other.css", "static/style.css"])
+        self.assertFalse(result.is_valid())
+
+    def test_merge_shards_missing(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            shard = sharding.Shard(1, 2)
+            manifest.save_manifest(output_dir, self.create_shard_manifest(1, 2, ["index.html"], []), shard.get_manifest_name())
+
+            result = sharding.merge_shards(output_dir)
+            self.assertEqual(result.missing, [2])
+            self.assertFalse(os.path.exists(os.path.join(output_dir, manifest.MANIFEST_FILE_NAME)))
+
+    def test_merge_shards_empty(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            self.assertFalse(sharding.merge_shards(output_dir).is_valid())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+import sys
+import os
+import pickle
+import tempfile
+
+from siteforge import template_cache
+from jinja2 import Environment, FileSystemLoader
+
+"""
+Tests for template_cache.py
+"""
+class TemplateCacheTests(unittest.TestCase):
+
+    # create_bytecode_cache
+
+    def test_create_bytecode_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache_dir = os.path.join(directory, "cache")
+            env = Environment(loader=FileSystemLoader("tests/resources/templates"), bytecode_cache=template_cache.create_bytecode_cache(cache_dir))
+            self.assertEqual(env.get_template("page.html").render(Data={"Title": "Title"}), "<html>Title</html>")
+            # Compiled templates are stored in the cache directory
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+    # compile_templates / TemplateBundleLoader
+
+    def test_template_bundle(self):
+        for bundle_name in ["bundle", "bundle.zip"]:
+            with tempfile.TemporaryDirectory() as directory:
+                bundle = os.path.join(directory, bundle_name)
+                template_cache.compile_templates(Environment(loader=FileSystemLoader("tests/resources/templates")), bundle)
+                self.assertTrue(os.path.exists(bundle))
+
+                env = Environment(loader=template_cache.TemplateBundleLoader(bundle, FileSystemLoader("tests/resources/templates")))
+                self.assertEqual(env.get_template("project.html").render(Project={"Title": "Title"}), "<html>Title</html>")
+                # Sources are still available through the bundle loader
+                self.assertIn("{{Project.Title}}", env.loader.get_source(env, "project.html")[0])
+
+    def test_template_bundle_changed_template(self):
+        # Templates changed after compiling the bundle are loaded from source
+        with tempfile.TemporaryDirectory() as directory:
+            templates = os.path.join(directory, "templates")
+            bundle = os.path.join(directory, "bundle")
+            os.makedirs(templates)
+            with open(os.path.join(templates, "page.html"), "w", encoding="utf-8") as f:
+                f.write("compiled")
+            template_cache.compile_templates(Environment(loader=FileSystemLoader(templates)), bundle)
+
+            with open(os.path.join(templates, "page.html"), "w", encoding="utf-8") as f:
+                f.write("changed")
+            compiled_file = os.path.join(bundle, os.listdir(bundle)[0])
+            os.utime(compiled_file, (0, 0))
+
+            env = Environment(loader=template_cache.TemplateBundleLoader(bundle, FileSystemLoader(templates)))
+            self.assertEqual(env.get_template("page.html").render(), "changed")
+
+    def test_template_bundle_loader_pickle(self):
+        # Build processes receive the loader pickled
+        with tempfile.TemporaryDirectory() as directory:
+            bundle = os.path.join(directory, "bundle")
+            template_cache.compile_templates(Environment(loader=FileSystemLoader("tests/resources/templates")), bundle)
+
+            loader = pickle.loads(pickle.dumps(template_cache.TemplateBundleLoader(bundle, FileSystemLoader("tests/resources/templates"))))
+            env = Environment(loader=loader)
+            self.assertEqual(env.get_template("page.html").render(Data={"Title": "Title"}), "<html>Title</html>")
+
+if __name__ == '__main__':
+    unittest.main()